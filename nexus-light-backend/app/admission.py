@@ -0,0 +1,278 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Optional
+from app.metrics import ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+from app.config import (
+    ADMISSION_RPM, ADMISSION_TPM, ADMISSION_BURST_SECONDS, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_SECONDS,
+    ADMISSION_STATUS_INTERVAL_SECONDS, ADMISSION_CALLS_PER_SEARCH, ADMISSION_TOKENS_PER_SEARCH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest search in the cost estimates
+COST_EWMA_ALPHA = 0.2
+
+
+class QueueFull(Exception):
+    """
+    Raised when a search cannot be queued, or waited longer than allowed.
+    `retry_after` is a hint in seconds for the client.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to `burst_seconds` worth of them.
+    The level may go negative when a search used more than it was charged.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float, clock=time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` units are available, 0 when they are now.
+        """
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.level -= amount
+
+
+class Ticket:
+    def __init__(self, key: str, calls: float, tokens: float, enqueued_at: float):
+        self.key = key
+        self.calls = calls
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+        self.admitted = asyncio.get_running_loop().create_future()
+        self.settled = False
+
+
+class AdmissionController:
+    """
+    Lets searches into the model pipeline at the rate the Gemini quotas allow.
+
+    Every search is charged its estimated model calls and tokens against a global
+    requests-per-minute and tokens-per-minute `TokenBucket`. Searches that do not fit
+    wait in a bounded queue that is served round-robin across sessions, so one rep
+    firing many searches cannot starve the others. When the queue is full, or every
+    model is cooling down, callers get `QueueFull` with a Retry-After hint instead of
+    joining a wall of 429s. After each search the buckets are settled with what it
+    actually used, which also refines the estimates.
+    """
+
+    def __init__(self, rpm: float = ADMISSION_RPM, tpm: float = ADMISSION_TPM,
+                 burst_seconds: float = ADMISSION_BURST_SECONDS, max_queue: int = ADMISSION_QUEUE_SIZE,
+                 max_wait: float = ADMISSION_MAX_WAIT_SECONDS, status_interval: float = ADMISSION_STATUS_INTERVAL_SECONDS,
+                 calls_per_search: float = ADMISSION_CALLS_PER_SEARCH,
+                 tokens_per_search: float = ADMISSION_TOKENS_PER_SEARCH, clock=time.monotonic):
+        self.requests = TokenBucket(rpm, burst_seconds, clock)
+        self.tokens = TokenBucket(tpm, burst_seconds, clock)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.status_interval = status_interval
+        self.calls_per_search = calls_per_search
+        self.tokens_per_search = tokens_per_search
+        self.clock = clock
+        # Session -> its waiting tickets, in round-robin order
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._queued = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0
+        self._anonymous = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queued,
+            "sessions_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "calls_per_search": round(self.calls_per_search, 2),
+            "tokens_per_search": round(self.tokens_per_search),
+            "paused_for_seconds": round(max(self._paused_until - self.clock(), 0), 2),
+        }
+
+    def retry_after(self) -> float:
+        """
+        Roughly how long until the current queue has drained.
+        """
+        waits = [max(self._paused_until - self.clock(), 0)]
+        if self.requests.enabled:
+            waits.append((self._queued + 1) * self.calls_per_search / self.requests.rate)
+        if self.tokens.enabled:
+            waits.append((self._queued + 1) * self.tokens_per_search / self.tokens.rate)
+        return max(waits)
+
+    # --- QUEUE ---
+
+    def check(self):
+        """
+        Raises `QueueFull` when a search would be turned away now, without queueing one.
+        """
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc(reason="queue_full")
+            raise QueueFull("Too many searches are waiting, try again later.", self.retry_after())
+        if self._paused_until - self.clock() > self.max_wait:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc(reason="models_unavailable")
+            raise QueueFull("All models are cooling down, try again later.", self.retry_after())
+
+    def enqueue(self, session_id: Optional[str] = None) -> Ticket:
+        """
+        Queues a search. Raises `QueueFull` right away when there is no room.
+        """
+        self.check()
+        if session_id is None:
+            # Requests without a session are each their own session
+            self._anonymous += 1
+            key = f"anonymous:{self._anonymous}"
+        else:
+            key = f"session:{session_id}"
+        ticket = Ticket(key, max(self.calls_per_search, 1.0), self.tokens_per_search, self.clock())
+        self._queues.setdefault(key, deque()).append(ticket)
+        self._queued += 1
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """
+        1-based place of a waiting ticket in the round-robin order, 0 once admitted.
+        """
+        if ticket.admitted.done():
+            return 0
+        queue = self._queues.get(ticket.key)
+        if queue is None or ticket not in queue:
+            return 0
+        depth = queue.index(ticket)
+        rank = list(self._queues).index(ticket.key)
+        # Every session serves one ticket per round, in rotation order
+        ahead = 0
+        for i, other in enumerate(self._queues.values()):
+            ahead += min(len(other), depth)
+            if i < rank and len(other) > depth:
+                ahead += 1
+        return ahead + 1
+
+    def cancel(self, ticket: Ticket):
+        """
+        Gives up a ticket that will not run a search, e.g. because its client left or
+        the answer came from the cache. An admitted ticket gets its charge back.
+        """
+        queue = self._queues.get(ticket.key)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self._queued -= 1
+            if not queue:
+                del self._queues[ticket.key]
+        if not ticket.admitted.done():
+            ticket.admitted.cancel()
+        elif not ticket.admitted.cancelled() and not ticket.settled:
+            ticket.settled = True
+            self.requests.take(-ticket.calls)
+            self.tokens.take(-ticket.tokens)
+            self._dispatch()
+
+    async def wait(self, ticket: Ticket) -> AsyncIterator[int]:
+        """
+        Yields the ticket's queue position every `status_interval` seconds until it
+        is admitted. Yields nothing when it was admitted right away. Raises
+        `QueueFull` after `max_wait` seconds.
+        """
+        deadline = ticket.enqueued_at + self.max_wait
+        try:
+            while not ticket.admitted.done():
+                yield self.position(ticket)
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    self.timed_out += 1
+                    ADMISSION_REJECTED.inc(reason="timeout")
+                    raise QueueFull("Waited too long for model capacity, try again later.", self.retry_after())
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.admitted), timeout=min(self.status_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not ticket.admitted.done():
+                self.cancel(ticket)
+
+    def release(self, ticket: Ticket, calls: int, tokens: int):
+        """
+        Settles the buckets with what an admitted search actually used: every model
+        request it made, including rate-limited, failed and hedged ones.
+        """
+        if not ticket.admitted.done() or ticket.admitted.cancelled() or ticket.settled:
+            return
+        ticket.settled = True
+        self.requests.take(calls - ticket.calls)
+        self.tokens.take(tokens - ticket.tokens)
+        self.calls_per_search += COST_EWMA_ALPHA * (calls - self.calls_per_search)
+        self.tokens_per_search += COST_EWMA_ALPHA * (tokens - self.tokens_per_search)
+        self._dispatch()
+
+    def backoff(self, seconds: Optional[float]):
+        """
+        Holds the queue while every model is cooling down.
+        """
+        if seconds:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            logger.warning(f"Admission paused for {seconds:.1f}s, no model is available.")
+
+    # --- DISPATCH ---
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            ticket = queue[0]
+            wait = max(self._paused_until - self.clock(), self.requests.wait_time(ticket.calls),
+                       self.tokens.wait_time(ticket.tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self.requests.take(ticket.calls)
+            self.tokens.take(ticket.tokens)
+            self.admitted += 1
+            ADMISSION_WAIT_SECONDS.observe(self.clock() - ticket.enqueued_at)
+            ticket.admitted.set_result(True)
+
+
+admission = AdmissionController()
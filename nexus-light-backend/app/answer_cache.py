@@ -0,0 +1,115 @@
+import time
+import logging
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import event
+from app.cache import normalize_query
+from app.database import Entity
+from app.embeddings import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Cache of finished `/api/search` streams (tool artifacts and the final answer).
+
+    A query is looked up by its normalized text first, then by cosine similarity of
+    its hashing embedding against every cached query. Entries live in a ring buffer
+    of `capacity` slots, so the oldest answer is overwritten when it is full.
+    """
+
+    def __init__(self, ttl: float, capacity: int, threshold: float, embedder: Optional[HashingEmbedder] = None,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.threshold = threshold
+        self.embedder = embedder or HashingEmbedder()
+        self.clock = clock
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._entries: List[Optional[dict]] = [None] * capacity
+        self._exact = {}
+        self._next = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._exact),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def _alive(self, entry: Optional[dict], now: float) -> bool:
+        return entry is not None and entry["expires_at"] > now
+
+    def _find(self, query: str) -> Optional[dict]:
+        now = self.clock()
+        key = normalize_query(query)
+
+        slot = self._exact.get(key)
+        if slot is not None and self._alive(self._entries[slot], now):
+            return {**self._entries[slot], "similarity": 1.0}
+
+        if self._exact:
+            similarities = self._vectors @ self.embedder.embed(query)
+            for slot in np.argsort(similarities)[::-1]:
+                if similarities[slot] < self.threshold:
+                    break
+                if self._alive(self._entries[slot], now):
+                    return {**self._entries[slot], "similarity": float(similarities[slot])}
+        return None
+
+    def lookup(self, query: str) -> Optional[dict]:
+        """
+        Returns {"query", "events", "similarity"} for the closest cached answer, or None.
+        """
+        hit = self._find(query)
+        if hit is None:
+            self.misses += 1
+        elif hit["query"] == normalize_query(query):
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        return hit
+
+    def peek(self, query: str) -> bool:
+        """
+        Whether `lookup` would answer the query, without counting a hit or a miss.
+        """
+        return self._find(query) is not None
+
+    def store(self, query: str, events: List[dict]):
+        key = normalize_query(query)
+        slot = self._exact.get(key)
+        if slot is None:
+            slot = self._next
+            self._next = (self._next + 1) % self.capacity
+            evicted = self._entries[slot]
+            if evicted is not None:
+                self._exact.pop(evicted["query"], None)
+        self._entries[slot] = {"query": key, "events": events, "expires_at": self.clock() + self.ttl}
+        self._vectors[slot] = self.embedder.embed(query)
+        self._exact[key] = slot
+
+    def invalidate(self):
+        """
+        Drops every answer, e.g. because the entities they were built from changed.
+        """
+        if self._exact:
+            self.invalidations += 1
+        self._entries = [None] * self.capacity
+        self._vectors[:] = 0
+        self._exact.clear()
+
+    def watch_entities(self):
+        """
+        Invalidates the cache whenever an Entity is inserted, updated or deleted through the ORM.
+        Bulk writes that bypass the ORM must call `invalidate()` themselves.
+        """
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(Entity, name, lambda mapper, connection, target: self.invalidate())
@@ -0,0 +1,175 @@
+import re
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from sqlalchemy import select, delete
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal, CacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercases and collapses whitespace so trivially different queries share a cache key.
+    """
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class TTLCache:
+    """
+    Two-level string cache: an in-process LRU in front of the `cache_entries` table.
+
+    Entries expire after `ttl` seconds. The LRU holds at most `max_entries` items and
+    the table is pruned to `max_rows` rows. Concurrent misses for the same key are
+    coalesced into a single call to `compute` (single flight).
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int, max_rows: int,
+                 session_factory=SessionLocal, prune_every: int = 100):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.session_factory = session_factory
+        self.prune_every = prune_every
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def stats(self) -> dict:
+        return {
+            "namespace": self.namespace,
+            "size": len(self._memory),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    # --- PERSISTENT LAYER (blocking, run in the threadpool) ---
+
+    def _load(self, key: str) -> Optional[tuple]:
+        db = self.session_factory()
+        try:
+            entry = db.get(CacheEntry, key)
+            if entry is None:
+                return None
+            return entry.value, entry.expires_at
+        finally:
+            db.close()
+
+    def _store(self, key: str, value: str, expires_at: datetime, prune: bool):
+        db = self.session_factory()
+        try:
+            db.merge(CacheEntry(key=key, value=value, created_at=datetime.utcnow(), expires_at=expires_at))
+            if prune:
+                self._prune(db)
+            db.commit()
+        finally:
+            db.close()
+
+    def _prune(self, db):
+        prefix = f"{self.namespace}:%"
+        expired = db.execute(
+            delete(CacheEntry).where(CacheEntry.key.like(prefix), CacheEntry.expires_at <= datetime.utcnow())
+        ).rowcount
+        overflow = select(CacheEntry.key).where(CacheEntry.key.like(prefix)) \
+            .order_by(CacheEntry.expires_at.desc()).offset(self.max_rows)
+        evicted = db.execute(
+            delete(CacheEntry).where(CacheEntry.key.in_(overflow)).execution_options(synchronize_session=False)
+        ).rowcount
+        self.expirations += expired
+        self.evictions += evicted
+
+    # --- PUBLIC API ---
+
+    async def get(self, key: str) -> Optional[str]:
+        key = self._key(key)
+        now = datetime.utcnow()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+            self.expirations += 1
+
+        try:
+            entry = await run_in_threadpool(self._load, key)
+        except Exception as e:
+            logger.warning(f"Cache lookup failed for {key}: {e}")
+            entry = None
+        if entry is not None and entry[1] > now:
+            self._remember(key, *entry)
+            self.hits += 1
+            self.persistent_hits += 1
+            return entry[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        key = self._key(key)
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        self._remember(key, value, expires_at)
+        self._writes += 1
+        try:
+            await run_in_threadpool(self._store, key, value, expires_at, self._writes % self.prune_every == 0)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: datetime):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]], fresh: bool = False,
+                             cacheable: Callable[[str], bool] = lambda value: True) -> str:
+        """
+        Returns the cached value for `key`, or awaits `compute()` once for all concurrent callers.
+        With `fresh=True` the cached value is ignored and replaced by a new result.
+        """
+        if not fresh:
+            value = await self.get(key)
+            if value is not None:
+                return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        async def run():
+            value = await compute()
+            if cacheable(value):
+                await self.set(key, value)
+            return value
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so a cancelled caller does not cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._memory.clear()
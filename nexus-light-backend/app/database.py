@@ -1,11 +1,69 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, JSON, Text, Index
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ASYNC_POOL_SHARE, DB_POOL_TIMEOUT_SECONDS, DB_POOL_RECYCLE_SECONDS,
+    SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS,
+)
 
-DATABASE_URL = "sqlite:///./sql_app.db?check_same_thread=False"
 
-engine = create_engine(DATABASE_URL)
+def _pool_share(budget: int, for_async: bool, minimum: int) -> int:
+    async_part = max(minimum, round(budget * DB_ASYNC_POOL_SHARE))
+    return async_part if for_async else max(minimum, budget - async_part)
+
+
+def pool_options(url) -> dict:
+    """
+    Pool settings for `url`. Postgres runs a sync and an asyncpg engine side by side,
+    so the two split DB_POOL_SIZE and DB_MAX_OVERFLOW instead of each taking both.
+    """
+    url = make_url(url)
+    options = {}
+    pool_size, max_overflow = DB_POOL_SIZE, DB_MAX_OVERFLOW
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection, keep SQLAlchemy's default pool
+            return options
+    else:
+        options["pool_pre_ping"] = True
+    if url.get_backend_name() == "postgresql":
+        for_async = url.get_driver_name() == "asyncpg"
+        pool_size = _pool_share(DB_POOL_SIZE, for_async, minimum=1)
+        max_overflow = _pool_share(DB_MAX_OVERFLOW, for_async, minimum=0)
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+    return options
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Engine for `url`. SQLite connections run in WAL mode, so readers never wait on
+    the writer, with synchronous=NORMAL and the file memory-mapped.
+    """
+    engine = create_engine(url, **pool_options(url))
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if engine.url.database not in (None, "", ":memory:"):
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+    return engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -17,6 +75,11 @@ class ChatHistory(Base):
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    # Loading a session reads its newest turns first
+    __table_args__ = (
+        Index("ix_chat_history_session_timestamp", "session_id", "timestamp"),
+    )
+
 class Entity(Base):
     __tablename__ = "entities"
     id = Column(Integer, primary_key=True, index=True)
@@ -34,10 +97,111 @@ class Entity(Base):
     group = Column(String)
     source = Column(String, nullable=True)
     coords = Column(JSON, nullable=True)
+    # When a web search last confirmed the entity, set by the enrichment workers
+    refreshed_at = Column(DateTime, nullable=True)
+
+    # Filter column + id, so filtered listings can seek straight to the keyset cursor
+    __table_args__ = (
+        Index("ix_entities_type_id", "type", "id"),
+        Index("ix_entities_status_id", "status", "id"),
+        Index("ix_entities_group_id", "group", "id"),
+        Index("ix_entities_industry_id", "industry", "id"),
+        Index("ix_entities_source_id", "source", "id"),
+    )
+
+class CacheEntry(Base):
+    __tablename__ = "cache_entries"
+    # Namespaced key, e.g. "web:<normalized query>"
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True, nullable=False)
+
+
+def add_missing_columns(table, bind=None):
+    """
+    create_all skips tables that already exist, add the nullable columns introduced since then.
+    """
+    bind = bind or engine
+    existing = {column["name"] for column in inspect(bind).get_columns(table.name)}
+    with bind.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
 
 
 def create_db_and_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(Entity.__table__)
+    # create_all skips tables that already exist, add indexes introduced since then
+    for table in (Entity.__table__, ChatHistory.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    from app.fulltext import create_fulltext_index # Import here to avoid a circular import
+    from app.spatial import create_spatial_index
+    from app.facets import create_facet_counts
+    create_fulltext_index(engine)
+    create_spatial_index(engine)
+    create_facet_counts(engine)
+
+# --- ASYNC ACCESS ---
+
+def async_database_url(url: str = DATABASE_URL) -> Optional[str]:
+    """
+    The asyncpg flavour of a Postgres URL, None for databases without an async driver here.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "postgresql":
+        return None
+    return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+_async_session_factory = None
+
+
+def get_async_session_factory():
+    """
+    Sessions on the asyncpg engine, created on first use. None when not on Postgres.
+    """
+    global _async_session_factory
+    url = async_database_url()
+    if url is None:
+        return None
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        async_engine = create_async_engine(url, **pool_options(url))
+        _async_session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def dispose_async_engine():
+    global _async_session_factory
+    if _async_session_factory is not None:
+        await _async_session_factory.kw["bind"].dispose()
+        _async_session_factory = None
+
+
+def _run_in_session(fn, args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args):
+    """
+    Runs the blocking `fn(db, *args)` on a session borrowed for this call only, so a
+    long stream never holds a connection between its queries. On Postgres it runs
+    on the asyncpg engine, elsewhere in the threadpool.
+    """
+    factory = get_async_session_factory()
+    if factory is not None:
+        async with factory() as session:
+            return await session.run_sync(fn, *args)
+    return await run_in_threadpool(_run_in_session, fn, args)
+
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,73 @@
+import re
+import zlib
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+# Words that do not change what a search is about
+STOP_WORDS = {
+    "a", "an", "the", "of", "at", "in", "on", "for", "to", "and", "or", "is", "are", "was", "s",
+    "who", "whos", "what", "which", "me", "my", "i", "find", "show", "list", "search", "get", "give",
+    "please", "can", "you", "do", "does", "with", "from", "about", "de", "da", "o", "em",
+}
+
+
+def tokenize(text: str) -> list:
+    # Fold accents so "São Paulo" and "Sao Paulo" embed the same
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return [t for t in re.findall(r"\w+", text) if t not in STOP_WORDS]
+
+
+class HashingEmbedder:
+    """
+    CPU-only text embedding: signed feature hashing of words and character trigrams,
+    L2-normalized so a dot product is the cosine similarity.
+    """
+
+    # Words whose hashed features are kept, entity texts repeat a small vocabulary
+    MAX_CACHED_WORDS = 100_000
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self._words: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    def _word_features(self, token: str) -> Tuple[List[int], List[float]]:
+        """
+        Positions and signed weights the word and its trigrams add to a vector.
+        """
+        cached = self._words.get(token)
+        if cached is not None:
+            return cached
+        padded = f"<{token}>"
+        grams = [(f"w:{token}", 2.0)] + [(f"c:{padded[i:i + 3]}", 1.0) for i in range(len(padded) - 2)]
+        positions, weights = [], []
+        for gram, weight in grams:
+            h = zlib.crc32(gram.encode("utf-8"))
+            # Words weigh more than their trigrams, the sign bit limits collision bias
+            positions.append(h % self.dim)
+            weights.append(weight if (h >> 31) & 1 else -weight)
+        if len(self._words) < self.MAX_CACHED_WORDS:
+            self._words[token] = (positions, weights)
+        return positions, weights
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        One row per text, accumulated in a single pass over all their features.
+        """
+        texts = list(texts)
+        rows, positions, weights = [], [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                token_positions, token_weights = self._word_features(token)
+                rows.append((row, len(token_positions)))
+                positions += token_positions
+                weights += token_weights
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if positions:
+            row_ids = np.repeat([r for r, _ in rows], [n for _, n in rows])
+            np.add.at(vectors, (row_ids, np.array(positions)), np.array(weights, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
@@ -0,0 +1,191 @@
+import re
+import json
+import logging
+from typing import Iterable, List, Optional
+from pydantic import ValidationError
+from app.models import EntityModel
+from app.result_budget import parse_records
+
+logger = logging.getLogger(__name__)
+
+# Profile pages whose search result titles read "Name - Role - Company"
+PROFILE_LINKS = {
+    "linkedin.com/in/": "person",
+    "linkedin.com/company/": "business",
+    "crunchbase.com/person/": "person",
+    "crunchbase.com/organization/": "business",
+}
+# Site names SERP titles end with
+TITLE_SUFFIXES = {"linkedin", "crunchbase"}
+_TITLE_SEPARATORS = re.compile(r"\s+[-–—|]\s+")
+
+
+class EntityParser:
+    """
+    Picks the JSON objects out of a streamed model answer as soon as each one closes.
+
+    Feed it the text chunks in order. It keeps only the object that is still open,
+    so a long answer is scanned once. Anything outside the objects (the enclosing
+    list, a markdown fence, prose) is skipped, and objects nested in an object are
+    returned as part of it.
+    """
+
+    def __init__(self):
+        self._open: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: Optional[str]) -> List[dict]:
+        objects = []
+        for char in text or "":
+            if self._depth == 0:
+                if char == "{":
+                    self._open = [char]
+                    self._depth = 1
+                continue
+            self._open.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        value = json.loads("".join(self._open))
+                    except ValueError:
+                        continue
+                    if isinstance(value, dict):
+                        objects.append(value)
+        return objects
+
+
+class StreamedReply:
+    """
+    The chunks of a streamed model turn, read like a whole response.
+    """
+
+    def __init__(self):
+        self.function_calls = None
+        self.usage_metadata = None
+        self._text: List[str] = []
+
+    def add(self, chunk):
+        if chunk.function_calls:
+            self.function_calls = (self.function_calls or []) + list(chunk.function_calls)
+        if chunk.text:
+            self._text.append(chunk.text)
+        # Every chunk reports the usage so far
+        self.usage_metadata = getattr(chunk, "usage_metadata", None) or self.usage_metadata
+
+    @property
+    def text(self) -> Optional[str]:
+        return "".join(self._text) or None
+
+
+def tool_records(result: str) -> List[dict]:
+    """
+    The records of a tool result, either a JSON list or the budgeted columns and rows.
+    """
+    records = parse_records(result)
+    if records is not None:
+        return records
+    if not result.startswith("{"):
+        return []
+    try:
+        payload = json.loads(result)
+    except ValueError:
+        return []
+    if not isinstance(payload, dict) or "columns" not in payload:
+        return []
+    return [dict(zip(payload["columns"], row)) for row in payload.get("rows", [])]
+
+
+def web_entity(result: dict) -> Optional[dict]:
+    """
+    The person or company behind a profile page search result, None for other pages.
+    """
+    link = result.get("link") or ""
+    kind = next((kind for path, kind in PROFILE_LINKS.items() if path in link), None)
+    title = result.get("title") or ""
+    if kind is None or not title:
+        return None
+    parts = [p.strip() for p in _TITLE_SEPARATORS.split(title) if p.strip()]
+    while len(parts) > 1 and parts[-1].lower() in TITLE_SUFFIXES:
+        parts.pop()
+    entity = {"type": kind, "name": parts[0], "source": "web"}
+    if kind == "person":
+        if len(parts) > 1:
+            entity["role"] = parts[1]
+        if len(parts) > 2:
+            entity["company"] = parts[2]
+    return entity
+
+
+def web_entities(records: Iterable[dict]) -> List[dict]:
+    return [entity for entity in map(web_entity, records) if entity is not None]
+
+
+class EntityEmitter:
+    """
+    Turns the entities found while a search runs into `entity` events.
+
+    Every record is validated against `EntityModel`, records without a `type` are
+    taken for people unless they only have an industry. An entity is sent once per
+    stream, known by its id and by its name and company, so the model repeating a
+    database row without its id does not add a second card. Only database rows
+    carry an id: one on any other entity is dropped unless it names a row already
+    sent in this stream, since the model makes them up.
+    """
+
+    def __init__(self):
+        self._seen = set()
+        self._db_ids = set()
+        self.sent: List[dict] = []
+
+    def _keys(self, entity: dict) -> list:
+        keys = [("name", entity["name"].strip().casefold(), (entity.get("company") or "").strip().casefold())]
+        if entity.get("id") is not None:
+            keys.append(("id", entity["id"]))
+        return keys
+
+    def events(self, records: Iterable[dict], origin: str) -> List[dict]:
+        events = []
+        for record in records:
+            if "type" not in record:
+                is_business = record.get("industry") and not record.get("role")
+                record = {**record, "type": "business" if is_business else "person"}
+            if origin != "db" and "id" in record and record["id"] not in self._db_ids:
+                record = {key: value for key, value in record.items() if key != "id"}
+            try:
+                entity = EntityModel(**record).model_dump(exclude_none=True)
+            except (ValidationError, TypeError) as e:
+                logger.debug(f"Skipping invalid {origin} entity: {e}")
+                continue
+            if not entity["name"].strip():
+                continue
+            keys = self._keys(entity)
+            if any(key in self._seen for key in keys):
+                continue
+            self._seen.update(keys)
+            if origin == "db" and entity.get("id") is not None:
+                self._db_ids.add(entity["id"])
+            events.append({"type": "entity", "origin": origin, "entity": entity})
+        self.sent.extend(events)
+        return events
+
+    def findings(self) -> List[dict]:
+        """
+        The entities sent so far that did not come from the database, including
+        those the model gave an id of its own.
+        """
+        return [event["entity"] for event in self.sent
+                if event["origin"] != "db" and event["entity"].get("id") not in self._db_ids]
@@ -0,0 +1,148 @@
+import re
+import logging
+from typing import List, Optional
+from sqlalchemy import text, or_
+from sqlalchemy.orm import Session
+from app.database import Entity
+
+logger = logging.getLogger(__name__)
+
+# Columns covered by the text index, in index order
+FTS_COLUMNS = ["name", "role", "company", "industry", "location", "group"]
+
+_QUOTED_COLUMNS = ", ".join(f'"{c}"' for c in FTS_COLUMNS)
+_NEW_VALUES = ", ".join(f'new."{c}"' for c in FTS_COLUMNS)
+_OLD_VALUES = ", ".join(f'old."{c}"' for c in FTS_COLUMNS)
+
+# --- SQLITE (FTS5) ---
+# External-content table: the text lives in `entities`, the triggers keep the index in sync.
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+        {_QUOTED_COLUMNS}, content='entities', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS entities_fts_ai AFTER INSERT ON entities BEGIN
+        INSERT INTO entities_fts(rowid, {_QUOTED_COLUMNS}) VALUES (new.id, {_NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS entities_fts_ad AFTER DELETE ON entities BEGIN
+        INSERT INTO entities_fts(entities_fts, rowid, {_QUOTED_COLUMNS}) VALUES ('delete', old.id, {_OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS entities_fts_au AFTER UPDATE ON entities BEGIN
+        INSERT INTO entities_fts(entities_fts, rowid, {_QUOTED_COLUMNS}) VALUES ('delete', old.id, {_OLD_VALUES});
+        INSERT INTO entities_fts(rowid, {_QUOTED_COLUMNS}) VALUES (new.id, {_NEW_VALUES});
+    END""",
+]
+
+SQLITE_QUERY = """
+    SELECT entities.* FROM entities_fts
+    JOIN entities ON entities.id = entities_fts.rowid
+    WHERE entities_fts MATCH :match
+    ORDER BY bm25(entities_fts)
+    LIMIT :limit
+"""
+
+# --- POSTGRES (tsvector + GIN) ---
+# A generated column is maintained by Postgres itself on insert/update.
+# Like FTS5's remove_diacritics, the text search configuration folds accents on both
+# sides, so "Sao Paulo" finds "São Paulo". unaccent() itself is not immutable and
+# cannot be used in a generated column, a configuration with its dictionary can.
+
+TS_CONFIG = "nexus_unaccent"
+
+_PG_DOCUMENT = " || ' ' || ".join(f"coalesce(\"{c}\", '')" for c in FTS_COLUMNS)
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    f"""DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{TS_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {TS_CONFIG} (COPY = simple);
+            ALTER TEXT SEARCH CONFIGURATION {TS_CONFIG} ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+        END IF;
+    END $$""",
+    # Columns generated before accents were folded are generated again
+    f"""DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema()
+                   AND table_name = 'entities' AND column_name = 'search_vector' AND position('{TS_CONFIG}' in generation_expression) = 0) THEN
+            ALTER TABLE entities DROP COLUMN search_vector;
+        END IF;
+    END $$""",
+    f"""ALTER TABLE entities ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', {_PG_DOCUMENT})) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_entities_search_vector ON entities USING GIN (search_vector)",
+]
+
+POSTGRES_QUERY = f"""
+    SELECT entities.* FROM entities
+    WHERE search_vector @@ to_tsquery('{TS_CONFIG}', :match)
+    ORDER BY ts_rank_cd(search_vector, to_tsquery('{TS_CONFIG}', :match)) DESC
+    LIMIT :limit
+"""
+
+
+def create_fulltext_index(engine):
+    """
+    Creates the text index for the current dialect. Safe to call on every startup.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'entities_fts'")).first()
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows that were inserted before the index existed
+                conn.execute(text("INSERT INTO entities_fts(entities_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+        else:
+            logger.warning(f"No full-text index support for dialect {dialect}, falling back to ILIKE.")
+
+
+def _tokenize(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def search_entities(db: Session, query: str, limit: int = 20) -> List[Entity]:
+    """
+    Returns the `limit` best matching entities, ranked by relevance.
+    Any query term may match (prefix match), rows matching more terms rank higher.
+    """
+    tokens = _tokenize(query)
+    if not tokens:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = text(SQLITE_QUERY)
+    elif dialect == "postgresql":
+        statement = text(POSTGRES_QUERY)
+    else:
+        return search_entities_ilike(db, query, limit)
+
+    return db.query(Entity).from_statement(statement).params(match=match_expression(dialect, query), limit=limit).all()
+
+
+def match_expression(dialect: str, query: str) -> Optional[str]:
+    """
+    The text index query matching any word of `query` as a prefix, None without words.
+    """
+    tokens = _tokenize(query)
+    if not tokens:
+        return None
+    if dialect == "sqlite":
+        return " OR ".join(f'"{t}"*' for t in tokens)
+    return " | ".join(f"{t}:*" for t in tokens)
+
+
+def search_entities_ilike(db: Session, query: str, limit: int = None) -> List[Entity]:
+    """
+    Unindexed substring search, kept for dialects without a text index and for benchmarks.
+    """
+    search_term = f"%{query}%"
+    q = db.query(Entity).filter(
+        or_(Entity.name.ilike(search_term), Entity.role.ilike(search_term), Entity.company.ilike(search_term))
+    )
+    if limit is not None:
+        q = q.limit(limit)
+    return q.all()
@@ -0,0 +1,43 @@
+import logging
+from typing import Optional
+from google import genai
+from app.config import GEMINI_API_KEY
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiClient:
+    """
+    App-lifetime google-genai client.
+
+    Opened in the app lifespan and shared by every request, so model calls reuse
+    its pooled HTTP connections instead of building a client (and new TLS
+    connections) per search.
+    """
+
+    def __init__(self, api_key: Optional[str] = GEMINI_API_KEY):
+        self.api_key = api_key
+        self.client: Optional[genai.Client] = None
+
+    def start(self) -> Optional[genai.Client]:
+        if self.client is None and self.api_key:
+            try:
+                self.client = genai.Client(api_key=self.api_key)
+            except Exception as e:
+                logger.error(f"Failed to initialize GenAI client: {e}")
+        return self.client
+
+    def get(self) -> Optional[genai.Client]:
+        """
+        The shared client. Outside the app lifespan (scripts, tests) it is created on first use.
+        """
+        return self.client if self.client is not None else self.start()
+
+    async def close(self):
+        if self.client is not None:
+            client, self.client = self.client, None
+            await client.aio.aclose()
+            client.close()
+
+
+gemini = GeminiClient()
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import logging
+from typing import Optional
+import httpx
+from app.config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+    HTTP_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_MAX_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying for idempotent requests
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamClient:
+    """
+    App-lifetime async HTTP client for upstream APIs (SerpApi).
+
+    Keeps a pool of keep-alive connections, bounds connect/read time, retries
+    idempotent GETs with jittered exponential backoff and caps how many requests
+    are in flight upstream at once.
+    """
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_connections: int = HTTP_MAX_CONNECTIONS, max_keepalive: int = HTTP_MAX_KEEPALIVE,
+                 retries: int = HTTP_RETRIES, backoff_base: float = HTTP_BACKOFF_BASE,
+                 backoff_max: float = HTTP_BACKOFF_MAX, max_concurrency: int = HTTP_MAX_CONCURRENCY,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout, write=read_timeout, pool=read_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """
+        Full-jitter exponential backoff, or the upstream Retry-After hint when it gives one.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> dict:
+        """
+        GETs `url` and decodes the JSON body, retrying transient failures.
+        Raises the last httpx error once the retries are used up.
+        """
+        if self._client is None:
+            # Outside the app lifespan (scripts, tests), open the pool on first use
+            await self.start()
+
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.get(url, params=params)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f"Upstream returned {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == self.retries:
+                raise error
+            delay = self._backoff(attempt, response)
+            logger.warning(f"Upstream GET {url} failed ({error!r}), retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+# Shared instance, opened and closed by the app lifespan
+http_client = UpstreamClient()
@@ -0,0 +1,231 @@
+"""
+Streaming bulk import of entities from CSV or NDJSON.
+
+Records are read lazily, validated with `EntityModel` and written in fixed-size
+chunks with one multi-row upsert per chunk, so memory stays bounded whatever the
+file size.
+
+Usage (from nexus-light-backend/):
+    python -m app.importer leads.csv [--format csv|ndjson] [--chunk-size 5000] [--on-conflict update|ignore]
+                                     [--notify http://localhost:8000]
+
+A running server keeps its answer cache, enrichment dedup and vector index until it
+is told about the import: --notify calls its /api/entities/refresh when the import
+ends, otherwise call it yourself or restart the server.
+"""
+import csv
+import sys
+import json
+import time
+import argparse
+import logging
+from itertools import islice
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database import Entity, engine as default_engine
+from app.models import EntityModel
+from app.config import IMPORT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+ENTITY_COLUMNS = [c.name for c in Entity.__table__.columns]
+# Set by the enrichment workers, imports never carry it
+NOT_IMPORTED = {"id", "refreshed_at"}
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportReport:
+    """
+    Running totals of an import, also passed to the progress callback after every chunk.
+    """
+
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.invalid = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "written": self.written,
+            "invalid": self.invalid,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.written / self.elapsed, 1) if self.elapsed else None,
+            "errors": self.errors,
+        }
+
+
+# --- READERS ---
+
+def _clean_csv_row(row: Dict[str, str]) -> dict:
+    record = {k: (v if v != "" else None) for k, v in row.items() if k}
+    coords = record.pop("coords", None)
+    if coords:
+        record["coords"] = json.loads(coords)
+    elif record.get("x") is not None and record.get("y") is not None:
+        record["coords"] = {"x": float(record["x"]), "y": float(record["y"])}
+    record.pop("x", None)
+    record.pop("y", None)
+    return record
+
+
+# Readers yield the exception instead of a record for rows they cannot parse,
+# so one bad line is reported instead of aborting the import.
+
+def read_csv(stream: IO[str]) -> Iterator[dict]:
+    for row in csv.DictReader(stream):
+        try:
+            yield _clean_csv_row(row)
+        except ValueError as e:
+            yield e
+
+
+def read_ndjson(stream: IO[str]) -> Iterator[dict]:
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def detect_format(filename: str) -> str:
+    return "ndjson" if filename.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+# --- WRITER ---
+
+def _insert(dialect: str):
+    if dialect == "postgresql":
+        return postgresql.insert(Entity.__table__)
+    if dialect == "sqlite":
+        return sqlite.insert(Entity.__table__)
+    raise ValueError(f"Bulk upsert is not supported on {dialect}")
+
+
+def upsert_rows(connection, rows: List[dict], on_conflict: str = "update"):
+    """
+    Writes one chunk with a single executemany. Rows with an id are upserted on it,
+    rows without one are plain inserts. An upsert only changes the fields the row has,
+    those it leaves empty keep what is stored, e.g. a company found on the web.
+    """
+    dialect = connection.dialect.name
+    with_id = [r for r in rows if r.get("id") is not None]
+    without_id = [r for r in rows if r.get("id") is None]
+
+    if with_id:
+        statement = _insert(dialect)
+        if on_conflict == "ignore":
+            statement = statement.on_conflict_do_nothing(index_elements=["id"])
+        else:
+            table = Entity.__table__
+            updates = {c: func.coalesce(statement.excluded[c], table.c[c])
+                       for c in ENTITY_COLUMNS if c not in NOT_IMPORTED}
+            statement = statement.on_conflict_do_update(index_elements=["id"], set_=updates)
+        connection.execute(statement, with_id)
+    if without_id:
+        connection.execute(Entity.__table__.insert(), [{k: v for k, v in r.items() if k != "id"} for r in without_id])
+
+
+def _validate(record: dict, line: int, report: ImportReport) -> Optional[dict]:
+    try:
+        if isinstance(record, Exception):
+            raise record
+        entity = EntityModel(**record)
+    except (ValidationError, ValueError, TypeError) as e:
+        report.invalid += 1
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append({"record": line, "error": str(e).splitlines()[0]})
+        return None
+    # executemany needs the same keys on every row
+    return entity.model_dump()
+
+
+def import_records(records: Iterable[dict], engine=default_engine, chunk_size: int = IMPORT_CHUNK_SIZE,
+                   on_conflict: str = "update",
+                   progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """
+    Validates and upserts `records`, one transaction per chunk of `chunk_size` rows.
+    """
+    report = ImportReport()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for record in chunk:
+            report.read += 1
+            row = _validate(record, report.read, report)
+            if row is not None:
+                rows.append(row)
+        if rows:
+            with engine.begin() as connection:
+                upsert_rows(connection, rows, on_conflict)
+            report.written += len(rows)
+        if progress:
+            progress(report)
+    return report
+
+
+def import_file(stream: IO[str], fmt: str = "csv", **kwargs) -> ImportReport:
+    return import_records(READERS[fmt](stream), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or NDJSON file, '-' for stdin")
+    parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--on-conflict", choices=["update", "ignore"], default="update")
+    parser.add_argument("--notify", metavar="SERVER_URL", help="running server whose caches are refreshed afterwards")
+    args = parser.parse_args()
+
+    from app.database import create_db_and_tables
+    create_db_and_tables()
+
+    def print_progress(report: ImportReport):
+        print(f"{report.read} read, {report.written} written, {report.invalid} invalid "
+              f"({report.written / report.elapsed:.0f} rows/s)", file=sys.stderr)
+
+    fmt = args.format or detect_format(args.path)
+    stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    try:
+        with stream:
+            report = import_file(stream, fmt, chunk_size=args.chunk_size, on_conflict=args.on_conflict,
+                                 progress=print_progress)
+    finally:
+        # Chunks committed before a failure stay, as with the import endpoint
+        notify_server(args.notify)
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+def notify_server(server_url: Optional[str]):
+    """
+    Asks a running server to drop the caches built on entities.
+    """
+    if not server_url:
+        print("A running server serves cached results until POST /api/entities/refresh or a restart.",
+              file=sys.stderr)
+        return
+    import httpx
+    try:
+        httpx.post(f"{server_url.rstrip('/')}/api/entities/refresh", timeout=10).raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Could not refresh {server_url} ({e}), restart it or POST /api/entities/refresh.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import re
+import zlib
+import logging
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH = "SEARCH"
+CHAT = "CHAT"
+
+# --- RULES ---
+# High precision patterns only, anything ambiguous is left to the linear model.
+
+SEARCH_RULES = re.compile(
+    r"\b(who is|who's|who are|find|search for|look up|lookup|people at|contacts? (at|for)|"
+    r"leads? (at|in|for)|companies in|businesses in|quem é|encontre|buscar?)\b"
+)
+GREETINGS = (r"hi|hello|hey|hiya|yo|ol[aá]|oi|thanks|thank you|thx|obrigad[oa]|good (morning|afternoon|evening)|"
+             r"bom dia|boa (tarde|noite)|bye|goodbye|ok|okay|cool")
+# Words that may follow a greeting, anything else (e.g. "hey Nubank") can be a search
+FILLERS = r"there|all|everyone|everybody|folks|guys|team|friend|again|a lot|so much|very much|muito|gente|pessoal"
+CHAT_RULES = re.compile(rf"^({GREETINGS})([\s,!.?]+({GREETINGS}|{FILLERS}))*[\s!.?]*$")
+RULE_CONFIDENCE = 0.97
+
+# --- SEED DATA ---
+# Used to train the model when no weights file is available.
+
+SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("find the VP of sales at TechFlow", SEARCH),
+    ("who is the CTO of Nubank", SEARCH),
+    ("fintech companies in São Paulo", SEARCH),
+    ("head of growth at Vtex", SEARCH),
+    ("Elena Silva", SEARCH),
+    ("Marcus Chen Nubank", SEARCH),
+    ("list enterprise customers in Buenos Aires", SEARCH),
+    ("show me people at Mercado Libre", SEARCH),
+    ("marketing managers in Rio de Janeiro", SEARCH),
+    ("CRO at Vtex", SEARCH),
+    ("decision makers at Stone payments", SEARCH),
+    ("SaaS startups hiring sales reps", SEARCH),
+    ("e-commerce companies in Mexico City", SEARCH),
+    ("contact info for iFood procurement", SEARCH),
+    ("who runs marketing at Creditas", SEARCH),
+    ("CFO of Loft", SEARCH),
+    ("healthtech businesses in Bogotá", SEARCH),
+    ("sales leaders at Brazilian fintechs", SEARCH),
+    ("email of the head of partnerships at TechFlow", SEARCH),
+    ("companies similar to Nubank", SEARCH),
+    ("VP engineering Mercado Libre LinkedIn", SEARCH),
+    ("logistics companies near São Paulo", SEARCH),
+    ("account executives at Stone", SEARCH),
+    ("latest news about TechFlow funding", SEARCH),
+    ("who founded Vtex", SEARCH),
+    ("retail leads in Argentina", SEARCH),
+    ("growth team at iFood", SEARCH),
+    ("procurement managers in healthcare", SEARCH),
+    ("TechFlow HQ address", SEARCH),
+    ("quem é o CEO da Nubank", SEARCH),
+    ("hello", CHAT),
+    ("hi there", CHAT),
+    ("thanks a lot", CHAT),
+    ("how are you", CHAT),
+    ("what can you do", CHAT),
+    ("explain what a CRO does", CHAT),
+    ("write a cold email intro", CHAT),
+    ("what is a good follow up cadence", CHAT),
+    ("tell me a joke", CHAT),
+    ("help", CHAT),
+    ("how do I build a campaign", CHAT),
+    ("summarize best practices for prospecting", CHAT),
+    ("good morning", CHAT),
+    ("what does SaaS mean", CHAT),
+    ("draft a linkedin message for a VP of sales", CHAT),
+    ("how should I qualify a lead", CHAT),
+    ("give me tips for a discovery call", CHAT),
+    ("what is the difference between a CRO and a VP sales", CHAT),
+    ("rewrite this email to sound friendlier", CHAT),
+    ("what time is it in São Paulo", CHAT),
+    ("can you help me plan my week", CHAT),
+    ("translate this message to portuguese", CHAT),
+    ("how does the campaign builder work", CHAT),
+    ("what is a good subject line for outreach", CHAT),
+    ("explain BANT", CHAT),
+    ("why is my pipeline so slow", CHAT),
+    ("thank you", CHAT),
+    ("ok cool", CHAT),
+    ("bom dia", CHAT),
+    ("como você está", CHAT),
+]
+
+
+# --- MODEL ---
+
+class HashedLinearClassifier:
+    """
+    Logistic regression over hashed word unigrams/bigrams and character trigrams.
+    Predicts the probability that a query needs a SEARCH.
+    """
+
+    def __init__(self, n_features: int = 2 ** 15):
+        self.n_features = n_features
+        self.weights = np.zeros(n_features, dtype=np.float32)
+        self.bias = 0.0
+        # Accuracy of its confident answers on held out LLM labels, set by benchmarks/eval_intent.py
+        self.precision: Optional[float] = None
+
+    def _hash(self, feature: str) -> int:
+        # crc32 is stable across processes, unlike hash()
+        return zlib.crc32(feature.encode("utf-8")) % self.n_features
+
+    def features(self, text: str) -> np.ndarray:
+        tokens = re.findall(r"\w+", text.lower())
+        grams = [f"w:{t}" for t in tokens]
+        grams += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f"<{token}>"
+            grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return np.unique(np.fromiter((self._hash(g) for g in grams), dtype=np.int64, count=len(grams)))
+
+    def predict_proba(self, text: str) -> float:
+        z = float(self.weights[self.features(text)].sum()) + self.bias
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def fit(self, examples: Iterable[Tuple[str, str]], epochs: int = 30, lr: float = 0.5, l2: float = 1e-4,
+            seed: int = 0):
+        data = [(self.features(text), 1.0 if label == SEARCH else 0.0) for text, label in examples]
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            for i in rng.permutation(len(data)):
+                idx, y = data[i]
+                z = float(self.weights[idx].sum()) + self.bias
+                gradient = 1.0 / (1.0 + np.exp(-z)) - y
+                self.weights[idx] -= lr * (gradient + l2 * self.weights[idx])
+                self.bias -= lr * gradient
+        return self
+
+    def save(self, path: str):
+        extra = {} if self.precision is None else {"precision": np.array([self.precision])}
+        np.savez(path, weights=self.weights, bias=np.array([self.bias]), **extra)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearClassifier":
+        data = np.load(path)
+        model = cls(n_features=len(data["weights"]))
+        model.weights = data["weights"].astype(np.float32)
+        model.bias = float(data["bias"][0])
+        if "precision" in data.files:
+            model.precision = float(data["precision"][0])
+        return model
+
+
+class IntentClassifier:
+    """
+    Local SEARCH/CHAT gate keeper: rules first, then the linear model. An untrusted
+    model (the seed one, or weights that failed the eval gate) is never confident.
+    """
+
+    def __init__(self, model: HashedLinearClassifier, trusted: bool = False):
+        self.model = model
+        self.trusted = trusted
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        """
+        Returns (intent, confidence). Confidence is in [0.5, 1], 0.5 for untrusted guesses.
+        """
+        text = query.strip().lower()
+        if CHAT_RULES.match(text):
+            return CHAT, RULE_CONFIDENCE
+        if SEARCH_RULES.search(text):
+            return SEARCH, RULE_CONFIDENCE
+        p = self.model.predict_proba(text)
+        intent = SEARCH if p >= 0.5 else CHAT
+        if not self.trusted:
+            return intent, 0.5
+        return intent, max(p, 1.0 - p)
+
+
+def load_classifier(path: Optional[str] = None, min_precision: float = 1.0) -> IntentClassifier:
+    """
+    Loads trained weights from `path` when present, otherwise trains on the seed examples.
+    Only weights whose measured precision reaches `min_precision` answer without the LLM,
+    the seed model is too small to calibrate and leaves everything but the rules to it.
+    """
+    if path and os.path.exists(path):
+        model = HashedLinearClassifier.load(path)
+        trusted = model.precision is not None and model.precision >= min_precision
+        logger.info(f"Loading intent model from {path} (precision {model.precision}, trusted: {trusted})")
+        return IntentClassifier(model, trusted)
+    return IntentClassifier(HashedLinearClassifier().fit(SEED_EXAMPLES))
+
+
+# --- LLM GATE KEEPER ---
+# Asked when the local classifier is unsure, and by benchmarks/eval_intent.py to label queries.
+
+GATE_KEEPER_PROMPT = """
+You are a classification model. Your task is to determine if the user's query requires a web search or if it's a simple conversational question.
+Respond with a single word: "SEARCH" if a web search is needed, or "CHAT" if it's a general question.
+
+User Query: "{query}"
+"""
+
+
+def parse_label(text: Optional[str]) -> Optional[str]:
+    """
+    The SEARCH or CHAT label in an LLM reply, None when it gave neither.
+    """
+    words = re.findall(r"[A-Z]+", (text or "").upper())
+    return next((word for word in words if word in (SEARCH, CHAT)), None)
+
+
+# --- CACHE ---
+
+class IntentCache:
+    """
+    Small LRU of normalized query -> intent, shared by local and LLM decisions.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        intent = self._entries.get(key)
+        if intent is not None:
+            self._entries.move_to_end(key)
+        return intent
+
+    def put(self, key: str, intent: str):
+        self._entries[key] = intent
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,256 @@
+import json
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+from sqlalchemy import insert, select
+from starlette.concurrency import run_in_threadpool
+from app.cache import normalize_query
+from app.database import SessionLocal, ChatHistory
+from app.result_budget import count_tokens
+from app.config import (
+    MEMORY_WINDOW_TURNS, MEMORY_MAX_TOKENS, MEMORY_TOOL_RESULTS, MEMORY_MAX_SESSIONS,
+    MEMORY_FLUSH_BATCH_SIZE, MEMORY_FLUSH_INTERVAL_SECONDS, MEMORY_QUEUE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+USER = "user"
+MODEL = "model"
+TOOL = "tool"
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for `chat_history` rows.
+
+    `enqueue` only appends to an in-process buffer, a background task writes the
+    buffer in batches of `batch_size` rows every `interval` seconds (or as soon as a
+    batch is full), so streaming never waits on the database.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = MEMORY_FLUSH_BATCH_SIZE,
+                 interval: float = MEMORY_FLUSH_INTERVAL_SECONDS, max_pending: int = MEMORY_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Deque[dict] = deque()
+        self._writing: List[dict] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Held from taking a batch until it is written, so a flush sees it in the table
+        self._lock = asyncio.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "batches": self.batches, "dropped": self.dropped}
+
+    async def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stops the background task and writes whatever is still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await self.flush()
+
+    def pending(self, session_id: str) -> List[dict]:
+        """
+        Rows of the session not known to be in the table yet, oldest first: the batch
+        being written, then the buffer.
+        """
+        return [row for rows in (self._writing, self._pending) for row in rows if row["session_id"] == session_id]
+
+    def enqueue(self, session_id: str, role: str, content: str):
+        if len(self._pending) >= self.max_pending:
+            # The database is not keeping up, losing old turns beats unbounded memory
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append({"session_id": session_id, "role": role, "content": content,
+                              "timestamp": datetime.utcnow()})
+        if self._wake is not None and len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Writes the buffer, and waits for a batch the background task is writing.
+        """
+        async with self._lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._writing = batch
+                try:
+                    await run_in_threadpool(self._write, batch)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} chat history rows: {e}")
+                    self.dropped += len(batch)
+                    return
+                finally:
+                    self._writing = []
+                self.written += len(batch)
+                self.batches += 1
+
+    def _write(self, batch: List[dict]):
+        db = self.session_factory()
+        try:
+            db.execute(insert(ChatHistory), batch)
+            db.commit()
+        finally:
+            db.close()
+
+
+class SessionState:
+    """
+    The in-process tail of one session: its last turns and its last tool results.
+    """
+
+    def __init__(self, window_turns: int, tool_results: int):
+        self.turns: Deque[dict] = deque(maxlen=window_turns)
+        self.tools: "OrderedDict[tuple, str]" = OrderedDict()
+        self.tool_results = tool_results
+
+    def add_tool(self, tool_name: str, query: str, result: str):
+        key = (tool_name, normalize_query(query))
+        self.tools[key] = result
+        self.tools.move_to_end(key)
+        while len(self.tools) > self.tool_results:
+            self.tools.popitem(last=False)
+
+
+class SessionMemory:
+    """
+    Session-scoped conversation memory on top of the `chat_history` table.
+
+    Recent sessions are kept in an LRU of `max_sessions` entries, older ones are
+    loaded back from the table on their next request. The prompt only ever gets the
+    last `window_turns` turns that fit in `max_tokens`, so its size stays constant as
+    a session grows. Successful tool results are remembered per (tool, query) and
+    handed back instead of running the tool again.
+    """
+
+    def __init__(self, writer: HistoryWriter, window_turns: int = MEMORY_WINDOW_TURNS,
+                 max_tokens: int = MEMORY_MAX_TOKENS, tool_results: int = MEMORY_TOOL_RESULTS,
+                 max_sessions: int = MEMORY_MAX_SESSIONS):
+        self.writer = writer
+        self.window_turns = window_turns
+        self.max_tokens = max_tokens
+        self.tool_results = tool_results
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self.loads = 0
+        self.reused_tool_results = 0
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "loads": self.loads,
+                "reused_tool_results": self.reused_tool_results, "writer": self.writer.stats()}
+
+    def _load(self, session_id: str) -> Tuple[List[tuple], List[tuple]]:
+        """
+        The newest stored (role, content, timestamp) turns and tool results of the session, oldest first.
+        """
+        db = self.writer.session_factory()
+        try:
+            newest_first = lambda roles, limit: db.execute(
+                select(ChatHistory.role, ChatHistory.content, ChatHistory.timestamp)
+                .where(ChatHistory.session_id == session_id, ChatHistory.role.in_(roles))
+                .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc()).limit(limit)
+            ).all()
+            turns = [tuple(row) for row in reversed(newest_first([USER, MODEL], self.window_turns))]
+            tools = [tuple(row) for row in reversed(newest_first([TOOL], self.tool_results))]
+        finally:
+            db.close()
+        return turns, tools
+
+    async def load(self, session_id: str) -> SessionState:
+        state = self._sessions.get(session_id)
+        if state is None:
+            # Rows of an evicted session may still sit in the write-behind buffer, newer
+            # than the stored ones. Taken before the read too, in case they are written
+            # while it runs, rows found twice are kept once.
+            pending = self.writer.pending(session_id)
+            turns, tools = await run_in_threadpool(self._load, session_id)
+            self.loads += 1
+            seen = set(turns) | set(tools)
+            for row in pending + self.writer.pending(session_id):
+                key = (row["role"], row["content"], row["timestamp"])
+                if key not in seen:
+                    seen.add(key)
+                    (tools if row["role"] == TOOL else turns).append(key)
+            loaded = SessionState(self.window_turns, self.tool_results)
+            for role, content, _ in turns:
+                loaded.turns.append({"role": role, "content": content})
+            for _, content, _ in tools:
+                tool = json.loads(content)
+                loaded.add_tool(tool["tool_name"], tool["query"], tool["result"])
+            state = self._sessions.setdefault(session_id, loaded)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return state
+
+    async def window(self, session_id: str) -> List[dict]:
+        """
+        The newest turns of the session that fit the token budget, oldest first,
+        always starting with a user turn.
+        """
+        state = await self.load(session_id)
+        window, used = [], 0
+        for turn in reversed(state.turns):
+            used += count_tokens(turn["content"])
+            if used > self.max_tokens:
+                break
+            window.append(turn)
+        window.reverse()
+        while window and window[0]["role"] != USER:
+            window.pop(0)
+        return window
+
+    def _state(self, session_id: str) -> Optional[SessionState]:
+        return self._sessions.get(session_id)
+
+    def record_exchange(self, session_id: str, question: str, answer: str):
+        state = self._state(session_id)
+        for role, content in ((USER, question), (MODEL, answer)):
+            if state is not None:
+                state.turns.append({"role": role, "content": content})
+            self.writer.enqueue(session_id, role, content)
+
+    def remember_tool(self, session_id: str, tool_name: str, query: str, result: str):
+        state = self._state(session_id)
+        if state is not None:
+            state.add_tool(tool_name, query, result)
+        self.writer.enqueue(session_id, TOOL, json.dumps({"tool_name": tool_name, "query": query, "result": result}))
+
+    def tool_result(self, session_id: str, tool_name: str, query: str) -> Optional[str]:
+        state = self._state(session_id)
+        result = state.tools.get((tool_name, normalize_query(query))) if state is not None else None
+        if result is not None:
+            self.reused_tool_results += 1
+        return result
+
+
+history_writer = HistoryWriter()
+session_memory = SessionMemory(history_writer)
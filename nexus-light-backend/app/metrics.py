@@ -0,0 +1,224 @@
+"""
+In-process metrics and per-request tracing.
+
+Counters and histograms are exported in the Prometheus text format by
+`/api/metrics`. A `Trace` bound to the current request collects the timing of
+every `span` opened while it runs, including in tool tasks and threadpool calls,
+which inherit the request's context.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf), sum, count
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[n]) for n in self.labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "nexus_stage_duration_seconds", "Duration of each pipeline stage.", labels=("stage",)))
+SEARCH_TTFB_SECONDS = REGISTRY.register(Histogram(
+    "nexus_search_ttfb_seconds", "Time until the first NDJSON event of /api/search."))
+SEARCH_FIRST_ENTITY_SECONDS = REGISTRY.register(Histogram(
+    "nexus_search_first_entity_seconds", "Time until the first entity event of /api/search, when it had one."))
+SEARCH_DURATION_SECONDS = REGISTRY.register(Histogram(
+    "nexus_search_stream_duration_seconds", "Total duration of a /api/search stream."))
+MODEL_SECONDS = REGISTRY.register(Histogram(
+    "nexus_model_request_duration_seconds", "Latency of single model requests.", labels=("model", "outcome")))
+MODEL_TOKENS = REGISTRY.register(Counter(
+    "nexus_model_tokens_total", "Tokens reported by the model API.", labels=("model", "kind")))
+MODEL_RATE_LIMITED = REGISTRY.register(Counter(
+    "nexus_model_rate_limited_total", "Requests rejected with 429 / RESOURCE_EXHAUSTED.", labels=("model",)))
+TOOL_RESULT_TOKENS = REGISTRY.register(Counter(
+    "nexus_tool_result_tokens_total", "Tokens of tool results before (raw) and after (sent) budgeting.",
+    labels=("tool", "kind")))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "nexus_admission_wait_seconds", "Time searches waited in the admission queue."))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "nexus_admission_rejected_total", "Searches turned away by admission control.", labels=("reason",)))
+ENRICHMENT_ENTITIES = REGISTRY.register(Counter(
+    "nexus_enrichment_entities_total", "Web findings written to (inserted, merged) or kept out of the entities table.",
+    labels=("outcome",)))
+
+
+# --- TRACING ---
+
+class Trace:
+    """
+    Stage timings and token counts of one request, emitted as its final `timings` event.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.first_byte: Optional[float] = None
+        self.first_entity: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.spans: List[dict] = []
+        self.tokens = {"prompt": 0, "output": 0}
+        self.model_calls = 0
+        # Every request sent to a model, answered or not
+        self.model_attempts = 0
+        self._lock = threading.Lock()
+
+    def _ms(self, seconds: float) -> float:
+        return round(seconds * 1000, 1)
+
+    def add_span(self, stage: str, start: float, duration: float):
+        with self._lock:
+            self.spans.append({"stage": stage, "start_ms": self._ms(start - self.started), "ms": self._ms(duration)})
+
+    def add_tokens(self, prompt: int, output: int):
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["output"] += output
+            self.model_calls += 1
+
+    def add_model_attempt(self):
+        with self._lock:
+            self.model_attempts += 1
+
+    def mark_first_byte(self):
+        if self.first_byte is None:
+            self.first_byte = self.clock()
+
+    def mark_first_entity(self):
+        if self.first_entity is None:
+            self.first_entity = self.clock()
+
+    def finish(self):
+        self.finished = self.clock()
+
+    def to_dict(self) -> dict:
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["stage"]] = round(totals.get(span["stage"], 0) + span["ms"], 1)
+        end = self.finished if self.finished is not None else self.clock()
+        return {
+            "ttfb_ms": self._ms(self.first_byte - self.started) if self.first_byte is not None else None,
+            "first_entity_ms": self._ms(self.first_entity - self.started) if self.first_entity is not None else None,
+            "total_ms": self._ms(end - self.started),
+            "stages": totals,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+            "tokens": dict(self.tokens),
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times the enclosed block into the stage histogram and the current request's trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, start, duration)
+
+
+def record_usage(model: str, response):
+    """
+    Counts the tokens of a model response, when the API reported them.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_token_count", None) or 0
+    output = getattr(usage, "candidates_token_count", None) or 0
+    MODEL_TOKENS.inc(prompt, model=model, kind="prompt")
+    MODEL_TOKENS.inc(output, model=model, kind="output")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_tokens(prompt, output)
@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+import logging
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.gemini import GeminiClient
+from app.model_router import ModelRouter
+from app.config import MODEL_CATALOG_PATH, MODEL_CATALOG_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Chain used until a catalog was ever fetched
+DEFAULT_MODELS = ['gemini-1.5-pro', 'gemini-1.0-pro']
+# Tried first when the API lists them
+PRIORITY_MODELS = ['gemini-1.5-pro', 'gemini-1.0-pro-001', 'gemini-1.0-pro'] # gemini-1.0-pro-001 is often more stable
+# Retry a failed refresh sooner than the regular interval
+RETRY_SECONDS = 60
+
+
+def select_models(all_models) -> List[str]:
+    """
+    Model ids supporting generateContent, the priority models first.
+    """
+    available_models = []
+    for model_name in PRIORITY_MODELS:
+        for m in all_models:
+            if m.name == f"models/{model_name}" and "generateContent" in (m.supported_actions or []):
+                available_models.append(model_name)
+                break # Found and added, move to next priority
+
+    for m in all_models:
+        model_id = m.name.split('/')[-1]
+        if model_id not in available_models and "generateContent" in (m.supported_actions or []):
+            available_models.append(model_id)
+    return list(dict.fromkeys(available_models))
+
+
+class ModelCatalog:
+    """
+    Keeps the router's model chain in a JSON file, so startup never waits on `models.list`.
+
+    `start` sets the chain from the file (or `DEFAULT_MODELS` on the very first start)
+    and returns immediately. A background task then lists the models again once the
+    file is older than `refresh_interval`, and every `refresh_interval` after that.
+    """
+
+    def __init__(self, router: ModelRouter, gemini: GeminiClient, path: str = MODEL_CATALOG_PATH,
+                 refresh_interval: float = MODEL_CATALOG_REFRESH_SECONDS, clock=time.time):
+        self.router = router
+        self.gemini = gemini
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.source = "default"
+        self.fetched_at: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def stats(self) -> dict:
+        return {"models": self.router.models, "source": self.source, "fetched_at": self.fetched_at,
+                "refreshes": self.refreshes, "failures": self.failures}
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path) as f:
+                catalog = json.load(f)
+            if catalog.get("models"):
+                return catalog
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model catalog {self.path}: {e}")
+        return None
+
+    def _save(self, catalog: dict):
+        with open(self.path, "w") as f:
+            json.dump(catalog, f)
+
+    async def refresh(self) -> bool:
+        """
+        Lists the models, updates the router and the file. Keeps the current chain on failure.
+        """
+        client = self.gemini.get()
+        if client is None:
+            return False
+        try:
+            models = select_models([m async for m in await client.aio.models.list()])
+            if not models:
+                raise ValueError("no model supports generateContent")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to list or filter GenAI models: {e}")
+            return False
+
+        self.router.set_models(models)
+        self.source = "api"
+        self.fetched_at = self.clock()
+        self.refreshes += 1
+        try:
+            await run_in_threadpool(self._save, {"models": models, "fetched_at": self.fetched_at})
+        except OSError as e:
+            logger.warning(f"Failed to write model catalog {self.path}: {e}")
+        logger.info(f"Model router populated with: {models}")
+        return True
+
+    async def start(self):
+        catalog = self.load()
+        if catalog is not None:
+            self.router.set_models(catalog["models"])
+            self.source = "disk"
+            self.fetched_at = catalog.get("fetched_at")
+        elif not self.router.models:
+            self.router.set_models(DEFAULT_MODELS)
+        if self._task is None and self.gemini.api_key:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        age = self.clock() - self.fetched_at if self.fetched_at is not None else None
+        delay = 0 if age is None else max(0.0, self.refresh_interval - age)
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.refresh_interval if await self.refresh() else min(RETRY_SECONDS, self.refresh_interval)
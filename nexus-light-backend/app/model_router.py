@@ -0,0 +1,283 @@
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from google.genai import errors
+from app.metrics import MODEL_SECONDS, MODEL_RATE_LIMITED, current_trace, record_usage
+from app.config import (
+    ROUTER_COOLDOWN_SECONDS, ROUTER_MAX_COOLDOWN_SECONDS, ROUTER_FAILURE_THRESHOLD,
+    ROUTER_EWMA_ALPHA, ROUTER_HEDGE_AFTER_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = "rate_limited"
+UNAVAILABLE = "unavailable"
+FATAL = "fatal"
+
+
+class AllModelsUnavailable(Exception):
+    """
+    Raised when no model in the chain could serve the request.
+    `retry_after` is the time until the first circuit breaker closes, if known.
+    """
+
+    def __init__(self, message: str = "All models in the fallback chain failed.", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_seconds(value: Any) -> Optional[float]:
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)s?\s*$", str(value))
+    return float(match.group(1)) if match else None
+
+
+def retry_after_hint(error: Exception) -> Optional[float]:
+    """
+    Extracts a retry delay from a Retry-After header or a google.rpc.RetryInfo detail.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("retry-after"):
+        return _parse_seconds(headers.get("retry-after"))
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details", [])
+    for detail in details if isinstance(details, list) else []:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            return _parse_seconds(detail["retryDelay"])
+    return None
+
+
+def classify_error(error: Exception) -> Tuple[str, Optional[float]]:
+    """
+    Returns (kind, retry_after). Rate limits and unavailable models move on to the
+    next model, anything else is a problem with the request and is raised.
+    """
+    if isinstance(error, errors.APIError):
+        if error.code == 429 or error.status == "RESOURCE_EXHAUSTED":
+            return RATE_LIMITED, retry_after_hint(error)
+        if error.code in (404, 408) or (error.code or 0) >= 500:
+            return UNAVAILABLE, None
+        return FATAL, None
+    if isinstance(error, asyncio.TimeoutError):
+        return UNAVAILABLE, None
+    if "429" in str(error) and "RESOURCE_EXHAUSTED" in str(error):
+        return RATE_LIMITED, None
+    return FATAL, None
+
+
+class ModelHealth:
+    """
+    Circuit breaker and running statistics for one model.
+    """
+
+    def __init__(self, name: str, priority: int):
+        self.name = name
+        self.priority = priority
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.probing = False
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def state(self, now: float) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        # After a cooldown a single request probes the model before it takes full traffic
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "model": self.name,
+            "state": self.state(now),
+            "open_for_seconds": round(max(self.open_until - now, 0), 2),
+            "consecutive_failures": self.consecutive_failures,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "error_rate": round(self.ewma_error_rate, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class ModelRouter:
+    """
+    Picks which Gemini model serves a request.
+
+    Replaces the linear walk over a fallback list: models behind an open circuit
+    breaker are skipped until their cooldown (or the server's retry-after hint)
+    has passed, healthy models are tried first, and a hedged request can be sent
+    to the next model when the first one is slow.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, cooldown: float = ROUTER_COOLDOWN_SECONDS,
+                 max_cooldown: float = ROUTER_MAX_COOLDOWN_SECONDS, failure_threshold: int = ROUTER_FAILURE_THRESHOLD,
+                 alpha: float = ROUTER_EWMA_ALPHA, hedge_after: float = ROUTER_HEDGE_AFTER_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failure_threshold = failure_threshold
+        self.alpha = alpha
+        self.hedge_after = hedge_after
+        self.clock = clock
+        self._health: Dict[str, ModelHealth] = {}
+        self.set_models(models or [])
+
+    def set_models(self, models: List[str]):
+        """
+        Replaces the model chain, keeping the statistics of models that stay in it.
+        """
+        self._health = {
+            name: self._health.get(name) or ModelHealth(name, i) for i, name in enumerate(dict.fromkeys(models))
+        }
+        for i, health in enumerate(self._health.values()):
+            health.priority = i
+
+    @property
+    def models(self) -> List[str]:
+        return list(self._health)
+
+    def candidates(self) -> List[str]:
+        """
+        Available models, healthiest first. Configured priority breaks ties.
+        """
+        now = self.clock()
+        available = [h for h in self._health.values() if h.available(now)]
+        bucket = lambda h: 0 if h.ewma_error_rate < 0.2 else 1 if h.ewma_error_rate < 0.5 else 2
+        return [h.name for h in sorted(available, key=lambda h: (h.state(now) != "closed", bucket(h), h.priority))]
+
+    def retry_after(self) -> Optional[float]:
+        now = self.clock()
+        waits = [h.open_until - now for h in self._health.values() if h.open_until > now]
+        return min(waits) if waits else None
+
+    # --- BOOKKEEPING ---
+
+    def record_success(self, model: str, latency: float):
+        health = self._health.get(model)
+        if health is None:
+            return
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.open_until = 0.0
+        health.ewma_latency = latency if health.ewma_latency is None else \
+            self.alpha * latency + (1 - self.alpha) * health.ewma_latency
+        health.ewma_error_rate *= 1 - self.alpha
+
+    def record_failure(self, model: str, kind: str, retry_after: Optional[float] = None):
+        health = self._health.get(model)
+        if health is None:
+            return
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.ewma_error_rate = self.alpha + (1 - self.alpha) * health.ewma_error_rate
+        if kind == RATE_LIMITED:
+            health.rate_limited += 1
+        if kind == RATE_LIMITED or health.consecutive_failures >= self.failure_threshold:
+            backoff = self.cooldown * 2 ** (health.consecutive_failures - 1)
+            cooldown = retry_after if retry_after is not None else min(backoff, self.max_cooldown)
+            health.open_until = self.clock() + cooldown
+            logger.warning(f"Circuit open for model {model} for {cooldown:.1f}s ({kind}).")
+
+    async def track(self, model: str, awaitable: Awaitable):
+        """
+        Awaits a call already bound to `model`, recording its latency and outcome.
+        The attempt counts against the request's quota whatever the outcome.
+        """
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_model_attempt()
+        health = self._health.get(model)
+        half_open = health is not None and health.state(self.clock()) == "half_open"
+        if half_open:
+            health.probing = True
+        start = time.perf_counter()
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            kind, retry_after = classify_error(e)
+            MODEL_SECONDS.observe(time.perf_counter() - start, model=model, outcome=kind)
+            if kind == RATE_LIMITED:
+                MODEL_RATE_LIMITED.inc(model=model)
+            if kind != FATAL:
+                self.record_failure(model, kind, retry_after)
+            raise
+        finally:
+            if half_open:
+                health.probing = False
+        latency = time.perf_counter() - start
+        MODEL_SECONDS.observe(latency, model=model, outcome="success")
+        record_usage(model, result)
+        self.record_success(model, latency)
+        return result
+
+    # --- DISPATCH ---
+
+    async def call(self, fn: Callable[[str], Awaitable], hedge: Optional[bool] = None):
+        """
+        Runs `fn(model_id)` on the best available model, moving down the candidates on
+        rate limits and outages. With hedging, the next candidate is started as well
+        when the current one has not answered after `hedge_after` seconds.
+        """
+        hedge = self.hedge_after > 0 if hedge is None else hedge
+        candidates = iter(self.candidates())
+        pending: Dict[asyncio.Task, str] = {}
+        last_error: Optional[Exception] = None
+
+        def start_next() -> bool:
+            model = next(candidates, None)
+            if model is None:
+                return False
+            logger.info(f"Attempting model: {model}")
+            pending[asyncio.ensure_future(self.track(model, fn(model)))] = model
+            return True
+
+        if not start_next():
+            raise AllModelsUnavailable(retry_after=self.retry_after())
+
+        try:
+            while pending:
+                timeout = self.hedge_after if hedge and len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Model {next(iter(pending.values()))} is slow, hedging.")
+                    if not start_next():
+                        hedge = False
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    kind, _ = classify_error(error)
+                    if kind == FATAL:
+                        raise error
+                    logger.warning(f"Model {model} failed ({kind}). Trying next model.")
+                    last_error = error
+                if not pending:
+                    start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AllModelsUnavailable(retry_after=self.retry_after()) from last_error
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        return {
+            "hedge_after_seconds": self.hedge_after,
+            "candidates": self.candidates(),
+            "models": [h.to_dict(now) for h in self._health.values()],
+        }
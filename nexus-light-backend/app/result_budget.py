@@ -0,0 +1,157 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from app.config import TOOL_RESULT_MAX_TOKENS, TOOL_RESULT_MAX_FIELD_CHARS
+from app.metrics import TOOL_RESULT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Offline estimate of the model's token count: one token per punctuation mark and
+    one per started 4 characters of a word. Close enough for budgeting, and it needs
+    neither a tokenizer download nor an API call.
+    """
+    return sum((len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] == "_" else 1
+               for piece in _PIECES.findall(text))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class BudgetedResult:
+    """
+    A tool result as sent to the model, with what it would have cost unbudgeted.
+    """
+
+    def __init__(self, text: str, raw_tokens: int, tokens: int, kept: int = 0, omitted: int = 0):
+        self.text = text
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+        self.kept = kept
+        self.omitted = omitted
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.raw_tokens - self.tokens
+
+    def to_dict(self) -> dict:
+        return {"raw": self.raw_tokens, "sent": self.tokens, "kept": self.kept, "omitted": self.omitted}
+
+
+class ResultBudget:
+    """
+    Fits a list of records into `max_tokens`.
+
+    Records must arrive best first (bm25 for the database, search position for the
+    web), so the budget keeps the longest prefix that fits. They are sent as one
+    list of column names plus one array per record instead of repeating every key,
+    with empty columns dropped and long values cut to `max_field_chars`.
+    """
+
+    def __init__(self, max_tokens: int = TOOL_RESULT_MAX_TOKENS, max_field_chars: int = TOOL_RESULT_MAX_FIELD_CHARS):
+        self.max_tokens = max_tokens
+        self.max_field_chars = max_field_chars
+
+    def _clip(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.max_field_chars:
+            return value[:self.max_field_chars - 1].rstrip() + "…"
+        return value
+
+    def apply(self, records: List[dict]) -> BudgetedResult:
+        raw_tokens = count_tokens(json.dumps(records, default=str))
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        rows, seen = [], set()
+        for record in records:
+            row = [self._clip(record.get(c)) for c in columns]
+            key = _dumps(row)
+            if key not in seen:
+                seen.add(key)
+                rows.append((row, count_tokens(key) + 1))
+
+        # Reserve room for the header and the omission note
+        used = count_tokens(_dumps({"columns": columns, "rows": []})) + 12
+        kept = []
+        for row, tokens in rows:
+            if kept and used + tokens > self.max_tokens:
+                break
+            kept.append(row)
+            used += tokens
+
+        present = [i for i in range(len(columns)) if any(row[i] not in (None, "") for row in kept)]
+        payload = {"columns": [columns[i] for i in present], "rows": [[row[i] for i in present] for row in kept]}
+        omitted = len(rows) - len(kept)
+        if omitted:
+            payload["omitted"] = omitted
+            payload["note"] = f"{omitted} more results omitted"
+        text = _dumps(payload)
+        return BudgetedResult(text, raw_tokens, count_tokens(text), kept=len(kept), omitted=omitted)
+
+
+def parse_records(result: str) -> Optional[List[dict]]:
+    """
+    The records of a tool result that is a JSON array of objects, None for anything else.
+    """
+    if not result.startswith("["):
+        return None
+    try:
+        records = json.loads(result)
+    except ValueError:
+        return None
+    if isinstance(records, list) and records and all(isinstance(r, dict) for r in records):
+        return records
+    return None
+
+
+class ResultBudgeter:
+    """
+    Shared last stage of every tool call: budgets record lists with the tool's
+    `ResultBudget` and keeps running totals of the tokens it saved.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, ResultBudget]] = None, default: Optional[ResultBudget] = None):
+        self.budgets = budgets or {}
+        self.default = default or ResultBudget()
+        self.calls = 0
+        self.requests = 0
+        self.raw_tokens = 0
+        self.sent_tokens = 0
+        self.omitted = 0
+
+    def apply(self, tool_name: str, result: str) -> BudgetedResult:
+        records = parse_records(result)
+        if records is None:
+            # Messages and errors are short, they go through unchanged
+            tokens = count_tokens(result)
+            budgeted = BudgetedResult(result, tokens, tokens)
+        else:
+            budgeted = self.budgets.get(tool_name, self.default).apply(records)
+        self.calls += 1
+        self.raw_tokens += budgeted.raw_tokens
+        self.sent_tokens += budgeted.tokens
+        self.omitted += budgeted.omitted
+        TOOL_RESULT_TOKENS.inc(budgeted.raw_tokens, tool=tool_name, kind="raw")
+        TOOL_RESULT_TOKENS.inc(budgeted.tokens, tool=tool_name, kind="sent")
+        return budgeted
+
+    def record_request(self, raw_tokens: int, sent_tokens: int):
+        self.requests += 1
+        if raw_tokens:
+            logger.info(f"Tool results: {sent_tokens} tokens sent, {raw_tokens - sent_tokens} saved.")
+
+    def stats(self) -> dict:
+        saved = self.raw_tokens - self.sent_tokens
+        return {
+            "calls": self.calls,
+            "requests": self.requests,
+            "raw_tokens": self.raw_tokens,
+            "sent_tokens": self.sent_tokens,
+            "saved_tokens": saved,
+            "saved_tokens_per_request": round(saved / self.requests, 1) if self.requests else 0,
+            "omitted_results": self.omitted,
+        }
@@ -0,0 +1,270 @@
+import io
+import json
+import base64
+import asyncio
+import logging
+import tempfile
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.database import engine, get_db, Entity
+from app.importer import ENTITY_COLUMNS, ImportReport, READERS, import_file
+from app.enrichment import enrichment
+from app.vector_index import vector_index
+from app.spatial import BBox, entities_in_bbox, nearest_entities, cluster_entities
+from app.facets import facet_counts
+from app.config import IMPORT_CHUNK_SIZE, IMPORT_MAX_CHUNK_SIZE, ENTITY_PAGE_SIZE, ENTITY_MAX_PAGE_SIZE, SPATIAL_MAX_CLUSTER_CELLS
+from app.routes import search
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/entities", tags=["Entities"])
+
+# Uploads larger than this are spooled to disk instead of memory
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+FILTER_COLUMNS = ["type", "status", "group", "industry", "source"]
+EXPORT_BATCH_SIZE = 1000
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+@router.post("/import")
+async def import_entities(request: Request, format: Optional[str] = None, on_conflict: str = "update",
+                          chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    Bulk-imports a CSV or NDJSON request body into the entities table.
+    Streams NDJSON `progress` events after every chunk and a final `done` report.
+    Chunks committed before a failure stay, so caches are dropped either way.
+    """
+    fmt = format or CONTENT_TYPES.get(request.headers.get("content-type", "").split(";")[0].strip())
+    if fmt not in READERS:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson.")
+    if on_conflict not in ("update", "ignore"):
+        raise HTTPException(status_code=400, detail="on_conflict must be 'update' or 'ignore'.")
+    check_limit("chunk_size", chunk_size, IMPORT_MAX_CHUNK_SIZE)
+
+    # Receive the whole body first so the import never waits on the network mid-transaction
+    upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_progress(report: ImportReport):
+        loop.call_soon_threadsafe(events.put_nowait, {"type": "progress", **report.to_dict()})
+
+    def run_import():
+        try:
+            with io.TextIOWrapper(upload, encoding="utf-8", newline="") as stream:
+                return import_file(stream, fmt, engine=engine, chunk_size=chunk_size, on_conflict=on_conflict,
+                                   progress=on_progress)
+        finally:
+            loop.call_soon_threadsafe(on_import_finished)
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    async def stream_progress():
+        task = asyncio.ensure_future(run_in_threadpool(run_import))
+        while (event := await events.get()) is not None:
+            yield json.dumps(event) + "\n"
+        try:
+            report = await task
+        except Exception as e:
+            logger.error(f"Entity import failed: {e}")
+            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "done", **report.to_dict()}) + "\n"
+
+    return StreamingResponse(stream_progress(), media_type="application/x-ndjson")
+
+
+def on_import_finished():
+    """
+    Bulk upserts bypass ORM events, so caches built on entities are dropped here and
+    the vector index embeds the imported rows in the background.
+    """
+    search.answer_cache.invalidate()
+    enrichment.invalidate()
+    vector_index.schedule_sync()
+
+
+@router.post("/refresh")
+def refresh_entities():
+    """
+    Drops the caches built on entities after a write the server did not see, e.g. an
+    import run with `python -m app.importer --notify`. Each worker process has its own
+    caches, so behind several workers this only refreshes the one that answers.
+    """
+    on_import_finished()
+    return {"status": "ok"}
+
+
+# --- LISTING AND EXPORT ---
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Column projection from a comma-separated list. The id is always included for cursors.
+    """
+    if not fields:
+        return ENTITY_COLUMNS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in ENTITY_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in requested if f != "id"]
+
+
+def check_limit(name: str, value: int, maximum: int):
+    if not 1 <= value <= maximum:
+        raise HTTPException(status_code=400, detail=f"{name} must be between 1 and {maximum}.")
+
+
+def entity_filters(type: Optional[str] = None, status: Optional[str] = None, group: Optional[str] = None,
+                   industry: Optional[str] = None, source: Optional[str] = None) -> Dict[str, str]:
+    values = {"type": type, "status": status, "group": group, "industry": industry, "source": source}
+    return {k: v for k, v in values.items() if v is not None}
+
+
+def build_query(filters: Dict[str, str], columns: List[str], after_id: Optional[int] = None):
+    table = Entity.__table__
+    query = select(*[table.c[c] for c in columns])
+    for column, value in filters.items():
+        query = query.where(table.c[column] == value)
+    if after_id is not None:
+        query = query.where(table.c.id > after_id)
+    return query.order_by(table.c.id)
+
+
+def list_entities_page(db: Session, filters: Dict[str, str], columns: List[str], limit: int,
+                       after_id: Optional[int] = None) -> dict:
+    """
+    One keyset page: seeks past `after_id` on the (filter, id) index instead of counting
+    skipped rows with OFFSET, so deep pages cost the same as the first one.
+    """
+    rows = db.execute(build_query(filters, columns, after_id).limit(limit + 1)).mappings().all()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("")
+def list_entities(cursor: Optional[str] = None, limit: int = ENTITY_PAGE_SIZE, fields: Optional[str] = None,
+                  filters: Dict[str, str] = Depends(entity_filters), db: Session = Depends(get_db)):
+    """
+    Lists entities ordered by id. Pass the returned `next_cursor` back as `cursor` for the next page.
+    """
+    check_limit("limit", limit, ENTITY_MAX_PAGE_SIZE)
+    after_id = decode_cursor(cursor) if cursor else None
+    return list_entities_page(db, filters, parse_fields(fields), limit, after_id)
+
+
+@router.get("/facets")
+def entity_facets(q: Optional[str] = None, filters: Dict[str, str] = Depends(entity_filters),
+                  db: Session = Depends(get_db)):
+    """
+    Counts per type, status, group, industry and source for the entities matching the
+    text query `q` and the filters, e.g. "People (X)" and "Companies (Y)". Each facet
+    ignores its own filter, so the other values of a selected facet keep their counts.
+    """
+    return {"query": q, "filters": filters, **facet_counts(db, q, filters)}
+
+
+@router.get("/export")
+def export_entities(fields: Optional[str] = None, filters: Dict[str, str] = Depends(entity_filters)):
+    """
+    Streams every matching entity as NDJSON, one row per line, with constant memory.
+    """
+    query = build_query(filters, parse_fields(fields))
+
+    def rows():
+        # Server-side cursor: rows are fetched in batches as the client reads
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+            for row in result.mappings():
+                yield json.dumps(dict(row), default=str) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+# --- MAP ---
+
+def bbox_params(min_x: float, min_y: float, max_x: float, max_y: float) -> BBox:
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(status_code=400, detail="Bounding box minimums must not exceed its maximums.")
+    return min_x, min_y, max_x, max_y
+
+
+def project(entity: Entity, columns: List[str]) -> dict:
+    return {c: getattr(entity, c) for c in columns}
+
+
+@router.get("/bbox")
+def entities_in_viewport(bbox: BBox = Depends(bbox_params), limit: int = ENTITY_MAX_PAGE_SIZE,
+                         fields: Optional[str] = None, filters: Dict[str, str] = Depends(entity_filters),
+                         db: Session = Depends(get_db)):
+    """
+    Entities inside a map viewport. `truncated` is set when more than `limit` matched,
+    in which case the client should ask for /clusters instead.
+    """
+    check_limit("limit", limit, ENTITY_MAX_PAGE_SIZE)
+    columns = parse_fields(fields)
+    rows = entities_in_bbox(db, bbox, filters, limit + 1)
+    return {"items": [project(e, columns) for e in rows[:limit]], "truncated": len(rows) > limit}
+
+
+@router.get("/nearest")
+def entities_nearest(entity_id: Optional[int] = None, x: Optional[float] = None, y: Optional[float] = None,
+                     k: int = 10, fields: Optional[str] = None, filters: Dict[str, str] = Depends(entity_filters),
+                     db: Session = Depends(get_db)):
+    """
+    The `k` entities closest to another entity (e.g. people near TechFlow HQ) or to a point.
+    """
+    check_limit("k", k, ENTITY_MAX_PAGE_SIZE)
+    if entity_id is not None:
+        anchor = db.get(Entity, entity_id)
+        if anchor is None:
+            raise HTTPException(status_code=404, detail="Entity not found.")
+        coords = anchor.coords or {}
+        if not isinstance(coords.get("x"), (int, float)) or not isinstance(coords.get("y"), (int, float)):
+            raise HTTPException(status_code=404, detail="Entity has no coordinates.")
+        x, y = coords["x"], coords["y"]
+    elif x is None or y is None:
+        raise HTTPException(status_code=400, detail="Pass either entity_id or both x and y.")
+
+    columns = parse_fields(fields)
+    ranked = nearest_entities(db, x, y, k, filters, exclude_id=entity_id)
+    return {
+        "origin": {"x": x, "y": y},
+        "items": [{**project(e, columns), "distance": round(d, 6)} for d, e in ranked],
+    }
+
+
+@router.get("/clusters")
+def entity_clusters(bbox: BBox = Depends(bbox_params), cells: int = 16,
+                    filters: Dict[str, str] = Depends(entity_filters), db: Session = Depends(get_db)):
+    """
+    Grid clusters for low zoom levels: the viewport is split into about `cells` cells per axis
+    and every non-empty cell reports its point count and centroid.
+    """
+    check_limit("cells", cells, SPATIAL_MAX_CLUSTER_CELLS)
+    return cluster_entities(db, bbox, cells, filters)
@@ -1,160 +1,256 @@
-import os
+import math
+import asyncio
 import logging
 import json
-import requests
-from typing import List, Optional, Generator, Any, Dict
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.database import get_db, Entity
-from app.config import GEMINI_API_KEY, SERPAPI_API_KEY
-from google import genai
+from app.database import run_db, Entity
+from app.fulltext import search_entities
+from app.cache import TTLCache, normalize_query
+from app.answer_cache import AnswerCache
+from app.group_names import NAME_FIELDS, group_names
+from app.http_client import http_client
+from app.gemini import gemini
+from app.model_catalog import ModelCatalog
+from app.intent import GATE_KEEPER_PROMPT, SEARCH, IntentCache, load_classifier, parse_label
+from app.model_router import ModelRouter, AllModelsUnavailable
+from app.result_budget import ResultBudget, ResultBudgeter
+from app.memory import session_memory
+from app.admission import QueueFull, Ticket, admission
+from app.enrichment import enrichment
+from app.vector_index import vector_index
+from app.entity_stream import EntityEmitter, EntityParser, StreamedReply, tool_records, web_entities
+from app.metrics import (
+    Trace, current_trace, span, record_usage, SEARCH_TTFB_SECONDS, SEARCH_DURATION_SECONDS,
+    SEARCH_FIRST_ENTITY_SECONDS,
+)
+from app.config import (
+    GEMINI_API_KEY, SERPAPI_API_KEY, SERPAPI_URL, DB_SEARCH_LIMIT,
+    SEARCH_MAX_TOOL_ROUNDS, SEARCH_TIME_BUDGET_SECONDS,
+    INTENT_MODEL_PATH, INTENT_CONFIDENCE_THRESHOLD, INTENT_MIN_PRECISION, INTENT_CACHE_SIZE,
+    ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY,
+    WEB_CACHE_TTL_SECONDS, WEB_CACHE_MAX_ENTRIES, WEB_CACHE_MAX_ROWS,
+    TOOL_RESULT_MAX_TOKENS, DB_RESULT_MAX_TOKENS, WEB_RESULT_MAX_TOKENS,
+)
 from google.genai import types
-from starlette.concurrency import run_in_threadpool
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global GenAI client for model listing (initialized once)
-genai_client = None
-if GEMINI_API_KEY:
-    try:
-        genai_client = genai.Client(api_key=GEMINI_API_KEY)
-    except Exception as e:
-        logger.error(f"Failed to initialize GenAI client for model listing: {e}")
-
-async def get_available_models() -> List[str]:
-    """
-    Lists available GenAI models and filters for those supporting generateContent,
-    prioritizing specific models.
-    """
-    if not genai_client:
-        logger.warning("GenAI client not initialized, returning default fallback chain.")
-        return ['gemini-1.5-pro', 'gemini-1.0-pro'] # Fallback if client init failed
-
-    available_models = []
-    try:
-        # Fetch models and sort them (e.g., gemini-1.5-pro first)
-        all_models = await run_in_threadpool(genai_client.models.list)
-        
-        # Prioritize desired models
-        priority_models = ['gemini-1.5-pro', 'gemini-1.0-pro-001', 'gemini-1.0-pro'] # Added gemini-1.0-pro-001 as it's often more stable
-        
-        # Filter and add models to available_models based on priority and capability
-        for model_name in priority_models:
-            for m in all_models:
-                if m.name == f"models/{model_name}" and "generateContent" in m.supported_actions:
-                    available_models.append(model_name)
-                    break # Found and added, move to next priority
-
-        # Add any other generateContent supporting models if primary ones aren't enough
-        for m in all_models:
-            model_id = m.name.split('/')[-1]
-            if model_id not in available_models and "generateContent" in m.supported_actions:
-                # Optionally filter out models not suitable for general text generation if needed
-                # e.g., if 'embedding' models appear, we might want to skip them
-                available_models.append(model_id)
-
-    except Exception as e:
-        logger.error(f"Failed to list or filter GenAI models: {e}")
-        # Fallback to a known good set if API call fails
-        return ['gemini-1.5-pro', 'gemini-1.0-pro'] 
-
-    # Ensure uniqueness and return
-    return list(dict.fromkeys(available_models)) # Remove duplicates while preserving order
-
-# --- MODEL FALLBACK CHAIN ---
-# Will be populated dynamically
-MODEL_FALLBACK_CHAIN = [] # Placeholder, will be filled on app startup
+# --- MODEL ROUTER ---
+# Replaces the static fallback list, models come from the catalog started with the app
+model_router = ModelRouter()
+model_catalog = ModelCatalog(model_router, gemini)
 
 # --- THE FASTAPI ROUTER ---
 router = APIRouter(prefix="/api/search", tags=["Search"])
 
 # --- TOOL FUNCTIONS ---
 
-def search_web_tool(query: str) -> str:
+# Shared by every request so repeated queries skip SerpApi
+web_cache = TTLCache(
+    "web",
+    ttl=WEB_CACHE_TTL_SECONDS,
+    max_entries=WEB_CACHE_MAX_ENTRIES,
+    max_rows=WEB_CACHE_MAX_ROWS,
+)
+
+async def search_web_tool(query: str, fresh: bool = False) -> str:
     """
     Performs a Google search using SerpApi.
+    Results are cached per normalized query, set fresh to True to bypass the cache.
     """
     logger.info(f"TOOL: Searching Web for {query}")
     if not SERPAPI_API_KEY:
         return "Error: SERPAPI_API_KEY not configured."
-    
+
+    with span("web_search"):
+        return await web_cache.get_or_compute(
+            normalize_query(query),
+            lambda: fetch_web_results(query),
+            fresh=fresh,
+            cacheable=lambda result: not result.startswith("Error"),
+        )
+
+async def fetch_web_results(query: str) -> str:
+    """
+    Uncached SerpApi call behind `search_web_tool`. Returns every organic result,
+    the result budget decides how many reach the model.
+    """
     try:
-        url = "https://serpapi.com/search"
         params = {"q": query, "api_key": SERPAPI_API_KEY}
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        with span("serpapi"):
+            data = await http_client.get_json(SERPAPI_URL, params=params)
         results = data.get("organic_results", [])
         
         if not results:
             return "No results found."
             
-        summary = []
-        for item in results[:4]: # Limit to top 4 to save context window
-            summary.append(f"- Title: {item.get('title')}\n  Link: {item.get('link')}\n  Snippet: {item.get('snippet')}")
-            
-        return "\n".join(summary)
+        return json.dumps([
+            {"title": item.get("title"), "link": item.get("link"), "snippet": item.get("snippet")} for item in results
+        ])
     except Exception as e:
         logger.error(f"SerpApi Error: {e}")
         return f"Error performing web search: {str(e)}"
 
+# Columns of the matches that go back to the model, `entity` events get the whole row
+DB_RESULT_FIELDS = ["id", "name", "role", "company", "location"]
+ENTITY_FIELDS = ["id", "type", "name", "role", "company", "industry", "location", "avatar", "status", "group",
+                 "source", "coords"]
+
+def search_db(db: Session, query: str) -> List[dict]:
+    """
+    Searches the local entities table. Blocking, run it through `run_db`.
+    """
+    logger.info(f"TOOL: Searching DB for {query}")
+    with span("db_search"):
+        results = search_entities(db, query, limit=DB_SEARCH_LIMIT)
+    return [{field: getattr(e, field) for field in ENTITY_FIELDS} for e in results]
+
+def entities_by_id(db: Session, ids: List[int]) -> List[dict]:
+    """
+    The rows of `ids` that still exist, in the order of `ids`. Blocking, run it through `run_db`.
+    """
+    found = {e.id: e for e in db.query(Entity).filter(Entity.id.in_(ids))}
+    return [{field: getattr(found[entity_id], field) for field in ENTITY_FIELDS} for entity_id in ids
+            if entity_id in found]
+
+async def db_search(query: str) -> List[dict]:
+    return await run_db(search_db, query)
+
+async def semantic_search(query: str) -> List[dict]:
+    """
+    Entities closest in meaning to a description, best first. The index is scored in
+    the threadpool, on Postgres `run_db` would score it on the event loop.
+    """
+    logger.info(f"TOOL: Semantic DB search for {query}")
+    with span("vector_search"):
+        hits = await run_in_threadpool(vector_index.search, query, DB_SEARCH_LIMIT)
+    if not hits:
+        return []
+    return await run_db(entities_by_id, [entity_id for entity_id, _ in hits])
+
+# Tools answered from the entities table, with the whole rows for the entity events
+DB_TOOLS = {"search_db_wrapper": db_search, "semantic_search_db": semantic_search}
+
+def db_tool_result(rows: List[dict]) -> str:
+    if not rows: return "No records found in local database."
+    return json.dumps([{field: row[field] for field in DB_RESULT_FIELDS} for row in rows])
+
+# Every tool result is cut to its token budget before it goes back to the model
+result_budget = ResultBudgeter(
+    budgets={
+        "search_db_wrapper": ResultBudget(DB_RESULT_MAX_TOKENS),
+        "semantic_search_db": ResultBudget(DB_RESULT_MAX_TOKENS),
+        "search_web_tool": ResultBudget(WEB_RESULT_MAX_TOKENS),
+    },
+    default=ResultBudget(TOOL_RESULT_MAX_TOKENS),
+)
+
 # --- FALLBACK HELPER ---
 
+async def open_stream(chat, message, config=None):
+    """
+    Starts a streamed reply and waits for its first chunk, so `model_router.track`
+    times the request and sees its errors. Returns the stream and that chunk.
+    """
+    stream = await chat.send_message_stream(message, **({"config": config} if config is not None else {}))
+    return stream, await anext(stream, None)
+
 async def generate_single_turn_with_fallback(client, contents):
-    for model_id in MODEL_FALLBACK_CHAIN:
-        try:
-            logger.info(f"Attempting to generate content with model: {model_id}")
-            response = await run_in_threadpool(
-                client.models.generate_content,
-                model=model_id,
-                contents=contents
-            )
-            return response
-        except Exception as e:
-            if "429" in str(e) and "RESOURCE_EXHAUSTED" in str(e):
-                logger.warning(f"Model {model_id} is exhausted. Trying next model.")
-                continue
-            else:
-                raise e # Re-raise other exceptions
-    raise Exception("All models in the fallback chain failed.")
+    with span("generate_single_turn"):
+        return await model_router.call(
+            lambda model_id: client.aio.models.generate_content(model=model_id, contents=contents)
+        )
+
+
+# Final answers of previous searches, dropped whenever entities change
+answer_cache = AnswerCache(
+    ttl=ANSWER_CACHE_TTL_SECONDS,
+    capacity=ANSWER_CACHE_MAX_ENTRIES,
+    threshold=ANSWER_CACHE_SIMILARITY,
+)
+answer_cache.watch_entities()
+# Entity edits made through the ORM are embedded right away
+vector_index.watch_entities()
+
+# --- GATE KEEPER ---
+
+intent_classifier = load_classifier(INTENT_MODEL_PATH, INTENT_MIN_PRECISION)
+intent_cache = IntentCache(INTENT_CACHE_SIZE)
+
+async def classify_intent(client, user_query: str) -> str:
+    """
+    Decides SEARCH vs CHAT. Cached and local decisions skip the LLM, which is asked
+    unless a rule matched or a gated model is confident.
+    """
+    key = normalize_query(user_query)
+    intent = intent_cache.get(key)
+    if intent:
+        return intent
+
+    intent, confidence = intent_classifier.classify(user_query)
+    if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+        logger.info(f"Local gate keeper: {intent} ({confidence:.2f})")
+        intent_cache.put(key, intent)
+        return intent
+
+    gate_keeper_prompt = GATE_KEEPER_PROMPT.format(query=user_query)
+    try:
+        gate_keeper_response = await generate_single_turn_with_fallback(client, gate_keeper_prompt)
+        intent = parse_label(gate_keeper_response.text)
+        if intent is None:
+            logger.warning(f"Gate keeper gave no label: {gate_keeper_response.text!r}, searching")
+            intent = SEARCH
+        intent_cache.put(key, intent)
+    except Exception as e:
+        logger.error(f"Gate keeper failed: {e}")
+        intent = "CHAT" # Default to CHAT on failure
+    return intent
+
+
+# --- SESSION MEMORY ---
+
+def history_contents(turns: List[dict]) -> List[types.Content]:
+    return [types.Content(role=turn["role"], parts=[types.Part(text=turn["content"])]) for turn in turns]
 
 
 # --- THE AI ORCHESTRATOR ---
 
-async def ai_search_generator(user_query: str, db: Session):
+async def ai_search_generator(user_query: str, fresh: bool = False, session_id: Optional[str] = None,
+                              window: Optional[List[dict]] = None):
     """
     Manages the conversation loop with a gate keeper and model fallback.
+    With `fresh`, web searches bypass the result cache. With a `session_id`, the
+    recent turns of the session are part of the prompt and its earlier tool results
+    are reused, `window` holds those turns when the caller already loaded them.
+    Database tools borrow a connection per query, not for the whole stream.
+    Entities are streamed as `entity` events as soon as a tool finds them, and while
+    the model writes its answer, before the `answer` event itself. The ones that did
+    not come from the database are then handed to the enrichment workers.
     """
     
-    # Initialize GenAI Client
-    if not GEMINI_API_KEY:
+    # The app-lifetime GenAI client
+    client = gemini.get()
+    if not GEMINI_API_KEY or client is None:
         logger.warning("GEMINI_API_KEY is missing. Search will fail.")
         yield json.dumps({"type": "error", "content": "GEMINI_API_KEY is missing."}) + "\n"
         return
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
+    with span("history_load"):
+        if window is None:
+            window = await session_memory.window(session_id) if session_id else []
+        history = history_contents(window)
 
     # 1. Gate Keeper: Classify the user's intent
     yield json.dumps({"type": "status", "content": "🧠 Thinking..."}) + "\n"
-    gate_keeper_prompt = f"""
-    You are a classification model. Your task is to determine if the user's query requires a web search or if it's a simple conversational question.
-    Respond with a single word: "SEARCH" if a web search is needed, or "CHAT" if it's a general question.
-
-    User Query: "{user_query}"
-    """
-    
-    try:
-        gate_keeper_response = await generate_single_turn_with_fallback(client, gate_keeper_prompt)
-        intent = gate_keeper_response.text.strip().upper()
-    except Exception as e:
-        logger.error(f"Gate keeper failed: {e}")
-        intent = "CHAT" # Default to CHAT on failure
+    with span("gate_keeper"):
+        intent = await classify_intent(client, user_query)
 
     yield json.dumps({"type": "status", "content": f"Intent classified as: {intent}"}) + "\n"
 
@@ -162,106 +258,219 @@ async def ai_search_generator(user_query: str, db: Session):
     if intent == "SEARCH":
         # --- This is the existing tool-using logic with fallback ---
         
-        def search_db_wrapper(query: str):
-            logger.info(f"TOOL: Searching DB for {query}")
-            search_term = f"%{query}%"
-            results = db.query(Entity).filter(
-                or_(Entity.name.ilike(search_term), Entity.role.ilike(search_term), Entity.company.ilike(search_term))
-            ).all()
-            if not results: return "No records found in local database."
-            return json.dumps([{"id": e.id, "name": e.name, "role": e.role, "company": e.company, "location": e.location} for e in results])
-
-        tools_config = [search_web_tool, search_db_wrapper]
+        async def search_db_wrapper(query: str) -> str:
+            """
+            Searches the local database of known people and companies.
+            """
+            return db_tool_result(await db_search(query))
+
+        async def semantic_search_db(query: str) -> str:
+            """
+            Finds people and companies in the local database whose role, company, industry,
+            location or group are close in meaning to a description, e.g.
+            "growth leaders at Brazilian fintechs", even without those exact words.
+            """
+            return db_tool_result(await semantic_search(query))
+
+        tools_config = [search_web_tool, search_db_wrapper, semantic_search_db]
         system_instruction = (
             "You are a smart search assistant. Your goal is to find information for the user.\n"
             "1. ALWAYS check the 'search_db_wrapper' FIRST to see if we know the person/company locally.\n"
-            "2. If not found locally, use 'search_web_tool'.\n"
-            "3. Synthesize the search results into a JSON list of objects. Each object should represent a person or a company and have the following fields: 'id', 'name', 'role', 'company', 'location'."
+            "2. When the user describes people or companies (a role, an industry, a place) instead of naming them, "
+            "use 'semantic_search_db' as well.\n"
+            "3. If not found locally, use 'search_web_tool'.\n"
+            "4. Synthesize the search results into a JSON list of objects. Each object should represent a person or a company and have the following fields: 'id', 'type' ('person' or 'business'), 'name', 'role', 'company', 'location'."
+        )
+
+        chat_config = types.GenerateContentConfig(
+            tools=tools_config,
+            system_instruction=system_instruction,
+            temperature=0.3,
+            # We run the tools ourselves so the loop below can stream progress
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
         )
 
-        chat = None
-        for model_id in MODEL_FALLBACK_CHAIN:
+        async def start_chat(model_id):
+            chat = client.aio.chats.create(model=model_id, config=chat_config, **({"history": history} if history else {}))
+            response = await chat.send_message(user_query)
+            # The router only sees the tuple, count the tokens of the response here
+            record_usage(model_id, response)
+            return model_id, chat, response
+
+        def found_entities(name, records):
+            return web_entities(records) if name == "search_web_tool" else records
+
+        async def run_tool(index, call):
+            reused = session_memory.tool_result(session_id, call.name, call.args.get("query", "")) \
+                if session_id and not fresh else None
+            if reused is not None:
+                found = found_entities(call.name, tool_records(reused))
+                return index, (reused, "success"), result_budget.apply(call.name, reused), True, found
+
+            tool_result = "Error: Tool not found"
+            tool_status = "fail"
+            found = []
             try:
-                logger.info(f"Attempting to create chat with model: {model_id}")
-                chat = client.chats.create(
-                    model=model_id,
-                    config=types.GenerateContentConfig(tools=tools_config, system_instruction=system_instruction, temperature=0.3)
-                )
-                break # Success
-            except Exception as e:
-                if "429" in str(e) and "RESOURCE_EXHAUSTED" in str(e):
-                    logger.warning(f"Model {model_id} is exhausted for chat creation. Trying next model.")
-                    continue
-                else:
-                    raise e
-        
-        if not chat:
-            yield json.dumps({"type": "error", "content": "All models are currently unavailable for chat."}) + "\n"
-            return
-            
-        try:
-            response = chat.send_message(user_query)
-            while response.function_calls:
-                for call in response.function_calls:
-                    yield json.dumps({"type": "status", "content": f"🔍 Searching: '{call.args['query']}'"}) + "\n"
-                    tool_result = "Error: Tool not found"
-                    tool_status = "fail"
+                with span(f"tool:{call.name}"):
                     if call.name == "search_web_tool":
-                        tool_result = search_web_tool(**call.args)
+                        tool_result = await search_web_tool(**{**call.args, "fresh": fresh or call.args.get("fresh", False)})
                         if not tool_result.startswith("Error"):
                             tool_status = "success"
-                    elif call.name == "search_db_wrapper":
-                        tool_result = search_db_wrapper(**call.args)
-                        if not tool_result.startswith("No records found"):
+                            found = found_entities(call.name, tool_records(tool_result))
+                    elif call.name in DB_TOOLS:
+                        # Same as the tool, but keeps the whole rows for the entity events
+                        found = await DB_TOOLS[call.name](call.args["query"])
+                        tool_result = db_tool_result(found)
+                        if found:
                             tool_status = "success"
-                    
-                    yield json.dumps({
-                        "type": "tool_artifact",
-                        "tool_name": call.name,
-                        "query": call.args['query'],
-                        "status": tool_status,
-                        "result": tool_result
-                    }) + "\n"
-
-                    response = chat.send_message(types.Part.from_function_response(name=call.name, response={"result": tool_result}))
-            
+            except Exception as e:
+                logger.error(f"Tool {call.name} failed: {e}")
+                tool_result = f"Error: {e}"
+            budgeted = result_budget.apply(call.name, tool_result)
+            if session_id and tool_status == "success":
+                session_memory.remember_tool(session_id, call.name, call.args.get("query", ""), budgeted.text)
+            return index, (tool_result, tool_status), budgeted, False, found
+
+        entities = EntityEmitter()
+        answer_parser = EntityParser()
+
+        async def stream_turn(reply, parts, config=None):
+            """
+            Streams the next model turn into `reply`, yielding an `entity` event for
+            every object of the answer as soon as it is complete.
+            """
+            stream, chunk = await model_router.track(model_id, open_stream(chat, parts, config))
+            while chunk is not None:
+                reply.add(chunk)
+                for event in entities.events(answer_parser.feed(chunk.text), "answer"):
+                    yield json.dumps(event) + "\n"
+                chunk = await anext(stream, None)
+            record_usage(model_id, reply)
+
+        loop = asyncio.get_running_loop()
+        raw_tokens = sent_tokens = 0
+        deadline = loop.time() + SEARCH_TIME_BUDGET_SECONDS
+
+        try:
+            try:
+                with span("model_first_turn"):
+                    model_id, chat, response = await model_router.call(start_chat)
+            except AllModelsUnavailable as e:
+                # Hold the admission queue instead of sending more searches into the outage
+                admission.backoff(e.retry_after)
+                yield json.dumps({"type": "error", "content": "All models are currently unavailable for chat."}) + "\n"
+                return
+
+            rounds = 0
+            while response.function_calls:
+                rounds += 1
+                calls = response.function_calls
+                for call in calls:
+                    yield json.dumps({"type": "status", "content": f"🔍 Searching: '{call.args['query']}'"}) + "\n"
+
+                # Run every call of this model turn at once, stream artifacts as they finish
+                tasks = [asyncio.ensure_future(run_tool(i, call)) for i, call in enumerate(calls)]
+                results = [("Error: Tool timed out", "fail")] * len(calls)
+                try:
+                    for next_done in asyncio.as_completed(tasks, timeout=max(deadline - loop.time(), 0)):
+                        i, (_, status), budgeted, reused, found = await next_done
+                        results[i] = (budgeted.text, status)
+                        raw_tokens += budgeted.raw_tokens
+                        sent_tokens += budgeted.tokens
+                        yield json.dumps({
+                            "type": "tool_artifact",
+                            "tool_name": calls[i].name,
+                            "query": calls[i].args['query'],
+                            "status": status,
+                            "result": budgeted.text,
+                            "tokens": budgeted.to_dict(),
+                            **({"reused": True} if reused else {}),
+                        }) + "\n"
+                        origin = "web" if calls[i].name == "search_web_tool" else "db"
+                        for event in entities.events(found, origin):
+                            yield json.dumps(event) + "\n"
+                except asyncio.TimeoutError:
+                    logger.warning("Search time budget exhausted while tools were running.")
+                    for task in tasks:
+                        task.cancel()
+
+                parts = [
+                    types.Part.from_function_response(name=call.name, response={"result": result})
+                    for call, (result, _) in zip(calls, results)
+                ]
+                if rounds >= SEARCH_MAX_TOOL_ROUNDS or loop.time() >= deadline:
+                    # Out of budget: hand back what we have and make the model answer without tools
+                    yield json.dumps({"type": "status", "content": "⏱️ Search budget reached, summarizing results..."}) + "\n"
+                    final_config = chat_config.model_copy(update={
+                        "tool_config": types.ToolConfig(
+                            function_calling_config=types.FunctionCallingConfig(mode=types.FunctionCallingConfigMode.NONE)
+                        )
+                    })
+                    reply = StreamedReply()
+                    with span("model_final_turn"):
+                        async for line in stream_turn(reply, parts, final_config):
+                            yield line
+                    response = reply
+                    break
+                reply = StreamedReply()
+                with span("model_turn"):
+                    async for line in stream_turn(reply, parts):
+                        yield line
+                response = reply
+
+            if rounds == 0:
+                # Answered without tools, nothing was streamed
+                for event in entities.events(answer_parser.feed(response.text), "answer"):
+                    yield json.dumps(event) + "\n"
             if response.text:
                 yield json.dumps({"type": "answer", "content": response.text, "format": "json"}) + "\n"
+                if session_id:
+                    session_memory.record_exchange(session_id, user_query, response.text)
+            # Keep what the web turned up, so the next search finds it locally
+            enrichment.submit(entities.findings())
         except Exception as e:
             logger.error(f"AI Generation Error (Search): {e}")
             yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+        finally:
+            result_budget.record_request(raw_tokens, sent_tokens)
     
     else: # CHAT
         # --- This is the simple chat logic with fallback ---
         yield json.dumps({"type": "status", "content": "Generating a chat response..."}) + "\n"
         try:
-            chat_response = await generate_single_turn_with_fallback(client, user_query)
+            contents = history + [types.Content(role="user", parts=[types.Part(text=user_query)])] if history else user_query
+            chat_response = await generate_single_turn_with_fallback(client, contents)
             yield json.dumps({"type": "answer", "content": chat_response.text, "format": "text"}) + "\n"
+            if session_id:
+                session_memory.record_exchange(session_id, user_query, chat_response.text)
         except Exception as e:
             logger.error(f"AI Generation Error (Chat): {e}")
             yield json.dumps({"type": "error", "content": str(e)}) + "\n"
 
 
-from pydantic import BaseModel
-
 class SuggestNameRequest(BaseModel):
     entity_ids: List[int]
 
+def load_group_entities(db: Session, entity_ids: List[int]) -> List[dict]:
+    entities = db.query(Entity).filter(Entity.id.in_(entity_ids)).order_by(Entity.id).all()
+    return [{field: getattr(entity, field) for field in ("id",) + NAME_FIELDS} for entity in entities]
+
 @router.post("/groups/suggest-name")
-async def suggest_name(request: SuggestNameRequest, db: Session = Depends(get_db)):
+async def suggest_name(request: SuggestNameRequest):
     """
     Suggests a name for a group of entities based on their common characteristics.
+    Names are cached per selection and reused for nearly identical ones. `source`
+    tells where the name came from: "model", "cache", "similar" or "local".
     """
-    entities = db.query(Entity).filter(Entity.id.in_(request.entity_ids)).all()
+    # The connection goes back to the pool before the model is called
+    entities = await run_db(load_group_entities, request.entity_ids)
     if not entities:
         raise HTTPException(status_code=404, detail="Entities not found")
 
-    # Create a summary of the entities to send to the model
-    entity_summary = []
-    for entity in entities:
-        entity_summary.append(f"- {entity.name} ({entity.role} @ {entity.company})")
-
-    prompt = f"""
+    async def generate() -> str:
+        # Create a summary of the entities to send to the model
+        entity_summary = [f"- {e['name']} ({e['role']} @ {e['company']})" for e in entities]
+        prompt = f"""
     You are an expert at summarizing and naming groups of things.
     Based on the following list of entities, suggest a concise and descriptive name for a new campaign/group.
 
@@ -270,22 +479,155 @@ async def suggest_name(request: SuggestNameRequest, db: Session = Depends(get_db
 
     Suggested Name:
     """
+        with span("suggest_name"):
+            response = await generate_single_turn_with_fallback(gemini.get(), prompt)
+        return response.text.strip()
 
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        response = await generate_single_turn_with_fallback(client, prompt)
-        return {"name": response.text.strip()}
+        return await group_names.suggest(entities, generate)
     except Exception as e:
         logger.error(f"Failed to suggest name: {e}")
         raise HTTPException(status_code=500, detail="Failed to suggest a name for the group.")
 
 
+@router.get("/debug/models")
+async def model_router_state():
+    """
+    Circuit-breaker state, latency and error rate of every model in the chain.
+    """
+    return model_router.snapshot()
+
+
+@router.get("/tools/stats")
+async def tool_result_stats():
+    """
+    Tokens sent to the model by tool results, and how many the result budget saved.
+    """
+    return result_budget.stats()
+
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """
+    Queue length, admissions, rejections and the learned cost of a search.
+    """
+    return admission.stats()
+
+
+@router.get("/enrichment/stats")
+async def enrichment_stats():
+    """
+    Web findings queued for, written to and kept out of the entities table.
+    """
+    return enrichment.stats()
+
+
+@router.get("/vector/stats")
+async def vector_index_stats():
+    """
+    Entities in the semantic search index and how it searches them.
+    """
+    return vector_index.stats()
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters of the web search, answer and group name caches.
+    """
+    return {"web": web_cache.stats(), "answers": answer_cache.stats(), "sessions": session_memory.stats(),
+            "group_names": group_names.stats()}
+
+
+async def cached_search_generator(user_query: str, fresh: bool = False, session_id: Optional[str] = None,
+                                  admit: bool = False):
+    """
+    Replays a cached answer for the same or a similar query, otherwise runs the
+    full pipeline and caches its artifacts and answer if it succeeded.
+    Follow-ups in a session with history depend on it, so they bypass the cache.
+    With `admit`, a search that missed the cache takes an admission ticket, waits
+    for its turn and streams `queued` events with the queue position meanwhile.
+    The ticket is given back however the stream ends.
+    """
+    window = await session_memory.window(session_id) if session_id else []
+    follow_up = bool(window)
+    if not fresh and not follow_up:
+        hit = answer_cache.lookup(user_query)
+        if hit:
+            logger.info(f"Answer cache hit for '{user_query}' ({hit['similarity']:.2f} ~ '{hit['query']}')")
+            yield json.dumps({"type": "status", "content": "⚡ Answer from cache", "cached": True}) + "\n"
+            for cached_event in hit["events"]:
+                yield json.dumps(cached_event) + "\n"
+            if session_id and hit["events"][-1]["type"] == "answer":
+                session_memory.record_exchange(session_id, user_query, hit["events"][-1]["content"])
+            return
+
+    ticket: Optional[Ticket] = None
+    events = []
+    try:
+        if admit:
+            ticket = admission.enqueue(session_id)
+            async for position in admission.wait(ticket):
+                yield json.dumps({"type": "queued", "position": position,
+                                  "content": f"⏳ Waiting for model capacity, position {position} in queue"}) + "\n"
+        async for line in ai_search_generator(user_query, fresh, session_id, window):
+            yield line
+            event = json.loads(line)
+            if event["type"] in ("tool_artifact", "entity", "answer", "error"):
+                events.append(event)
+    except QueueFull as e:
+        yield json.dumps({"type": "error", "content": str(e), "retry_after": math.ceil(e.retry_after)}) + "\n"
+        return
+    finally:
+        if ticket is not None:
+            trace = current_trace.get()
+            if trace is not None:
+                admission.release(ticket, trace.model_attempts, trace.tokens["prompt"] + trace.tokens["output"])
+            else:
+                admission.release(ticket, ticket.calls, ticket.tokens)
+            # Not admitted (the client left while queued) or admitted without a search
+            admission.cancel(ticket)
+
+    if not follow_up and events and events[-1]["type"] == "answer" and not any(e["type"] == "error" for e in events):
+        answer_cache.store(user_query, events)
+
+
+async def traced_search_generator(user_query: str, fresh: bool = False, session_id: Optional[str] = None,
+                                  admit: bool = False):
+    """
+    Times the whole stream and ends it with a `timings` event holding the
+    per-stage timings and token counts of this request.
+    """
+    trace = Trace()
+    current_trace.set(trace)
+    async for line in cached_search_generator(user_query, fresh, session_id, admit):
+        trace.mark_first_byte()
+        if line.startswith('{"type": "entity"'):
+            trace.mark_first_entity()
+        yield line
+    trace.finish()
+    timings = trace.to_dict()
+    SEARCH_TTFB_SECONDS.observe((timings["ttfb_ms"] or 0) / 1000)
+    if timings["first_entity_ms"] is not None:
+        SEARCH_FIRST_ENTITY_SECONDS.observe(timings["first_entity_ms"] / 1000)
+    SEARCH_DURATION_SECONDS.observe(timings["total_ms"] / 1000)
+    yield json.dumps({"type": "timings", **timings}) + "\n"
+
+
 @router.get("/")
-async def search_endpoint(q: str, db: Session = Depends(get_db)):
+async def search_endpoint(q: str, fresh: bool = False, session_id: Optional[str] = None):
     """
     Endpoint that streams the AI's thought process and final answer.
+    Pass `fresh=true` to skip cached answers and web results, and a `session_id`
+    to continue a conversation. Answers 503 with Retry-After when the admission
+    queue is full, unless the answer is cached. The search only joins the queue
+    once the stream starts.
     """
+    if fresh or not answer_cache.peek(q):
+        try:
+            admission.check()
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     return StreamingResponse(
-        ai_search_generator(q, db),
+        traced_search_generator(q, fresh, session_id, admit=True),
         media_type="application/x-ndjson"
     )
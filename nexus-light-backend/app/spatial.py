@@ -0,0 +1,335 @@
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import Entity
+from app.config import SPATIAL_GRID_CELL_SIZES
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float] # min_x, min_y, max_x, max_y
+
+# --- SQLITE (R*Tree + pre-aggregated grids) ---
+# `entities_rtree` holds one degenerate box per entity with coords, `entity_grid` holds
+# point counts and coordinate sums per cell for every size in `entity_grid_levels`.
+# The triggers keep both in sync with `entities`.
+
+
+def _floor(expr: str) -> str:
+    # floor() needs SQLite's optional math functions, this works on every build
+    return f"(CAST({expr} AS INTEGER) - ({expr} < CAST({expr} AS INTEGER)))"
+
+
+def _x(row: str) -> str:
+    return f"CAST(json_extract({row}.coords, '$.x') AS REAL)"
+
+
+def _y(row: str) -> str:
+    return f"CAST(json_extract({row}.coords, '$.y') AS REAL)"
+
+
+def _has_point(row: str) -> str:
+    return (f"json_type({row}.coords, '$.x') IN ('integer', 'real') "
+            f"AND json_type({row}.coords, '$.y') IN ('integer', 'real')")
+
+
+def _grid_cells(row: str) -> str:
+    return (f"SELECT cell, {_floor(f'{_x(row)} / cell')}, {_floor(f'{_y(row)} / cell')} "
+            f"FROM entity_grid_levels")
+
+
+def _add_point(row: str) -> str:
+    return f"""
+        INSERT INTO entities_rtree(id, min_x, max_x, min_y, max_y)
+            SELECT {row}.id, {_x(row)}, {_x(row)}, {_y(row)}, {_y(row)} WHERE {_has_point(row)};
+        INSERT INTO entity_grid(cell, gx, gy, count, sum_x, sum_y)
+            SELECT cell, {_floor(f'{_x(row)} / cell')}, {_floor(f'{_y(row)} / cell')}, 1, {_x(row)}, {_y(row)}
+            FROM entity_grid_levels WHERE {_has_point(row)}
+            ON CONFLICT(cell, gx, gy) DO UPDATE SET
+                count = count + 1, sum_x = sum_x + excluded.sum_x, sum_y = sum_y + excluded.sum_y;"""
+
+
+def _remove_point(row: str) -> str:
+    return f"""
+        DELETE FROM entities_rtree WHERE id = {row}.id;
+        UPDATE entity_grid SET count = count - 1, sum_x = sum_x - {_x(row)}, sum_y = sum_y - {_y(row)}
+            WHERE {_has_point(row)} AND (cell, gx, gy) IN ({_grid_cells(row)});"""
+
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entities_rtree USING rtree(id, min_x, max_x, min_y, max_y)",
+    "CREATE TABLE IF NOT EXISTS entity_grid_levels (cell REAL PRIMARY KEY)",
+    """CREATE TABLE IF NOT EXISTS entity_grid (
+        cell REAL NOT NULL, gx INTEGER NOT NULL, gy INTEGER NOT NULL,
+        count INTEGER NOT NULL, sum_x REAL NOT NULL, sum_y REAL NOT NULL,
+        PRIMARY KEY (cell, gx, gy)
+    )""",
+    f"CREATE TRIGGER IF NOT EXISTS entities_rtree_ai AFTER INSERT ON entities BEGIN {_add_point('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS entities_rtree_ad AFTER DELETE ON entities BEGIN {_remove_point('old')} END",
+    f"""CREATE TRIGGER IF NOT EXISTS entities_rtree_au AFTER UPDATE OF id, coords ON entities BEGIN
+        {_remove_point('old')}
+        {_add_point('new')}
+    END""",
+]
+
+SQLITE_REBUILD_RTREE = [
+    "DELETE FROM entities_rtree",
+    f"""INSERT INTO entities_rtree(id, min_x, max_x, min_y, max_y)
+        SELECT id, {_x('entities')}, {_x('entities')}, {_y('entities')}, {_y('entities')}
+        FROM entities WHERE {_has_point('entities')}""",
+]
+
+SQLITE_REBUILD_GRID = [
+    "DELETE FROM entity_grid",
+    f"""INSERT INTO entity_grid(cell, gx, gy, count, sum_x, sum_y)
+        SELECT cell, {_floor(f"{_x('entities')} / cell")}, {_floor(f"{_y('entities')} / cell")},
+               COUNT(*), SUM({_x('entities')}), SUM({_y('entities')})
+        FROM entities, entity_grid_levels WHERE {_has_point('entities')}
+        GROUP BY 1, 2, 3""",
+]
+
+# CROSS JOIN pins the R*Tree as the outer loop, otherwise a filter on an indexed
+# column (e.g. type) makes the planner scan every matching row instead
+SQLITE_FROM = "entities_rtree CROSS JOIN entities ON entities.id = entities_rtree.id"
+SQLITE_IN_BBOX = """entities_rtree.max_x >= :min_x AND entities_rtree.min_x <= :max_x
+    AND entities_rtree.max_y >= :min_y AND entities_rtree.min_y <= :max_y"""
+
+# --- POSTGRES (GiST on a point expression) ---
+# The expression index serves both bounding boxes (<@) and nearest-neighbour ordering (<->).
+
+_PG_POINT = ("(CASE WHEN json_typeof(coords->'x') = 'number' AND json_typeof(coords->'y') = 'number' "
+             "THEN point((coords->>'x')::float8, (coords->>'y')::float8) END)")
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_entities_coords_point ON entities USING GIST ({_PG_POINT})",
+]
+
+POSTGRES_FROM = "entities"
+POSTGRES_IN_BBOX = f"{_PG_POINT} <@ box(point(:min_x, :min_y), point(:max_x, :max_y))"
+
+
+def create_spatial_index(engine, cell_sizes: List[float] = SPATIAL_GRID_CELL_SIZES):
+    """
+    Creates the spatial index for the current dialect. Safe to call on every startup;
+    the cluster grids are rebuilt when `cell_sizes` changed since the last run.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'entities_rtree'")).first()
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows that were inserted before the index existed
+                for statement in SQLITE_REBUILD_RTREE:
+                    conn.execute(text(statement))
+            current = sorted(row[0] for row in conn.execute(text("SELECT cell FROM entity_grid_levels")))
+            if current != sorted(cell_sizes):
+                conn.execute(text("DELETE FROM entity_grid_levels"))
+                conn.execute(text("INSERT INTO entity_grid_levels(cell) VALUES (:cell)"),
+                             [{"cell": cell} for cell in cell_sizes])
+                for statement in SQLITE_REBUILD_GRID:
+                    conn.execute(text(statement))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+        else:
+            logger.warning(f"No spatial index support for dialect {dialect}, map queries scan the entities table.")
+
+
+# --- QUERIES ---
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def _point(entity: Entity) -> Optional[Tuple[float, float]]:
+    coords = entity.coords if isinstance(entity.coords, dict) else {}
+    x, y = coords.get("x"), coords.get("y")
+    # Like json_type(): booleans are not numbers
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (x, y)):
+        return None
+    return float(x), float(y)
+
+
+def _scan(db: Session, filters: Optional[Dict[str, str]], bbox: Optional[BBox] = None) -> List[Entity]:
+    """
+    Entities with coords (inside `bbox`) read from the whole table, for dialects without a spatial index.
+    """
+    query = db.query(Entity).filter(Entity.coords.isnot(None))
+    for column, value in (filters or {}).items():
+        if column not in Entity.__table__.c:
+            raise ValueError(f"Unknown filter column: {column}")
+        query = query.filter(Entity.__table__.c[column] == value)
+    found = []
+    for entity in query.order_by(Entity.id):
+        point = _point(entity)
+        if point is None:
+            continue
+        if bbox is not None and not (bbox[0] <= point[0] <= bbox[2] and bbox[1] <= point[1] <= bbox[3]):
+            continue
+        found.append(entity)
+    return found
+
+
+def _where(dialect: str, filters: Optional[Dict[str, str]]) -> Tuple[str, dict]:
+    clauses = [SQLITE_IN_BBOX if dialect == "sqlite" else POSTGRES_IN_BBOX]
+    params = {}
+    for column, value in (filters or {}).items():
+        if column not in Entity.__table__.c:
+            raise ValueError(f"Unknown filter column: {column}")
+        clauses.append(f'entities."{column}" = :f_{column}')
+        params[f"f_{column}"] = value
+    return " AND ".join(clauses), params
+
+
+def _bbox_params(bbox: BBox) -> dict:
+    min_x, min_y, max_x, max_y = bbox
+    return {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y}
+
+
+def entities_in_bbox(db: Session, bbox: BBox, filters: Optional[Dict[str, str]] = None,
+                     limit: Optional[int] = None) -> List[Entity]:
+    """
+    Entities whose coords fall inside `bbox`, in index order.
+    """
+    dialect = _dialect(db)
+    if dialect not in ("sqlite", "postgresql"):
+        return _scan(db, filters, bbox)[:limit]
+    where, params = _where(dialect, filters)
+    source = SQLITE_FROM if dialect == "sqlite" else POSTGRES_FROM
+    statement = f"SELECT entities.* FROM {source} WHERE {where}"
+    if limit is not None:
+        statement += " LIMIT :limit"
+        params["limit"] = limit
+    return db.query(Entity).from_statement(text(statement)).params(**params, **_bbox_params(bbox)).all()
+
+
+def distance(entity: Entity, x: float, y: float) -> float:
+    return math.hypot(entity.coords["x"] - x, entity.coords["y"] - y)
+
+
+def _sqlite_extent(db: Session) -> Optional[Tuple[BBox, int]]:
+    """
+    Bounding box and number of all indexed points, read from the coarsest grid.
+    """
+    row = db.execute(text("""
+        SELECT cell, MIN(gx), MIN(gy), MAX(gx), MAX(gy), SUM(count) FROM entity_grid
+        WHERE cell = (SELECT MAX(cell) FROM entity_grid_levels) AND count > 0
+    """)).first()
+    if row is None or not row[5]:
+        return None
+    cell, min_gx, min_gy, max_gx, max_gy, total = row
+    return (min_gx * cell, min_gy * cell, (max_gx + 1) * cell, (max_gy + 1) * cell), total
+
+
+def nearest_entities(db: Session, x: float, y: float, k: int, filters: Optional[Dict[str, str]] = None,
+                     exclude_id: Optional[int] = None) -> List[Tuple[float, Entity]]:
+    """
+    The `k` entities closest to (x, y) as (distance, entity) pairs, nearest first.
+    """
+    dialect = _dialect(db)
+    if dialect not in ("sqlite", "postgresql"):
+        ranked = sorted(((distance(e, x, y), e) for e in _scan(db, filters) if e.id != exclude_id), key=lambda p: p[0])
+        return ranked[:k]
+    if dialect == "postgresql":
+        where, params = _where(dialect, filters)
+        where = where.replace(POSTGRES_IN_BBOX, f"{_PG_POINT} IS NOT NULL")
+        statement = f"""SELECT entities.* FROM entities WHERE {where} AND entities.id IS DISTINCT FROM :exclude_id
+                        ORDER BY {_PG_POINT} <-> point(:x, :y) LIMIT :k"""
+        rows = db.query(Entity).from_statement(text(statement)).params(
+            **params, x=x, y=y, k=k, exclude_id=exclude_id).all()
+        return [(distance(e, x, y), e) for e in rows]
+
+    # The R*Tree has no nearest-neighbour operator: search a square around the point and
+    # grow it until it holds k matches inside the inscribed circle, which are then exact.
+    extent = _sqlite_extent(db)
+    if extent is None:
+        return []
+    (min_x, min_y, max_x, max_y), total = extent
+    reach = max(math.hypot(cx - x, cy - y) for cx in (min_x, max_x) for cy in (min_y, max_y))
+    # Start with the radius expected to hold k points at the average density
+    radius = max(math.sqrt(k * (max_x - min_x) * (max_y - min_y) / (math.pi * total)), 1e-9)
+    while True:
+        candidates = entities_in_bbox(db, (x - radius, y - radius, x + radius, y + radius), filters)
+        ranked = sorted(((distance(e, x, y), e) for e in candidates if e.id != exclude_id), key=lambda p: p[0])
+        if radius >= reach or len(ranked) >= k and ranked[k - 1][0] <= radius:
+            return ranked[:k]
+        radius *= 2
+
+
+def choose_cell_size(bbox: BBox, cells: int, levels: List[float] = SPATIAL_GRID_CELL_SIZES) -> Tuple[float, Optional[float]]:
+    """
+    Returns (cell_size, grid_level) for a viewport split into about `cells` cells per axis.
+    The cell size is a multiple of the coarsest pre-aggregated level that fits, so its
+    cells can be merged exactly; `grid_level` is None when the viewport is finer than every level.
+    """
+    min_x, min_y, max_x, max_y = bbox
+    target = max(max_x - min_x, max_y - min_y) / cells
+    usable = [level for level in levels if level <= target]
+    if not usable:
+        return target, None
+    level = usable[-1]
+    return level * int(target // level), level
+
+
+def _cluster(gx: int, gy: int, cell: float, count: int, sum_x: float, sum_y: float) -> dict:
+    return {
+        "x": sum_x / count,
+        "y": sum_y / count,
+        "count": count,
+        "bounds": {"min_x": gx * cell, "min_y": gy * cell, "max_x": (gx + 1) * cell, "max_y": (gy + 1) * cell},
+    }
+
+
+def cluster_entities(db: Session, bbox: BBox, cells: int, filters: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Grid clustering of the viewport: point count and centroid per non-empty cell.
+
+    Unfiltered SQLite queries read the pre-aggregated grid, so their cost depends on the
+    number of cells, not of points. Filtered queries, high zoom levels and Postgres
+    aggregate the points inside the viewport on the fly, other dialects scan the table.
+    """
+    dialect = _dialect(db)
+    cell, level = choose_cell_size(bbox, cells)
+
+    if dialect not in ("sqlite", "postgresql"):
+        totals: Dict[Tuple[int, int], List[float]] = {}
+        for entity in _scan(db, filters, bbox):
+            px, py = _point(entity)
+            cluster = totals.setdefault((math.floor(px / cell), math.floor(py / cell)), [0, 0.0, 0.0])
+            cluster[0] += 1
+            cluster[1] += px
+            cluster[2] += py
+        clusters = [_cluster(gx, gy, cell, *sums) for (gx, gy), sums in totals.items()]
+    elif dialect == "sqlite" and level is not None and not filters:
+        factor = round(cell / level)
+        min_x, min_y, max_x, max_y = bbox
+        rows = db.execute(text("""
+            SELECT gx, gy, count, sum_x, sum_y FROM entity_grid
+            WHERE cell = :cell AND count > 0 AND gx BETWEEN :min_gx AND :max_gx AND gy BETWEEN :min_gy AND :max_gy
+        """), {"cell": level, "min_gx": math.floor(min_x / level), "max_gx": math.floor(max_x / level),
+               "min_gy": math.floor(min_y / level), "max_gy": math.floor(max_y / level)})
+        merged: Dict[Tuple[int, int], List[float]] = {}
+        for gx, gy, count, sum_x, sum_y in rows:
+            totals = merged.setdefault((gx // factor, gy // factor), [0, 0.0, 0.0])
+            totals[0] += count
+            totals[1] += sum_x
+            totals[2] += sum_y
+        clusters = [_cluster(gx, gy, cell, *totals) for (gx, gy), totals in merged.items()]
+    else:
+        where, params = _where(dialect, filters)
+        if dialect == "sqlite":
+            px, py, source = "entities_rtree.min_x", "entities_rtree.min_y", SQLITE_FROM
+            gx, gy = _floor(f"{px} / :cell"), _floor(f"{py} / :cell")
+        else:
+            px, py, source = f"({_PG_POINT})[0]", f"({_PG_POINT})[1]", POSTGRES_FROM
+            gx, gy = f"floor({px} / :cell)::int", f"floor({py} / :cell)::int"
+        rows = db.execute(text(f"""
+            SELECT {gx} AS gx, {gy} AS gy, COUNT(*), SUM({px}), SUM({py}) FROM {source}
+            WHERE {where} GROUP BY 1, 2
+        """), {**params, **_bbox_params(bbox), "cell": cell})
+        clusters = [_cluster(*row[:2], cell, *row[2:]) for row in rows]
+
+    return {"cell_size": cell, "clusters": clusters}
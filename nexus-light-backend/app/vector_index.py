@@ -0,0 +1,519 @@
+import os
+import math
+import zlib
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal, Entity
+from app.embeddings import HashingEmbedder
+from app.config import (
+    VECTOR_INDEX_ENABLED, VECTOR_INDEX_PATH, VECTOR_INDEX_DIM, VECTOR_INDEX_IVF_MIN_ROWS, VECTOR_INDEX_NPROBE,
+)
+
+logger = logging.getLogger(__name__)
+
+# What an entity is, its name is left to the text index
+TEXT_FIELDS = ("role", "company", "industry", "location", "group")
+INITIAL_CAPACITY = 1024
+SYNC_BATCH_SIZE = 10000
+# Vectors per IVF list the centroids are trained on
+TRAINING_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# Lists are trained again once the index holds this many times the rows they were trained on
+RETRAIN_GROWTH = 4
+
+VECTORS_FILE = "vectors.f32"
+ROWS_FILE = "rows.npz"
+_NO_SLOTS = np.zeros(0, dtype=np.int64)
+
+
+def entity_text(entity) -> str:
+    """
+    The text an entity is embedded from, e.g. "Head of Growth Nubank Fintech". Takes
+    Entity objects and rows with the `TEXT_FIELDS` columns.
+    """
+    values = (getattr(entity, field, None) for field in TEXT_FIELDS)
+    return " ".join(value for value in values if value)
+
+
+def text_crc(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the `k` highest scores, highest first.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return _NO_SLOTS
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Position of the centroid with the highest dot product, per vector.
+    """
+    assigned = np.empty(len(vectors), dtype=np.int32)
+    # In batches, so the score matrix stays small
+    for start in range(0, len(vectors), SYNC_BATCH_SIZE):
+        batch = np.asarray(vectors[start:start + SYNC_BATCH_SIZE])
+        assigned[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assigned
+
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = KMEANS_ITERATIONS, seed: int = 1) -> np.ndarray:
+    """
+    Spherical k-means: unit centroids, each vector goes to the one with the highest dot product.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)]
+    for _ in range(iterations):
+        assigned = nearest(vectors, centroids)
+        order = np.argsort(assigned, kind="stable")
+        members, starts = np.unique(assigned[order], return_index=True)
+        # An empty cluster starts over from a random vector
+        sums = vectors[rng.choice(len(vectors), clusters)]
+        sums[members] = np.add.reduceat(vectors[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class EntityVectorIndex:
+    """
+    Semantic search over the entities, for descriptions no column contains word for
+    word, e.g. "growth leaders at Brazilian fintechs".
+
+    Every entity has a hashing embedding of its `entity_text` in one contiguous
+    float32 matrix, memory-mapped from `path` so a restart reads the vectors back
+    instead of embedding every row again. Slots of deleted entities are reused.
+
+    Below `ivf_min_rows` entities a search compares the query with every vector.
+    From there the vectors are clustered around sqrt(n) k-means centroids (IVF) and
+    a search only compares the vectors of the `nprobe` lists closest to the query.
+
+    Entities written through the ORM are embedded again when a commit changed their
+    text. `sync()` reconciles the index with the table, only embedding rows whose
+    text changed since they were indexed. It runs in the background at start and after bulk
+    writes, see `schedule_sync()`.
+    """
+
+    def __init__(self, path: str = VECTOR_INDEX_PATH, dim: int = VECTOR_INDEX_DIM, session_factory=SessionLocal,
+                 ivf_min_rows: int = VECTOR_INDEX_IVF_MIN_ROWS, nprobe: int = VECTOR_INDEX_NPROBE,
+                 enabled: bool = VECTOR_INDEX_ENABLED):
+        self.path = path
+        self.dim = dim
+        self.session_factory = session_factory
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.enabled = enabled
+        self.embedder = HashingEmbedder(dim)
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._ids = np.zeros(0, dtype=np.int64) # entity id per slot, -1 when free
+        self._crcs = np.zeros(0, dtype=np.uint32) # CRC of the text the slot was embedded from
+        self._lists = np.zeros(0, dtype=np.int32) # IVF list per slot, -1 before training
+        self._count = 0 # slots in use or freed, the rest of the file is unused
+        self._slots: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._postings: Dict[int, np.ndarray] = {}
+        self._trained_rows = 0
+        # Slots written while lists are being trained, they are assigned again after
+        self._written: Optional[Set[int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resync = False
+        self._stopping = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._vectors is not None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> dict:
+        return {
+            "entities": len(self._slots),
+            "capacity": len(self._ids),
+            "dim": self.dim,
+            "mode": "brute_force" if self._centroids is None else "ivf",
+            "lists": 0 if self._centroids is None else len(self._centroids),
+            "syncing": self._task is not None and not self._task.done(),
+        }
+
+    # --- STORAGE ---
+
+    def _map(self, capacity: int):
+        # r+ extends the file to the new shape, the previous mapping stays valid for its readers
+        filename = os.path.join(self.path, VECTORS_FILE)
+        if not os.path.exists(filename):
+            open(filename, "wb").close()
+        self._vectors = np.memmap(filename, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _reserve(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, capacity * 2, needed)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._map(capacity)
+        grow = capacity - len(self._ids)
+        self._ids = np.concatenate([self._ids, np.full(grow, -1, dtype=np.int64)])
+        self._crcs = np.concatenate([self._crcs, np.zeros(grow, dtype=np.uint32)])
+        self._lists = np.concatenate([self._lists, np.full(grow, -1, dtype=np.int32)])
+
+    def load(self):
+        """
+        Maps the stored index, or starts an empty one when there is none for this `dim`.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        rows_file = os.path.join(self.path, ROWS_FILE)
+        vectors_file = os.path.join(self.path, VECTORS_FILE)
+        with self._lock:
+            stored = None
+            if os.path.exists(rows_file):
+                with np.load(rows_file) as data:
+                    stored = {name: data[name] for name in data.files}
+                size = os.path.getsize(vectors_file) if os.path.exists(vectors_file) else 0
+                if int(stored["dim"]) != self.dim or size < len(stored["ids"]) * self.dim * 4:
+                    logger.warning(f"Stored vector index does not match dim={self.dim}, rebuilding it.")
+                    stored = None
+            if stored is None:
+                if os.path.exists(vectors_file):
+                    os.remove(vectors_file)
+                self._vectors = None
+                self._ids = np.zeros(0, dtype=np.int64)
+                self._crcs = np.zeros(0, dtype=np.uint32)
+                self._lists = np.zeros(0, dtype=np.int32)
+                self._reserve(INITIAL_CAPACITY)
+                self._count = 0
+                self._centroids = None
+                self._trained_rows = 0
+            else:
+                count = len(stored["ids"])
+                capacity = max(count, os.path.getsize(vectors_file) // (self.dim * 4), INITIAL_CAPACITY)
+                self._map(capacity)
+                self._ids = np.full(capacity, -1, dtype=np.int64)
+                self._crcs = np.zeros(capacity, dtype=np.uint32)
+                self._lists = np.full(capacity, -1, dtype=np.int32)
+                self._ids[:count], self._crcs[:count], self._lists[:count] = \
+                    stored["ids"], stored["crcs"], stored["lists"]
+                self._count = count
+                self._centroids = stored["centroids"] if len(stored["centroids"]) else None
+                self._trained_rows = int(stored["trained_rows"])
+            used = np.flatnonzero(self._ids[:self._count] >= 0)
+            self._slots = dict(zip(self._ids[used].tolist(), used.tolist()))
+            self._free = np.flatnonzero(self._ids[:self._count] < 0).tolist()
+            self._build_postings()
+        logger.info(f"Vector index holds {len(self._slots)} entities.")
+
+    def flush(self):
+        """
+        Writes the slot table next to the vectors. Until then, a restart embeds the
+        rows that changed since the last flush again.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            count = self._count
+            centroids = self._centroids if self._centroids is not None else np.zeros((0, self.dim), np.float32)
+            partial = os.path.join(self.path, "rows.partial.npz")
+            np.savez(partial, ids=self._ids[:count], crcs=self._crcs[:count], lists=self._lists[:count],
+                     centroids=centroids, dim=self.dim, trained_rows=self._trained_rows)
+            os.replace(partial, os.path.join(self.path, ROWS_FILE))
+
+    # --- UPDATES ---
+
+    def _build_postings(self):
+        lists = self._lists[:self._count]
+        slots = np.flatnonzero(lists >= 0)
+        order = slots[np.argsort(lists[slots], kind="stable")]
+        keys, starts = np.unique(lists[order], return_index=True)
+        self._postings = dict(zip(keys.tolist(), np.split(order, starts[1:])))
+
+    def _nearest_lists(self, vectors: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return nearest(vectors, self._centroids)
+
+    def _unlist(self, slot: int):
+        previous = int(self._lists[slot])
+        if previous >= 0:
+            posting = self._postings[previous]
+            self._postings[previous] = posting[posting != slot]
+            self._lists[slot] = -1
+
+    def _write(self, ids: List[int], crcs: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """
+        Stores the vectors of the entities, in their slot when they have one, and
+        returns the slots. Holds the lock.
+        """
+        slots = []
+        for entity_id in ids:
+            slot = self._slots.get(entity_id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = self._count
+                    self._count += 1
+                self._slots[entity_id] = slot
+            slots.append(slot)
+        self._reserve(self._count)
+        slots = np.array(slots, dtype=np.int64)
+        self._vectors[slots] = vectors
+        self._ids[slots] = ids
+        self._crcs[slots] = crcs
+        lists = self._nearest_lists(vectors)
+        for slot, target in zip(slots.tolist(), lists.tolist()):
+            if self._lists[slot] != target:
+                self._unlist(slot)
+                if target >= 0:
+                    self._postings[target] = np.append(self._postings.get(target, _NO_SLOTS), slot)
+                    self._lists[slot] = target
+        return slots
+
+    def upsert(self, entities: Iterable[Tuple[int, str]]):
+        """
+        Embeds and stores (entity id, text) pairs, replacing the vectors they had.
+        """
+        entities = list(entities)
+        if not entities or not self.loaded:
+            return
+        vectors = self.embedder.embed_many(text for _, text in entities)
+        crcs = np.array([text_crc(text) for _, text in entities], dtype=np.uint32)
+        with self._lock:
+            slots = self._write([entity_id for entity_id, _ in entities], crcs, vectors)
+            if self._written is not None:
+                self._written.update(slots.tolist())
+
+    def remove(self, ids: Iterable[int]):
+        if not self.loaded:
+            return
+        with self._lock:
+            for entity_id in ids:
+                slot = self._slots.pop(entity_id, None)
+                if slot is None:
+                    continue
+                self._unlist(slot)
+                self._vectors[slot] = 0
+                self._ids[slot] = -1
+                self._free.append(slot)
+
+    def refresh(self, ids: Iterable[int]):
+        """
+        Embeds the entities again from the table, e.g. after a bulk write that bypassed the ORM.
+        """
+        ids = list(ids)
+        if not ids or not self.loaded:
+            return
+        table = Entity.__table__
+        db = self.session_factory()
+        try:
+            rows = db.execute(select(table.c.id, *[table.c[f] for f in TEXT_FIELDS]).where(table.c.id.in_(ids))).all()
+        finally:
+            db.close()
+        self.upsert((row.id, entity_text(row)) for row in rows)
+        self.remove(set(ids) - {row.id for row in rows})
+
+    def apply(self, changes: Dict[int, Optional[str]]):
+        """
+        Applies committed entity texts by id, None for deleted entities. Entities whose
+        text did not change, e.g. a new status, are not embedded again.
+        """
+        if not changes or not self.loaded:
+            return
+        with self._lock:
+            changed = [(entity_id, text) for entity_id, text in changes.items() if text is not None and (
+                entity_id not in self._slots or self._crcs[self._slots[entity_id]] != text_crc(text))]
+        self.upsert(changed)
+        self.remove(entity_id for entity_id, text in changes.items() if text is None)
+
+    def watch_entities(self):
+        """
+        Keeps the vectors of entities inserted, updated or deleted through the ORM,
+        once their session commits. Bulk writes that bypass the ORM must call
+        `refresh()` or `schedule_sync()`.
+        """
+        # Entity texts each session wrote since its last commit, None for deletes
+        key = ("vector_index", id(self))
+
+        def pending(target) -> Dict[int, Optional[str]]:
+            return object_session(target).info.setdefault(key, {})
+
+        def on_change(mapper, connection, target):
+            pending(target)[target.id] = entity_text(target)
+
+        def on_delete(mapper, connection, target):
+            pending(target)[target.id] = None
+
+        event.listen(Entity, "after_insert", on_change)
+        event.listen(Entity, "after_update", on_change)
+        event.listen(Entity, "after_delete", on_delete)
+        event.listen(Session, "after_commit", lambda session: self.apply(session.info.pop(key, None)))
+        event.listen(Session, "after_rollback", lambda session: session.info.pop(key, None))
+
+    # --- RECONCILIATION AND TRAINING, IN THE THREADPOOL ---
+
+    def sync(self):
+        """
+        Brings the index in line with the entities table: embeds new rows and rows
+        whose text changed, drops deleted ones, trains the IVF lists when the index
+        outgrew brute force (or the rows they were trained on), then flushes.
+        """
+        table = Entity.__table__
+        embedded = 0
+        seen = []
+        with self._lock:
+            self._written = set()
+        db = self.session_factory()
+        try:
+            query = select(table.c.id, *[table.c[f] for f in TEXT_FIELDS])
+            for batch in db.execute(query.execution_options(yield_per=SYNC_BATCH_SIZE)).partitions():
+                if self._stopping:
+                    break
+                ids = np.array([row.id for row in batch], dtype=np.int64)
+                texts = [entity_text(row) for row in batch]
+                crcs = np.array([text_crc(text) for text in texts], dtype=np.uint32)
+                seen.append(ids)
+                with self._lock:
+                    slots = np.array([self._slots.get(entity_id, -1) for entity_id in ids.tolist()], dtype=np.int64)
+                    changed = (slots < 0) | (self._crcs[slots] != crcs)
+                changed = np.flatnonzero(changed)
+                if len(changed):
+                    vectors = self.embedder.embed_many(texts[i] for i in changed)
+                    with self._lock:
+                        self._write(ids[changed].tolist(), crcs[changed], vectors)
+                    embedded += len(changed)
+        finally:
+            db.close()
+            with self._lock:
+                written, self._written = self._written, None
+        if self._stopping:
+            return
+        with self._lock:
+            # Entities the ORM indexed meanwhile may not be in the rows read above
+            kept = set(self._ids[list(written)].tolist())
+            indexed = np.fromiter(self._slots, dtype=np.int64, count=len(self._slots))
+        deleted = set(np.setdiff1d(indexed, np.concatenate(seen) if seen else _NO_SLOTS).tolist()) - kept
+        self.remove(deleted)
+        logger.info(f"Vector index synced: {embedded} embedded, {len(deleted)} removed, {len(self._slots)} entities.")
+        if len(self._slots) >= self.ivf_min_rows and (
+                self._centroids is None or len(self._slots) >= RETRAIN_GROWTH * self._trained_rows):
+            self.train()
+        self.flush()
+
+    def train(self):
+        """
+        Clusters the vectors into sqrt(n) IVF lists and assigns every slot to its list.
+        Searches keep using the previous lists until the new ones are complete.
+        """
+        with self._lock:
+            count = self._count
+            used = np.flatnonzero(self._ids[:count] >= 0)
+            vectors = self._vectors
+            self._written = set()
+        if not len(used):
+            return
+        clusters = max(1, int(math.sqrt(len(used))))
+        rng = np.random.default_rng(1)
+        sample = np.sort(rng.choice(used, min(len(used), clusters * TRAINING_SAMPLES_PER_LIST), replace=False))
+        centroids = kmeans(np.asarray(vectors[sample]), clusters)
+        lists = nearest(vectors[:count], centroids)
+        with self._lock:
+            self._centroids = centroids
+            self._lists[:count] = lists
+            self._lists[self._ids < 0] = -1
+            # Slots written while training were listed with the previous centroids
+            written = np.array(sorted(self._written), dtype=np.int64)
+            self._written = None
+            written = written[self._ids[written] >= 0]
+            if len(written):
+                self._lists[written] = self._nearest_lists(np.asarray(self._vectors[written]))
+            self._build_postings()
+            self._trained_rows = len(self._slots)
+        logger.info(f"Vector index trained {clusters} IVF lists on {len(sample)} of {len(used)} entities.")
+
+    # --- SEARCH ---
+
+    def search(self, query: str, limit: int = 10, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        (entity id, cosine similarity) of the entities closest to `query`, best first,
+        leaving out those with no positive similarity. `nprobe` overrides the number of
+        IVF lists compared, 0 compares every vector.
+        """
+        if not self.loaded:
+            return []
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return []
+        # The slots to score and their ids are copied under the lock, writers do not wait
+        # for the scan. A grown index maps a new file, the previous mapping stays valid.
+        with self._lock:
+            if not self._slots:
+                return []
+            vectors = self._vectors
+            if self._centroids is None or nprobe == 0:
+                candidates = None
+                ids = self._ids[:self._count].copy()
+            else:
+                probed = top_k(self._centroids @ vector, self.nprobe if nprobe is None else nprobe)
+                candidates = np.sort(np.concatenate([self._postings.get(int(l), _NO_SLOTS) for l in probed]))
+                ids = self._ids[candidates]
+        if candidates is None:
+            scores = np.asarray(vectors[:len(ids)]) @ vector
+        else:
+            scores = np.asarray(vectors[candidates]) @ vector
+        best = top_k(scores, limit)
+        return [(int(i), float(s)) for i, s in zip(ids[best], scores[best]) if i >= 0 and s > 0]
+
+    # --- LIFECYCLE ---
+
+    async def start(self):
+        if not self.enabled or self.loaded:
+            return
+        self._stopping = False
+        await run_in_threadpool(self.load)
+        self.schedule_sync()
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush)
+
+    def schedule_sync(self):
+        """
+        Runs `sync()` in the background, once more after the current one if it is running.
+        """
+        if not self.loaded:
+            return
+        self._resync = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run_syncs())
+
+    async def _run_syncs(self):
+        while self._resync:
+            self._resync = False
+            try:
+                await run_in_threadpool(self.sync)
+            except Exception as e:
+                logger.error(f"Vector index sync failed: {e}")
+
+
+vector_index = EntityVectorIndex()
@@ -0,0 +1,105 @@
+"""
+Cold start: time from launching the server process to its first 200 response.
+
+Starts `uvicorn main:app` as a fresh process (like a container start) against a
+local Gemini stand-in whose models.list takes `--list-latency` seconds, and polls
+/api/status until it answers 200. Also reports when the router holds the listed
+models. "cold" runs start without a model catalog on disk, "warm" runs reuse the
+catalog written by the previous run. Every run gets a new empty database.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_cold_start --runs 5 --list-latency 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_search import FAKE_MODELS, FakeGemini, Settings, free_port, serve
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until(check, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError("server did not get ready in time")
+
+
+def start_once(env, timeout):
+    """
+    Returns (ms to first 200, ms until the listed models are routed).
+    """
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--port", str(port),
+             "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            first_200 = wait_until(lambda: httpx.get(f"{base_url}/api/status").status_code == 200, timeout)
+            routed = lambda: [m["model"] for m in httpx.get(f"{base_url}/api/search/debug/models").json()["models"]]
+            models_ready = wait_until(lambda: routed() == FAKE_MODELS, timeout)
+        finally:
+            process.terminate()
+            process.wait()
+    return (first_200 - start) * 1000, (models_ready - start) * 1000
+
+
+def summarize(timings):
+    return {"p50": round(statistics.median(timings), 1), "max": round(max(timings), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--list-latency", type=float, default=3.0, help="seconds the models.list call takes")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    Settings.list_latency = args.list_latency
+    gemini, gemini_url = serve(FakeGemini)
+    catalog_dir = tempfile.TemporaryDirectory()
+    catalog_path = os.path.join(catalog_dir.name, "model_catalog.json")
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "bench-key",
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "SERPAPI_API_KEY": "bench-key",
+        "MODEL_CATALOG_PATH": catalog_path,
+    }
+
+    report = {"config": vars(args)}
+    try:
+        for mode in ("cold", "warm"):
+            first_200, models_ready = [], []
+            for _ in range(args.runs):
+                if mode == "cold" and os.path.exists(catalog_path):
+                    os.remove(catalog_path)
+                ttfr, ready = start_once(env, args.timeout)
+                first_200.append(ttfr)
+                models_ready.append(ready)
+            report[mode] = {"first_200_ms": summarize(first_200), "models_routed_ms": summarize(models_ready)}
+    finally:
+        gemini.shutdown()
+        catalog_dir.cleanup()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
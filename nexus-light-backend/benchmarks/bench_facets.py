@@ -0,0 +1,97 @@
+"""
+Latency of the facet counts behind "People (X)" / "Companies (Y)" and the filter
+menus: the trigger-maintained counters against a GROUP BY scan of the entities.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_facets --size 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app.facets import FACET_COLUMNS, create_facet_counts, facet_counts
+from app.fulltext import create_fulltext_index
+from benchmarks.bench_fulltext import BATCH_SIZE, make_rows
+
+SOURCES = ["CRM", "web", "Apollo.io", "Clearbit", "Google Places"]
+
+
+def build_database(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(1, size + 1, BATCH_SIZE):
+            rows = make_rows(start, min(BATCH_SIZE, size - start + 1), rng)
+            for row in rows:
+                row["source"] = rng.choice(SOURCES)
+            conn.execute(insert(Entity), rows)
+    # Build both once at the end, like a first startup on an existing database
+    start = time.perf_counter()
+    create_fulltext_index(engine)
+    create_facet_counts(engine)
+    print(f"indexed {size} entities in {time.perf_counter() - start:.1f}s")
+    return engine
+
+
+def group_by_scan(db, filters):
+    """
+    What the counters replace: one GROUP BY over the entities per facet.
+    """
+    for column in FACET_COLUMNS:
+        others = {c: v for c, v in filters.items() if c != column}
+        where = " AND ".join(f'"{c}" = :{c}' for c in others) or "1 = 1"
+        db.execute(text(f'SELECT "{column}", COUNT(*) FROM entities WHERE {where} GROUP BY 1'), others).all()
+
+
+def measure(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), args.size)
+        db = sessionmaker(bind=engine)()
+        combinations = db.execute(text("SELECT COUNT(*) FROM entity_facet_counts")).scalar()
+        print(f"{combinations} facet combinations")
+        cases = {
+            "counters, no filter": lambda: facet_counts(db),
+            "counters, type=person": lambda: facet_counts(db, filters={"type": "person"}),
+            "counters, type+group+source": lambda: facet_counts(
+                db, filters={"type": "business", "group": "VIP", "source": "web"}),
+            "text 'Elena Silva', type=person": lambda: facet_counts(db, "Elena Silva", {"type": "person"}),
+            "text 'cto'": lambda: facet_counts(db, "cto"),
+            "text 'office', capped": lambda: facet_counts(db, "office"),
+            "text 'office', uncapped": lambda: facet_counts(db, "office", match_limit=args.size),
+            "GROUP BY scan, no filter": lambda: group_by_scan(db, {}),
+            "GROUP BY scan, type=person": lambda: group_by_scan(db, {"type": "person"}),
+        }
+        print(f"{'query':<34} | {'p50 ms':>9} | {'p95 ms':>9}")
+        for name, fn in cases.items():
+            repeats = args.repeats if not name.startswith("GROUP BY") else max(args.repeats // 5, 1)
+            p50, p95 = measure(fn, repeats)
+            print(f"{name:<34} | {p50:>9.2f} | {p95:>9.2f}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
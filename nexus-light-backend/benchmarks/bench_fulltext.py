@@ -0,0 +1,97 @@
+"""
+Compares the full-text index against the legacy ILIKE scan used by `search_db_wrapper`.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_fulltext --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app.fulltext import create_fulltext_index, search_entities, search_entities_ilike
+
+FIRST_NAMES = ["Elena", "Marcus", "Sarah", "Joao", "Ana", "Pedro", "Lucia", "Rafael", "Camila", "Diego"]
+LAST_NAMES = ["Silva", "Chen", "Jones", "Souza", "Costa", "Pereira", "Lima", "Alves", "Rocha", "Gomes"]
+ROLES = ["VP Sales", "Head of Growth", "CRO", "CTO", "Account Executive", "Marketing Manager", "CFO"]
+COMPANIES = ["TechFlow", "Nubank", "Vtex", "Mercado Libre", "Stone", "iFood", "Loft", "Creditas"]
+INDUSTRIES = ["SaaS Platform", "Fintech", "E-commerce", "Logistics", "Healthtech"]
+LOCATIONS = ["São Paulo", "Buenos Aires", "Rio de Janeiro", "Bogotá", "Mexico City"]
+GROUPS = ["VIP", "Fintech", "Retail", "High Growth", "Enterprise"]
+
+QUERIES = ["sales", "TechFlow", "Head of Growth", "Elena Silva", "fintech"]
+BATCH_SIZE = 50_000
+
+
+def make_rows(start, count, rng):
+    # executemany needs every row to carry the same keys
+    empty = {"role": None, "company": None, "industry": None, "location": None}
+    rows = []
+    for i in range(start, start + count):
+        if rng.random() < 0.8:
+            rows.append({
+                **empty, "id": i, "type": "person",
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                "role": rng.choice(ROLES), "company": rng.choice(COMPANIES),
+                "status": "Active", "group": rng.choice(GROUPS),
+            })
+        else:
+            rows.append({
+                **empty, "id": i, "type": "business",
+                "name": f"{rng.choice(COMPANIES)} Office {i}",
+                "industry": rng.choice(INDUSTRIES), "location": rng.choice(LOCATIONS),
+                "status": "Target", "group": rng.choice(GROUPS),
+            })
+    return rows
+
+
+def build_database(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(1, size + 1, BATCH_SIZE):
+            conn.execute(insert(Entity), make_rows(start, min(BATCH_SIZE, size - start + 1), rng))
+    # Build the index once at the end, like a first startup on an existing database
+    create_fulltext_index(engine)
+    return engine
+
+
+def time_queries(fn, db, repeats):
+    timings = []
+    for query in QUERIES:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(db, query)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'entities':>10} | {'ILIKE p50 ms':>12} | {'ILIKE max ms':>12} | {'FTS p50 ms':>10} | {'FTS max ms':>10} | {'speedup':>7}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = build_database(os.path.join(tmp, "bench.db"), size)
+            db = sessionmaker(bind=engine)()
+            # The legacy path returned every matching row
+            ilike_p50, ilike_max = time_queries(lambda s, q: search_entities_ilike(s, q), db, args.repeats)
+            fts_p50, fts_max = time_queries(lambda s, q: search_entities(s, q, limit=args.limit), db, args.repeats)
+            db.close()
+            engine.dispose()
+        print(f"{size:>10} | {ilike_p50:>12.2f} | {ilike_max:>12.2f} | {fts_p50:>10.2f} | {fts_max:>10.2f} | {ilike_p50 / fts_p50:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
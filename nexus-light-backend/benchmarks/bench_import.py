@@ -0,0 +1,65 @@
+"""
+Compares the bulk import pipeline with the old ORM-per-row path of `seed_database`.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_import --rows 10000 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app.fulltext import create_fulltext_index
+from app.importer import import_records
+from benchmarks.bench_fulltext import make_rows
+
+
+def fresh_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    create_fulltext_index(engine)
+    return engine
+
+
+def orm_per_row(engine, rows):
+    db = sessionmaker(bind=engine)()
+    try:
+        for row in rows:
+            db.add(Entity(**row))
+        db.commit()
+    finally:
+        db.close()
+
+
+def pipeline(engine, rows, chunk_size):
+    import_records(rows, engine=engine, chunk_size=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} | {'ORM rows/s':>10} | {'import rows/s':>13} | {'speedup':>7}")
+    for count in args.rows:
+        rows = make_rows(1, count, random.Random(42))
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, run in [("orm", lambda e: orm_per_row(e, rows)),
+                              ("import", lambda e: pipeline(e, rows, args.chunk_size))]:
+                engine = fresh_engine(os.path.join(tmp, f"{name}.db"))
+                start = time.perf_counter()
+                run(engine)
+                results[name] = count / (time.perf_counter() - start)
+                engine.dispose()
+        print(f"{count:>9} | {results['orm']:>10.0f} | {results['import']:>13.0f} | {results['import'] / results['orm']:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Page latency at increasing depth: keyset cursor vs LIMIT/OFFSET.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_pagination --rows 1000000 --page-size 50
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.importer import ENTITY_COLUMNS
+from app.routes.entities import build_query, list_entities_page
+from benchmarks.bench_fulltext import build_database
+
+DEPTHS = [0, 0.01, 0.1, 0.5, 0.9, 0.99]
+
+
+def p50_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--filter-type", default="person", help="filter applied to both strategies, '' for none")
+    args = parser.parse_args()
+
+    filters = {"type": args.filter_type} if args.filter_type else {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), args.rows)
+        db = sessionmaker(bind=engine)()
+
+        print(f"{'depth':>6} | {'row offset':>10} | {'keyset p50 ms':>13} | {'OFFSET p50 ms':>13}")
+        for depth in DEPTHS:
+            offset = int(args.rows * depth)
+            # Entity ids are 1..rows, so the cursor for a given depth is just the id before it
+            keyset = lambda: list_entities_page(db, filters, ENTITY_COLUMNS, args.page_size, after_id=offset)
+            paged = lambda: db.execute(
+                build_query(filters, ENTITY_COLUMNS).limit(args.page_size).offset(offset)
+            ).all()
+            print(f"{depth:>6.0%} | {offset:>10} | {p50_ms(keyset, args.repeats):>13.2f} | "
+                  f"{p50_ms(paged, args.repeats):>13.2f}")
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+End-to-end load test of /api/search and /api/search/groups/suggest-name, fully offline.
+
+The app runs in-process behind uvicorn, against local stand-ins for Gemini (scripted
+function calls, configurable latency and 429s) and SerpApi, in a throwaway working
+directory so `sql_app.db` is a fresh database. Prints latency percentiles, time to
+first byte, time to the first `entity` event and throughput as JSON.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_search --concurrency 20 --requests 200 --model-latency 0.3 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+QUERIES = [
+    "Who is the VP of Sales at {company}?",
+    "Find the head of growth at {company}",
+    "Who are the decision makers at {company} in {city}?",
+    "Search for the CTO of {company}",
+]
+COMPANIES = ["TechFlow", "Nubank", "Vtex", "Mercado Libre", "Stone", "Loft", "QuintoAndar", "Creditas"]
+CITIES = ["São Paulo", "Buenos Aires", "Bogotá", "Mexico City"]
+FAKE_MODELS = ["gemini-2.0-flash", "gemini-2.0-flash-lite"]
+
+
+class Settings:
+    model_latency = 0.3
+    list_latency = 0.0
+    serp_latency = 0.2
+    rate_limit = 0.0
+    tool_calls = ("search_db_wrapper", "search_web_tool")
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile, in milliseconds.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- STAND-IN SERVERS ---
+
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class FakeGemini(JsonHandler):
+    """
+    Enough of the Gemini REST API for the app: model listing and generateContent.
+
+    With tools and a user message last, it asks for `Settings.tool_calls`; once the
+    tool responses are in, it answers with a JSON list. Without tools it plays the
+    gate keeper or names a group.
+    """
+
+    def do_GET(self):
+        time.sleep(Settings.list_latency)
+        if urlparse(self.path).path.endswith("/models"):
+            models = [{"name": f"models/{m}", "supportedGenerationMethods": ["generateContent"]} for m in FAKE_MODELS]
+            return self._send_json(200, {"models": models})
+        self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        body = self._read_json()
+        time.sleep(random.expovariate(1 / Settings.model_latency) if Settings.model_latency else 0)
+        if random.random() < Settings.rate_limit:
+            return self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted",
+                                                   "status": "RESOURCE_EXHAUSTED"}})
+        parts = self.reply(body)
+        prompt_tokens = len(json.dumps(body)) // 4
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 20, "totalTokenCount": prompt_tokens + 20}
+        if not urlparse(self.path).path.endswith(":streamGenerateContent"):
+            return self._send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": usage,
+            })
+        # Server-sent events, a text answer split into one chunk per line
+        chunks = [[{"text": line}] for line in parts[0]["text"].splitlines(keepends=True)] if "text" in parts[0] else [parts]
+        events = [{"candidates": [{"content": {"role": "model", "parts": chunk}, "index": 0}], "usageMetadata": usage}
+                  for chunk in chunks]
+        events[-1]["candidates"][0]["finishReason"] = "STOP"
+        payload = "".join(f"data: {json.dumps(event)}\r\n\r\n" for event in events).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def reply(self, body):
+        contents = body.get("contents") or []
+        last = contents[-1]["parts"] if contents else []
+        text = " ".join(p.get("text", "") for p in last)
+        if body.get("tools") and text and not any("functionResponse" in p for p in last):
+            return [{"functionCall": {"name": name, "args": {"query": text}}} for name in Settings.tool_calls]
+        if body.get("tools") or any("functionResponse" in p for p in last):
+            answer = [{"id": None, "type": "person", "name": "Elena Silva", "role": "VP Sales", "company": "TechFlow",
+                       "location": "São Paulo"}]
+            return [{"text": "```json\n" + json.dumps(answer, indent=2) + "\n```"}]
+        if "classification model" in text:
+            return [{"text": "SEARCH"}]
+        return [{"text": "Fintech Growth Leaders"}]
+
+
+class FakeSerpApi(JsonHandler):
+    def do_GET(self):
+        time.sleep(Settings.serp_latency)
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        # Every other result is a profile page the app turns into an entity
+        results = [{"title": f"Person {i} - Head of Sales - {query} | LinkedIn", "link": f"https://www.linkedin.com/in/p{i}",
+                    "snippet": f"Profile {i} matching {query}."} if i % 2 == 0 else
+                   {"title": f"{query} - Result {i}", "link": f"https://example.com/{i}",
+                    "snippet": f"Article {i} about {query}."} for i in range(10)]
+        self._send_json(200, {"organic_results": results})
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    # Clients hang up mid-request when a benchmarked process is stopped, that is expected
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_app(port):
+    """
+    Imports the app only now, after the environment points it at the stand-ins.
+    """
+    import uvicorn
+    from main import app
+
+    # The app logs every request and model attempt at INFO, too much under load
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("App failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+# --- LOAD ---
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.ttfb = []
+        self.first_entity = []
+        self.errors = {}
+        self.stages = {}
+        self.queued = 0
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def summary(self, elapsed):
+        stages = {stage: percentile(values, 50) for stage, values in sorted(self.stages.items())}
+        return {
+            "requests": len(self.latencies) + sum(self.errors.values()),
+            "ok": len(self.latencies),
+            "errors": self.errors,
+            "queued": self.queued,
+            "throughput_rps": round(len(self.latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": {f"p{p}": percentile(self.latencies, p) for p in (50, 95, 99)},
+            "ttfb_ms": {f"p{p}": percentile(self.ttfb, p) for p in (50, 95, 99)},
+            "first_entity_ms": {f"p{p}": percentile(self.first_entity, p) for p in (50, 95, 99)},
+            "server_stages_p50_ms": stages,
+        }
+
+
+async def search_once(client, i, fresh, results):
+    rng = random.Random(i)
+    query = rng.choice(QUERIES).format(company=rng.choice(COMPANIES), city=rng.choice(CITIES))
+    params = {"q": f"{query} #{i}" if fresh else query, "fresh": str(fresh).lower()}
+    start = time.perf_counter()
+    first_byte, first_entity, events = None, None, []
+    async with client.stream("GET", "/api/search/", params=params) as response:
+        if response.status_code != 200:
+            return results.error(f"http_{response.status_code}")
+        async for line in response.aiter_lines():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            if line:
+                events.append(json.loads(line))
+                if first_entity is None and events[-1]["type"] == "entity":
+                    first_entity = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    types = [e["type"] for e in events]
+    results.queued += "queued" in types
+    if "answer" not in types:
+        return results.error("error_event" if "error" in types else "no_answer")
+    results.latencies.append(elapsed)
+    results.ttfb.append(first_byte)
+    if first_entity is not None:
+        results.first_entity.append(first_entity)
+    for event in events:
+        if event["type"] == "timings":
+            for stage, ms in event["stages"].items():
+                results.stages.setdefault(stage, []).append(ms / 1000)
+
+
+async def suggest_once(client, i, results):
+    entity_ids = random.Random(i).sample([1, 2, 3, 101, 102, 103], 3)
+    start = time.perf_counter()
+    response = await client.post("/api/search/groups/suggest-name", json={"entity_ids": entity_ids})
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        return results.error(f"http_{response.status_code}")
+    results.latencies.append(elapsed)
+    results.ttfb.append(elapsed)
+
+
+async def drive(base_url, worker, requests, concurrency, timeout):
+    results = Results()
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def loop():
+            for i in counter:
+                try:
+                    await worker(client, i, results)
+                except httpx.HTTPError as e:
+                    results.error(type(e).__name__)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return results.summary(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--endpoint", choices=["search", "suggest-name", "both"], default="both")
+    parser.add_argument("--model-latency", type=float, default=0.3, help="mean seconds per Gemini call")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of Gemini calls answered with 429")
+    parser.add_argument("--serp-latency", type=float, default=0.2, help="seconds per SerpApi call")
+    parser.add_argument("--tools", default="search_db_wrapper,search_web_tool",
+                        help="function calls the fake model asks for on the first turn")
+    parser.add_argument("--cached", action="store_true", help="repeat queries without fresh=true to hit the caches")
+    parser.add_argument("--rpm", type=int, default=0, help="admission control model requests per minute (0 disables)")
+    parser.add_argument("--tpm", type=int, default=0, help="admission control tokens per minute (0 disables)")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    Settings.model_latency = args.model_latency
+    Settings.rate_limit = args.rate_limit
+    Settings.serp_latency = args.serp_latency
+    Settings.tool_calls = tuple(t for t in re.split(r"\s*,\s*", args.tools) if t)
+
+    gemini, gemini_url = serve(FakeGemini)
+    serpapi, serpapi_url = serve(FakeSerpApi)
+    os.environ.update({
+        "GEMINI_API_KEY": "bench-key",
+        "GOOGLE_GEMINI_BASE_URL": gemini_url,
+        "SERPAPI_API_KEY": "bench-key",
+        "SERPAPI_URL": f"{serpapi_url}/search",
+        "ADMISSION_RPM": str(args.rpm),
+        "ADMISSION_TPM": str(args.tpm),
+        "ADMISSION_QUEUE_SIZE": str(max(args.requests, 100)),
+    })
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+
+    port = free_port()
+    server, thread = start_app(port)
+    base_url = f"http://127.0.0.1:{port}"
+    report = {"config": {k: v for k, v in vars(args).items()}}
+    try:
+        if args.endpoint in ("search", "both"):
+            worker = lambda client, i, results: search_once(client, i, not args.cached, results)
+            report["search"] = asyncio.run(drive(base_url, worker, args.requests, args.concurrency, args.timeout))
+        if args.endpoint in ("suggest-name", "both"):
+            report["suggest_name"] = asyncio.run(
+                drive(base_url, suggest_once, args.requests, args.concurrency, args.timeout))
+        report["rate_limited"] = sum(
+            float(line.rsplit(" ", 1)[1]) for line in httpx.get(f"{base_url}/api/metrics").text.splitlines()
+            if line.startswith("nexus_model_rate_limited_total{"))
+    finally:
+        server.should_exit = True
+        thread.join()
+        gemini.shutdown()
+        serpapi.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Latency of the map queries (viewport, nearest neighbours, grid clusters) over random points.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_spatial --size 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app.spatial import cluster_entities, create_spatial_index, entities_in_bbox, nearest_entities
+from benchmarks.bench_fulltext import BATCH_SIZE, make_rows
+
+EXTENT = 100.0
+
+
+def build_database(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(1, size + 1, BATCH_SIZE):
+            rows = make_rows(start, min(BATCH_SIZE, size - start + 1), rng)
+            for row in rows:
+                row["coords"] = {"x": rng.uniform(0, EXTENT), "y": rng.uniform(0, EXTENT)}
+            conn.execute(insert(Entity), rows)
+    # Build the index once at the end, like a first startup on an existing database
+    start = time.perf_counter()
+    create_spatial_index(engine)
+    print(f"indexed {size} points in {time.perf_counter() - start:.1f}s")
+    return engine
+
+
+def viewport(rng, width):
+    x, y = rng.uniform(0, EXTENT - width), rng.uniform(0, EXTENT - width)
+    return x, y, x + width, y + width
+
+
+def measure(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), args.size)
+        db = sessionmaker(bind=engine)()
+        point = lambda: (rng.uniform(0, EXTENT), rng.uniform(0, EXTENT))
+        cases = {
+            "bbox, 1% viewport, limit 1000": lambda: entities_in_bbox(db, viewport(rng, 10), limit=1000),
+            "nearest k=10": lambda: nearest_entities(db, *point(), 10),
+            "nearest k=10 type=business": lambda: nearest_entities(db, *point(), 10, {"type": "business"}),
+            "clusters, whole map, 16 cells": lambda: cluster_entities(db, (0, 0, EXTENT, EXTENT), 16),
+            "clusters, 25% viewport, 16 cells": lambda: cluster_entities(db, viewport(rng, 50), 16),
+            "clusters, 0.25% viewport (live)": lambda: cluster_entities(db, viewport(rng, 5), 16),
+        }
+        print(f"{'query':<36} | {'p50 ms':>8} | {'p95 ms':>8}")
+        for name, fn in cases.items():
+            p50, p95 = measure(lambda: (fn(), db.expunge_all()), args.repeats)
+            print(f"{name:<36} | {p50:>8.2f} | {p95:>8.2f}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Recall and latency of the semantic entity search: IVF lists at several nprobe
+against the exact brute-force scan, plus the cost of building and reloading the index.
+
+Usage (from nexus-light-backend/):
+    python -m benchmarks.bench_vector_index --sizes 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app.vector_index import EntityVectorIndex
+from benchmarks.bench_fulltext import BATCH_SIZE
+
+SENIORITY = ["Head of", "VP", "Director of", "Manager", "Chief", "Lead"]
+FUNCTIONS = ["Growth", "Sales", "Marketing", "Engineering", "Finance", "Operations", "Product", "Partnerships",
+             "Procurement", "People"]
+SYLLABLES = ["nu", "tech", "flow", "ve", "tex", "lo", "ft", "cre", "di", "tas", "sto", "ne", "mer", "ca", "do",
+             "fo", "od", "ra", "pi", "za"]
+INDUSTRIES = ["Fintech", "SaaS Platform", "E-commerce", "Logistics", "Healthtech", "Edtech", "Insurtech",
+              "Proptech", "Retail", "Payments", "Marketplace", "Agritech", "Cybersecurity", "Biotech", "Media"]
+LOCATIONS = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Porto Alegre", "Recife",
+             "Buenos Aires", "Córdoba", "Bogotá", "Medellín", "Mexico City", "Guadalajara", "Santiago", "Lima",
+             "Montevideo", "Quito", "Lisbon", "Madrid", "Miami", "Austin"]
+GROUPS = ["VIP", "Fintech", "Retail", "High Growth", "Enterprise", "SMB", "Partners", "Churn Risk"]
+DESCRIBED = ["growth leaders at Brazilian fintechs", "head of sales fintech São Paulo", "engineering directors edtech",
+             "payments partnerships Mexico City", "chief finance officer logistics", "marketing VIP healthtech"]
+QUERIES = 100
+K = 10
+
+
+def company(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+
+def make_rows(start, count, rng):
+    rows = []
+    for i in range(start, start + count):
+        rows.append({
+            "id": i, "type": "person", "name": f"Lead {i}",
+            "role": f"{rng.choice(SENIORITY)} {rng.choice(FUNCTIONS)}", "company": company(rng),
+            "industry": rng.choice(INDUSTRIES), "location": rng.choice(LOCATIONS), "group": rng.choice(GROUPS),
+        })
+    return rows
+
+
+def make_queries(rng):
+    # Descriptions mixing a function, an industry and a place, the way users ask
+    queries = list(DESCRIBED)
+    while len(queries) < QUERIES:
+        words = [rng.choice(FUNCTIONS), rng.choice(INDUSTRIES), rng.choice(LOCATIONS)]
+        queries.append(" ".join(rng.sample(words, rng.choice([2, 3]))))
+    return queries
+
+
+def build_database(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(1, size + 1, BATCH_SIZE):
+            conn.execute(insert(Entity), make_rows(start, min(BATCH_SIZE, size - start + 1), rng))
+    return engine
+
+
+def measure(index, queries, nprobe):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, limit=K, nprobe=nprobe))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)], results
+
+
+def recall(exact, approximate):
+    """
+    Share of the exact top K found, counting ties with the K-th exact score as found.
+    """
+    found = total = 0
+    for truth, hits in zip(exact, approximate):
+        if not truth:
+            continue
+        cutoff = truth[-1][1] - 1e-6
+        found += min(len(truth), sum(1 for _, score in hits if score >= cutoff))
+        total += len(truth)
+    return found / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+    queries = make_queries(random.Random(7))
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = build_database(os.path.join(tmp, "bench.db"), size)
+            session_factory = sessionmaker(bind=engine)
+            index = EntityVectorIndex(path=os.path.join(tmp, "vectors"), dim=args.dim, session_factory=session_factory)
+            index.load()
+            start = time.perf_counter()
+            index.sync()
+            built = time.perf_counter() - start
+
+            start = time.perf_counter()
+            restarted = EntityVectorIndex(path=os.path.join(tmp, "vectors"), dim=args.dim,
+                                          session_factory=session_factory)
+            restarted.load()
+            loaded = time.perf_counter() - start
+            start = time.perf_counter()
+            restarted.sync()
+            synced = time.perf_counter() - start
+
+            stats = index.stats()
+            print(f"\n{size} entities, dim {args.dim}, {stats['mode']} with {stats['lists']} lists, "
+                  f"{os.path.getsize(os.path.join(tmp, 'vectors', 'vectors.f32')) / 2**20:.0f} MiB of vectors")
+            print(f"  build (embed + train): {built:.1f}s, restart load: {loaded * 1000:.0f} ms, "
+                  f"sync without changes: {synced:.1f}s")
+
+            measure(index, queries[:10], 0) # page the vectors in
+            p50, p95, exact = measure(index, queries, 0)
+            print(f"  {'brute force':>12}: p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  recall@{K} 1.000")
+            for nprobe in args.nprobe:
+                p50, p95, hits = measure(index, queries, nprobe)
+                print(f"  {f'nprobe {nprobe}':>12}: p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+                      f"recall@{K} {recall(exact, hits):.3f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
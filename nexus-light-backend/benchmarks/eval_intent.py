@@ -0,0 +1,134 @@
+"""
+Offline evaluation of the local intent classifier against LLM gate-keeper labels.
+
+Label a list of queries (one per line) with the LLM gate keeper, recording its latency:
+    python -m benchmarks.eval_intent collect queries.txt labels.jsonl
+
+Evaluate the local classifier on those labels (optionally retraining on a split first):
+    python -m benchmarks.eval_intent evaluate labels.jsonl [--train-out app/intent_model.npz]
+
+A retrained model is only saved when its confident answers on the held out split reach
+--min-precision, the server leaves everything but the rules to the LLM without one.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from app.config import INTENT_CONFIDENCE_THRESHOLD, INTENT_MIN_PRECISION, INTENT_MODEL_PATH
+from app.intent import (
+    GATE_KEEPER_PROMPT, SEARCH, HashedLinearClassifier, IntentClassifier, SEED_EXAMPLES, load_classifier, parse_label,
+)
+
+
+async def collect(queries_path, out_path):
+    from app.gemini import gemini
+    from app.model_catalog import DEFAULT_MODELS
+    from app.routes.search import model_router, model_catalog, generate_single_turn_with_fallback
+
+    # The shared client and model chain of the app, listed now instead of in the background
+    client = gemini.get()
+    if client is None:
+        raise SystemExit("GEMINI_API_KEY is missing.")
+    if not await model_catalog.refresh():
+        model_router.set_models((model_catalog.load() or {}).get("models") or DEFAULT_MODELS)
+    with open(queries_path) as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    try:
+        with open(out_path, "w") as out:
+            for query in queries:
+                start = time.perf_counter()
+                response = await generate_single_turn_with_fallback(client, GATE_KEEPER_PROMPT.format(query=query))
+                latency_ms = (time.perf_counter() - start) * 1000
+                label = parse_label(response.text) or SEARCH # as the gate keeper reads it
+                out.write(json.dumps({"query": query, "label": label, "llm_latency_ms": latency_ms}) + "\n")
+                print(f"{label:6} {latency_ms:7.0f} ms  {query}")
+    finally:
+        await gemini.close()
+
+
+def evaluate(labels_path, threshold, llm_latency_ms, train_out, test_share, min_precision):
+    with open(labels_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    if train_out:
+        random.Random(0).shuffle(rows)
+        split = int(len(rows) * (1 - test_share))
+        train, rows = rows[:split], rows[split:]
+        model = HashedLinearClassifier().fit(SEED_EXAMPLES + [(r["query"], r["label"]) for r in train])
+        classifier = IntentClassifier(model, trusted=True)
+        print(f"Trained on {len(train)} labelled queries (+ seed), testing on {len(rows)}")
+    else:
+        classifier = load_classifier(INTENT_MODEL_PATH, min_precision)
+
+    correct = confident = confident_correct = 0
+    timings_us = []
+    for row in rows:
+        start = time.perf_counter()
+        intent, confidence = classifier.classify(row["query"])
+        timings_us.append((time.perf_counter() - start) * 1e6)
+        correct += intent == row["label"]
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += intent == row["label"]
+
+    llm_latencies = [r["llm_latency_ms"] for r in rows if "llm_latency_ms" in r]
+    llm_ms = statistics.mean(llm_latencies) if llm_latencies else llm_latency_ms
+    local_ms = statistics.mean(timings_us) / 1000
+    n = len(rows)
+    report = {
+        "queries": n,
+        "threshold": threshold,
+        "accuracy": correct / n,
+        "coverage": confident / n,
+        "accuracy_when_confident": confident_correct / confident if confident else None,
+        "local_latency_us_p50": statistics.median(timings_us),
+        "local_latency_us_p99": sorted(timings_us)[int(0.99 * (n - 1))],
+        "llm_latency_ms_mean": llm_ms,
+        # Confident queries skip the LLM entirely, the rest pay for both
+        "latency_saved_ms_per_request": (confident * (llm_ms - local_ms) - (n - confident) * local_ms) / n,
+        "llm_calls_saved": confident,
+    }
+    print(json.dumps(report, indent=2))
+
+    if train_out:
+        precision = report["accuracy_when_confident"]
+        if precision is None or precision < min_precision:
+            print(f"Not saved: precision {precision} is below {min_precision}, the LLM keeps deciding")
+            return
+        model.precision = precision
+        model.save(train_out)
+        print(f"Saved to {train_out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    collect_parser = sub.add_parser("collect", help="label queries with the LLM gate keeper")
+    collect_parser.add_argument("queries")
+    collect_parser.add_argument("out")
+
+    evaluate_parser = sub.add_parser("evaluate", help="score the local classifier against LLM labels")
+    evaluate_parser.add_argument("labels")
+    evaluate_parser.add_argument("--threshold", type=float, default=INTENT_CONFIDENCE_THRESHOLD)
+    evaluate_parser.add_argument("--llm-latency-ms", type=float, default=800.0,
+                                 help="assumed gate-keeper latency when the labels carry none")
+    evaluate_parser.add_argument("--train-out", help="retrain on part of the labels and save the weights here")
+    evaluate_parser.add_argument("--test-share", type=float, default=0.3)
+    evaluate_parser.add_argument("--min-precision", type=float, default=INTENT_MIN_PRECISION,
+                                 help="accuracy of confident answers a retrained model needs to be saved")
+
+    args = parser.parse_args()
+    if args.command == "collect":
+        asyncio.run(collect(args.queries, args.out))
+    else:
+        evaluate(args.labels, args.threshold, args.llm_latency_ms, args.train_out, args.test_share,
+                 args.min_precision)
+
+
+if __name__ == "__main__":
+    main()
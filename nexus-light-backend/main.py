@@ -1,9 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from app.config import GEMINI_API_KEY
-from app.database import create_db_and_tables, SessionLocal, Entity
+from app.database import create_db_and_tables, dispose_async_engine, engine
+from app.importer import import_records
+from app.http_client import http_client
+from app.gemini import gemini
+from app.memory import history_writer
+from app.enrichment import enrichment
+from app.vector_index import vector_index
+from app.metrics import REGISTRY
 
-app = FastAPI(title="Nexus Light Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema upgrades, index backfills and demo rows, off the event loop
+    await run_in_threadpool(create_db_and_tables)
+    await run_in_threadpool(seed_database)
+    await on_startup()
+    await http_client.start()
+    await history_writer.start()
+    await enrichment.start()
+    # Maps the stored vectors, rows changed since are embedded in the background
+    await vector_index.start()
+    gemini.start()
+    # Serves the cached model chain right away, the catalog refreshes in the background
+    await model_catalog.start()
+    try:
+        yield
+    finally:
+        await model_catalog.stop()
+        await gemini.close()
+        await vector_index.stop()
+        await enrichment.stop()
+        await history_writer.stop()
+        await http_client.close()
+        await dispose_async_engine()
+
+app = FastAPI(title="Nexus Light Backend", lifespan=lifespan)
 
 # Define the allowed origins for CORS
 origins = [
@@ -21,61 +56,37 @@ app.add_middleware(
 )
 
 def seed_database():
-    db = SessionLocal()
-    try:
-        # Check if entities already exist
-        if db.query(Entity).count() == 0:
-            MOCK_ENTITIES = [
-                { "id": 1, "type": 'person', "name": "Elena Silva", "role": "VP Sales", "company": "TechFlow", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Elena", "status": "Active", "group": "VIP", "coords": { "x": 30, "y": 40 }, "source": "LinkedIn Sales Nav" },
-                { "id": 2, "type": 'person', "name": "Marcus Chen", "role": "Head of Growth", "company": "Nubank", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Marcus", "status": "Active", "group": "Fintech", "coords": { "x": 65, "y": 25 }, "source": "Apollo.io" },
-                { "id": 3, "type": 'person', "name": "Sarah Jones", "role": "CRO", "company": "Vtex", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Sarah", "status": "Unassigned", "group": "Retail", "coords": { "x": 20, "y": 70 }, "source": "Clearbit" },
-                { "id": 101, "type": 'business', "name": "TechFlow HQ", "industry": "SaaS Platform", "location": "São Paulo", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=TF", "status": "Target", "group": "High Growth", "coords": { "x": 32, "y": 38 }, "source": "Google Places" },
-                { "id": 102, "type": 'business', "name": "Nubank Office", "industry": "Fintech", "location": "São Paulo", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=NB", "status": "Customer", "group": "Enterprise", "coords": { "x": 62, "y": 22 }, "source": "Google Places" },
-                { "id": 103, "type": 'business', "name": "Mercado Libre", "industry": "E-commerce", "location": "Buenos Aires", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=ML", "status": "New", "group": "Enterprise", "coords": { "x": 80, "y": 60 }, "source": "Internal DB" },
-            ]
-            for entity_data in MOCK_ENTITIES:
-                # Unpack common fields
-                common_fields = {k: v for k, v in entity_data.items() if k not in ['role', 'company', 'industry', 'location']}
-                
-                if entity_data['type'] == 'person':
-                    db_entity = Entity(
-                        **common_fields,
-                        role=entity_data.get('role'),
-                        company=entity_data.get('company')
-                    )
-                else: # business
-                    db_entity = Entity(
-                        **common_fields,
-                        industry=entity_data.get('industry'),
-                        location=entity_data.get('location')
-                    )
-                db.add(db_entity)
-            db.commit()
-    finally:
-        db.close()
+    """
+    Loads the demo entities. Existing rows are left untouched, so this is safe on every startup.
+    """
+    MOCK_ENTITIES = [
+        { "id": 1, "type": 'person', "name": "Elena Silva", "role": "VP Sales", "company": "TechFlow", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Elena", "status": "Active", "group": "VIP", "coords": { "x": 30, "y": 40 }, "source": "LinkedIn Sales Nav" },
+        { "id": 2, "type": 'person', "name": "Marcus Chen", "role": "Head of Growth", "company": "Nubank", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Marcus", "status": "Active", "group": "Fintech", "coords": { "x": 65, "y": 25 }, "source": "Apollo.io" },
+        { "id": 3, "type": 'person', "name": "Sarah Jones", "role": "CRO", "company": "Vtex", "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=Sarah", "status": "Unassigned", "group": "Retail", "coords": { "x": 20, "y": 70 }, "source": "Clearbit" },
+        { "id": 101, "type": 'business', "name": "TechFlow HQ", "industry": "SaaS Platform", "location": "São Paulo", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=TF", "status": "Target", "group": "High Growth", "coords": { "x": 32, "y": 38 }, "source": "Google Places" },
+        { "id": 102, "type": 'business', "name": "Nubank Office", "industry": "Fintech", "location": "São Paulo", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=NB", "status": "Customer", "group": "Enterprise", "coords": { "x": 62, "y": 22 }, "source": "Google Places" },
+        { "id": 103, "type": 'business', "name": "Mercado Libre", "industry": "E-commerce", "location": "Buenos Aires", "avatar": "https://api.dicebear.com/7.x/initials/svg?seed=ML", "status": "New", "group": "Enterprise", "coords": { "x": 80, "y": 60 }, "source": "Internal DB" },
+    ]
+    import_records(MOCK_ENTITIES, engine=engine, on_conflict="ignore")
 
-from app.routes.search import get_available_models, MODEL_FALLBACK_CHAIN # Import here
+from app.routes.search import model_catalog # Import here
 
-@app.on_event("startup")
-async def on_startup(): # Make it async
-    create_db_and_tables()
-    seed_database()
+async def on_startup():
     from app.config import SERPAPI_API_KEY # Import here to ensure config is loaded
     print(f"Loaded SERPAPI_API_KEY: {SERPAPI_API_KEY}")
-
-    # Populate the MODEL_FALLBACK_CHAIN dynamically
     if not GEMINI_API_KEY:
         print("GEMINI_API_KEY not found. Skipping dynamic model loading.")
-    else:
-        print("Attempting to dynamically load GenAI models...")
-        models = await get_available_models()
-        MODEL_FALLBACK_CHAIN.extend(models) # Use extend to add elements
-        print(f"MODEL_FALLBACK_CHAIN populated with: {MODEL_FALLBACK_CHAIN}")
 
 @app.get("/api/status", tags=["Health Check"])
 def get_status():
     """Return the application's status and configuration."""
     return {"status": "ok", "gemini_api_key_loaded": bool(GEMINI_API_KEY)}
 
-from app.routes import search
+@app.get("/api/metrics", tags=["Health Check"])
+def get_metrics():
+    """Stage latency histograms, token and rate-limit counters in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+from app.routes import search, entities
 app.include_router(search.router)
+app.include_router(entities.router)
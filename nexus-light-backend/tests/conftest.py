@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.database import Base, Entity, create_db_engine
+from app.facets import create_facet_counts
+from app.fulltext import create_fulltext_index
+from app.spatial import create_spatial_index
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Session factory bound to a throwaway SQLite file with the text and spatial indexes, the facet
+    counters and one known lead.
+    """
+    engine = create_db_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(bind=engine)
+    create_fulltext_index(engine)
+    create_spatial_index(engine)
+    create_facet_counts(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add(Entity(id=1, type="person", name="Elena Silva", role="VP Sales", company="TechFlow"))
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+
+@pytest.fixture
+def db_sessions(mocker, session_factory):
+    """
+    Points `run_db`, which borrows a session per query, at the test database.
+    """
+    mocker.patch.object(database, "SessionLocal", session_factory)
+    return session_factory
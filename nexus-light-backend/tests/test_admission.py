@@ -0,0 +1,165 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, QueueFull, TokenBucket
+from app.metrics import current_trace
+from app.routes import search
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_the_quota_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(per_minute=60, burst_seconds=5, clock=clock)
+
+    assert bucket.capacity == 5 and bucket.wait_time(5) == 0
+    bucket.take(5)
+    assert bucket.wait_time(2) == 2
+    clock.now = 1.5
+    assert bucket.wait_time(2) == 0.5
+    assert bucket.wait_time(50) == 3.5 # never more than a full bucket
+    assert TokenBucket(per_minute=0, burst_seconds=5).wait_time(1e9) == 0 # disabled
+
+
+def test_queue_is_served_round_robin_across_sessions():
+    # One model call every 10 seconds, so nothing leaves the queue during the test
+    controller = AdmissionController(rpm=6, tpm=0, burst_seconds=1, calls_per_search=1)
+
+    async def run():
+        first = controller.enqueue("busy-rep")
+        second, third = controller.enqueue("busy-rep"), controller.enqueue("busy-rep")
+        other = controller.enqueue("other-rep")
+        positions = [controller.position(t) for t in (first, second, third, other)]
+        controller.cancel(second)
+        return positions, [controller.position(third), controller.position(other)], controller.stats()
+
+    positions, after_cancel, stats = asyncio.run(run())
+    assert positions == [0, 1, 3, 2] # the other rep does not wait behind all of busy-rep's searches
+    assert after_cancel == [1, 2]
+    assert stats["queued"] == 2 and stats["admitted"] == 1
+
+
+def test_full_queue_and_outages_are_rejected_with_retry_after():
+    controller = AdmissionController(rpm=60, tpm=0, burst_seconds=1, max_queue=1, max_wait=5, calls_per_search=1)
+
+    async def run():
+        controller.enqueue("a") # admitted
+        waiting = controller.enqueue("b")
+        with pytest.raises(QueueFull) as full:
+            controller.enqueue("c")
+        controller.backoff(30)
+        controller.cancel(waiting)
+        with pytest.raises(QueueFull) as paused:
+            controller.enqueue("d")
+        return full.value.retry_after, paused.value.retry_after
+
+    full_retry, paused_retry = asyncio.run(run())
+    assert full_retry == pytest.approx(2, abs=0.1)
+    assert paused_retry == pytest.approx(30, abs=0.1)
+    assert controller.stats()["rejected"] == 2
+
+
+def test_waiting_searches_stream_their_position(mocker):
+    controller = AdmissionController(rpm=600, tpm=0, burst_seconds=0.1, status_interval=0.02, calls_per_search=1)
+    ran = []
+
+    async def fake_pipeline(user_query, fresh=False, session_id=None, window=None):
+        ran.append(user_query)
+        current_trace.get().add_model_attempt()
+        current_trace.get().add_tokens(1000, 200) # one model call
+        yield json.dumps({"type": "answer", "content": "[]"}) + "\n"
+
+    mocker.patch.object(search, "admission", controller)
+    mocker.patch.object(search, "ai_search_generator", fake_pipeline)
+
+    async def stream(query):
+        return [json.loads(line) async for line in search.traced_search_generator(query, True, None, admit=True)]
+
+    async def run():
+        return await asyncio.gather(*(stream(f"query {i}") for i in range(3)))
+
+    first, second, third = asyncio.run(run())
+    assert [e["type"] for e in first] == ["answer", "timings"]
+    assert second[0] == {"type": "queued", "position": 1,
+                         "content": "⏳ Waiting for model capacity, position 1 in queue"}
+    assert third[0]["position"] == 2
+    assert [e["type"] for e in third][-2:] == ["answer", "timings"]
+    assert len(ran) == 3
+    stats = controller.stats()
+    assert stats["calls_per_search"] == 1 and stats["tokens_per_search"] < 4000 # learned from the searches
+
+
+def test_search_endpoint_answers_503_when_the_queue_is_full(mocker):
+    mocker.patch.object(search, "admission", AdmissionController(rpm=60, max_queue=0))
+    app = FastAPI()
+    app.include_router(search.router)
+
+    response = TestClient(app).get("/api/search/", params={"q": "VP sales at TechFlow"})
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_rate_limited_and_hedged_attempts_are_charged(mocker):
+    # A frozen clock, so the bucket does not refill while the search runs
+    controller = AdmissionController(rpm=600, tpm=0, burst_seconds=1, calls_per_search=1, clock=FakeClock())
+
+    async def fake_pipeline(user_query, fresh=False, session_id=None, window=None):
+        for _ in range(3): # a 429, then a request hedged on a second model
+            current_trace.get().add_model_attempt()
+        current_trace.get().add_tokens(1000, 200)
+        yield json.dumps({"type": "answer", "content": "[]"}) + "\n"
+
+    mocker.patch.object(search, "admission", controller)
+    mocker.patch.object(search, "ai_search_generator", fake_pipeline)
+
+    async def run():
+        return [json.loads(line) async for line in search.traced_search_generator("query", True, None, admit=True)]
+
+    asyncio.run(run())
+
+    assert controller.stats()["calls_per_search"] > 1
+    assert controller.requests.level == controller.requests.capacity - 3
+
+
+def test_clients_leaving_the_queue_give_their_ticket_back(mocker):
+    controller = AdmissionController(rpm=60, tpm=0, burst_seconds=1, calls_per_search=1)
+    mocker.patch.object(search, "admission", controller)
+
+    async def run():
+        first = controller.enqueue(None) # holds the only request in the bucket
+        stream = search.cached_search_generator("query", True, None, admit=True)
+        assert json.loads(await stream.__anext__())["type"] == "queued"
+        assert controller.stats()["queued"] == 1
+        await stream.aclose()
+        controller.cancel(first)
+
+    asyncio.run(run())
+
+    assert controller.stats()["queued"] == 0
+
+
+def test_cached_answers_skip_the_queue(mocker):
+    controller = AdmissionController(rpm=60, max_queue=0)
+    cache = mocker.Mock(peek=mocker.Mock(return_value=True), lookup=mocker.Mock(return_value={
+        "query": "vp sales at techflow", "similarity": 1.0, "events": [{"type": "answer", "content": "[]"}]}))
+    mocker.patch.object(search, "admission", controller)
+    mocker.patch.object(search, "answer_cache", cache)
+    app = FastAPI()
+    app.include_router(search.router)
+
+    response = TestClient(app).get("/api/search/", params={"q": "VP sales at TechFlow"})
+
+    assert response.status_code == 200
+    assert [json.loads(line)["type"] for line in response.text.splitlines()][:2] == ["status", "answer"]
+    assert controller.stats()["rejected"] == 0
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import pytest
+
+from app.answer_cache import AnswerCache
+from app.database import Entity
+from app.routes import search
+
+ANSWER = [
+    {"type": "tool_artifact", "tool_name": "search_db_wrapper", "query": "TechFlow", "status": "success", "result": "[]"},
+    {"type": "answer", "content": '[{"id": 1, "name": "Elena Silva"}]', "format": "json"},
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return AnswerCache(ttl=60, capacity=3, threshold=0.9, clock=clock)
+
+
+def test_exact_and_semantic_hits(cache):
+    cache.store("VP sales at TechFlow", ANSWER)
+
+    assert cache.lookup("  vp SALES at techflow")["similarity"] == 1.0
+    hit = cache.lookup("who is TechFlow's VP of Sales")
+    assert hit["events"] == ANSWER
+    assert hit["query"] == "vp sales at techflow"
+    assert cache.lookup("VP sales at Nubank") is None
+    assert cache.stats() == {"size": 1, "exact_hits": 1, "semantic_hits": 1, "misses": 1, "invalidations": 0}
+
+
+def test_entries_expire(cache, clock):
+    cache.store("VP sales at TechFlow", ANSWER)
+    clock.now += 61
+    assert cache.lookup("VP sales at TechFlow") is None
+    assert cache.lookup("TechFlow VP sales") is None
+
+
+def test_oldest_entry_is_overwritten_when_full(cache):
+    for query in ["CTO at Nubank", "CRO at Vtex", "CFO at Loft", "VP sales at TechFlow"]:
+        cache.store(query, ANSWER)
+    assert cache.lookup("CTO at Nubank") is None
+    assert cache.lookup("CFO at Loft") is not None
+    assert cache.stats()["size"] == 3
+
+
+def test_entity_changes_invalidate_answers(cache, session_factory):
+    cache.watch_entities()
+    cache.store("VP sales at TechFlow", ANSWER)
+
+    db = session_factory()
+    db.add(Entity(type="person", name="Rafael Costa", role="VP Sales", company="TechFlow"))
+    db.commit()
+    db.close()
+
+    assert cache.lookup("VP sales at TechFlow") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.fixture
+def pipeline(mocker, cache):
+    runs = []
+
+    async def fake_pipeline(user_query, fresh=False, session_id=None, window=None):
+        runs.append(user_query)
+        yield json.dumps({"type": "status", "content": "🧠 Thinking..."}) + "\n"
+        if "fail" in user_query:
+            yield json.dumps({"type": "error", "content": "boom"}) + "\n"
+            return
+        for event in ANSWER:
+            yield json.dumps(event) + "\n"
+
+    mocker.patch.object(search, "ai_search_generator", fake_pipeline)
+    mocker.patch.object(search, "answer_cache", cache)
+    return runs
+
+
+def stream(query, fresh=False):
+    async def run():
+        return [json.loads(line) async for line in search.cached_search_generator(query, fresh)]
+    return asyncio.run(run())
+
+
+def test_similar_query_is_replayed_from_cache(pipeline):
+    first = stream("VP sales at TechFlow")
+    second = stream("who is TechFlow's VP of Sales")
+
+    assert pipeline == ["VP sales at TechFlow"]
+    assert second[0] == {"type": "status", "content": "⚡ Answer from cache", "cached": True}
+    assert second[1:] == first[1:]
+
+
+def test_fresh_and_failed_searches_bypass_the_cache(pipeline):
+    stream("VP sales at TechFlow")
+    stream("VP sales at TechFlow", fresh=True)
+    stream("this will fail")
+    stream("this will fail")
+
+    assert pipeline == ["VP sales at TechFlow", "VP sales at TechFlow", "this will fail", "this will fail"]
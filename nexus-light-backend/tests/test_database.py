@@ -0,0 +1,61 @@
+import asyncio
+
+from sqlalchemy import inspect, text
+
+from app.config import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from app.database import Entity, add_missing_columns, async_database_url, create_db_engine, pool_options, run_db
+
+
+def test_sqlite_connections_use_wal_and_mmap(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/wal.db")
+    with engine.connect() as conn:
+        pragmas = [conn.execute(text(f"PRAGMA {name}")).scalar() for name in ("journal_mode", "synchronous", "mmap_size")]
+    engine.dispose()
+
+    assert pragmas[0] == "wal"
+    assert pragmas[1] == 1 # NORMAL
+    assert pragmas[2] > 0
+
+
+def test_postgres_gets_a_tuned_pool_and_an_asyncpg_url():
+    options = pool_options("postgresql://nexus:secret@db/nexus")
+
+    assert options["pool_pre_ping"] is True
+    assert {"pool_size", "max_overflow", "pool_timeout", "pool_recycle"} <= set(options)
+    assert async_database_url("postgresql://nexus:secret@db/nexus") == "postgresql+asyncpg://nexus:secret@db/nexus"
+    assert async_database_url("sqlite:///./sql_app.db") is None
+
+
+def test_postgres_engines_split_one_connection_budget():
+    sync = pool_options("postgresql://nexus:secret@db/nexus")
+    asyncpg = pool_options("postgresql+asyncpg://nexus:secret@db/nexus")
+
+    assert sync["pool_size"] + asyncpg["pool_size"] == DB_POOL_SIZE
+    assert sync["max_overflow"] + asyncpg["max_overflow"] == DB_MAX_OVERFLOW
+    assert asyncpg["pool_size"] > sync["pool_size"]
+    assert pool_options("mysql://nexus:secret@db/nexus")["pool_size"] == DB_POOL_SIZE
+
+
+def test_run_db_returns_the_connection_after_each_query(db_sessions):
+    pool = db_sessions.kw["bind"].pool
+
+    def count_leads(db, name):
+        count = db.execute(text("SELECT count(*) FROM entities WHERE name = :name"), {"name": name}).scalar()
+        assert pool.checkedout() == 1
+        return count
+
+    assert asyncio.run(run_db(count_leads, "Elena Silva")) == 1
+    assert pool.checkedout() == 0
+
+
+def test_missing_entity_columns_are_added_to_existing_tables(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE entities (id INTEGER PRIMARY KEY, type VARCHAR NOT NULL, name VARCHAR)"))
+
+    add_missing_columns(Entity.__table__, bind=engine)
+    add_missing_columns(Entity.__table__, bind=engine) # nothing left to add
+
+    columns = {column["name"] for column in inspect(engine).get_columns("entities")}
+    engine.dispose()
+    assert {"refreshed_at", "coords", "source"} <= columns
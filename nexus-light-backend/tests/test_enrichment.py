@@ -0,0 +1,103 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from app.database import Entity
+from app.enrichment import EntityEnricher, MinHashLSH, dedup_text, normalize_finding, same_company
+from app.fulltext import search_entities
+from app.model_router import ModelRouter
+from app.routes import search
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+def test_minhash_lsh_finds_near_duplicates_of_the_same_type():
+    index = MinHashLSH()
+    index.add(1, "person", index.signature(dedup_text("Elena Silva", "TechFlow")))
+    index.add(2, "person", index.signature(dedup_text("Marcus Chen", "Nubank")))
+
+    assert index.matches("person", index.signature(dedup_text("Elena  Silva", "TechFlow Inc.")), 0.7) == [(1, 1.0)]
+    assert index.matches("person", index.signature(dedup_text("Marta Lima", "TechFlow")), 0.7) == []
+    assert index.matches("business", index.signature(dedup_text("Elena Silva", "TechFlow")), 0.7) == []
+    # Namesakes look alike, the company check tells them apart
+    assert not same_company("Nubank", "TechFlow Inc") and same_company("TechFlow", "TechFlow Brasil Ltda")
+    assert same_company(None, "Nubank")
+
+
+def test_findings_need_enough_to_be_told_apart():
+    assert normalize_finding({"name": " Ana  Costa ", "company": "TechFlow", "avatar": "x"}) == \
+        {"name": "Ana Costa", "company": "TechFlow", "type": "person"}
+    assert normalize_finding({"name": "Ana Costa"}) is None # a person without company or role
+    assert normalize_finding({"id": 1, "name": "Elena Silva", "company": "TechFlow"}) is None # already a row
+    assert normalize_finding({"type": "business", "name": "TechFlow"}) == {"type": "business", "name": "TechFlow"}
+
+
+def test_workers_merge_duplicates_and_insert_new_entities(session_factory):
+    enricher = EntityEnricher(session_factory=session_factory, workers=2, clock=lambda: NOW)
+
+    async def run():
+        await enricher.start()
+        enricher.submit([
+            {"type": "person", "name": "Elena Silva", "role": "Head of Sales", "company": "TechFlow Inc",
+             "location": "São Paulo"},
+            {"type": "person", "name": "Ana Costa", "role": "CTO", "company": "TechFlow"},
+            {"type": "person", "name": "Elena Silva", "role": "CFO", "company": "Nubank"},
+        ])
+        enricher.submit([{"type": "person", "name": "Ana Costa", "role": "Chief Technology Officer",
+                          "company": "TechFlow"}, {"name": "Nobody"}])
+        await enricher.drain()
+        await enricher.stop()
+
+    asyncio.run(run())
+
+    db = session_factory()
+    rows = {(e.name, e.company): e for e in db.execute(select(Entity)).scalars()}
+    found = [e.name for e in search_entities(db, "Ana Costa")]
+    db.close()
+    elena, ana = rows["Elena Silva", "TechFlow"], rows["Ana Costa", "TechFlow"]
+    assert len(rows) == 3 # Elena Silva at Nubank is someone else
+    # The curated row keeps its role, only gains the missing location
+    assert (elena.role, elena.location, elena.source, elena.refreshed_at) == ("VP Sales", "São Paulo", None, NOW)
+    # Rows from the web take the newer values
+    assert (ana.role, ana.source, ana.refreshed_at) == ("Chief Technology Officer", "web", NOW)
+    assert found == ["Ana Costa"] # the next search finds it locally
+    assert enricher.stats() == {"pending": 0, "indexed": 3, "inserted": 2, "merged": 2, "skipped": 1,
+                                "dropped": 0, "failed": 0}
+
+
+def test_searches_hand_their_web_findings_to_the_workers(mocker, db_sessions):
+    class Chat:
+        sent = 0
+
+        async def send_message(self, message, config=None):
+            calls = [SimpleNamespace(name="search_web_tool", args={"query": "TechFlow CTO"})]
+            return SimpleNamespace(function_calls=calls, text=None)
+
+        async def send_message_stream(self, message, config=None):
+            async def chunks():
+                yield SimpleNamespace(function_calls=None, text='[{"id": 1, "name": "Elena Silva"}]')
+            return chunks()
+
+    async def web_tool(query, fresh=False):
+        return json.dumps([{"title": "Ana Costa - CTO - TechFlow | LinkedIn", "link": "https://linkedin.com/in/ana"}])
+
+    client = SimpleNamespace(aio=SimpleNamespace(chats=SimpleNamespace(create=lambda model, config: Chat())))
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "classify_intent", mocker.AsyncMock(return_value="SEARCH"))
+    mocker.patch.object(search, "search_web_tool", web_tool)
+    submit = mocker.patch.object(search.enrichment, "submit")
+
+    async def run():
+        return [json.loads(line) async for line in search.ai_search_generator("Who is the CTO of TechFlow?")]
+
+    events = asyncio.run(run())
+
+    assert events[-1]["type"] == "answer"
+    # Elena's id was made up, no database row was sent, so the workers weigh her too
+    submit.assert_called_once_with([{"type": "person", "name": "Ana Costa", "role": "CTO", "company": "TechFlow",
+                                     "source": "web"}, {"type": "person", "name": "Elena Silva"}])
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+from app.database import get_db
+from app.importer import import_records
+from app.routes import entities
+
+
+@pytest.fixture
+def client(session_factory, mocker):
+    engine = session_factory.kw["bind"]
+    import_records(
+        [{"id": i, "type": "person" if i % 2 else "business", "name": f"Lead {i}", "status": "Active",
+          "group": "VIP" if i % 3 == 0 else "Retail", "source": "CRM"} for i in range(2, 26)],
+        engine=engine,
+    )
+    mocker.patch.object(entities, "engine", engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(entities.router)
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def test_walks_every_page_with_the_cursor(client):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/entities", params=params).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert ids == list(range(1, 26))
+
+
+def test_filters_and_projection(client):
+    page = client.get("/api/entities", params={"type": "business", "group": "VIP", "fields": "name"}).json()
+    assert page["items"] == [{"id": i, "name": f"Lead {i}"} for i in (6, 12, 18, 24)]
+    assert page["next_cursor"] is None
+
+
+def test_rejects_bad_input(client):
+    assert client.get("/api/entities", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/entities", params={"fields": "name,password"}).status_code == 400
+    assert client.get("/api/entities", params={"limit": 0}).status_code == 400
+
+
+def test_export_streams_ndjson(client):
+    response = client.get("/api/entities/export", params={"status": "Active", "fields": "name,status"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [r["id"] for r in rows] == list(range(2, 26))
+    assert set(rows[0]) == {"id", "name", "status"}
+
+
+def test_composite_indexes_exist(session_factory):
+    names = {index["name"] for index in inspect(session_factory.kw["bind"]).get_indexes("entities")}
+    assert {"ix_entities_type_id", "ix_entities_status_id", "ix_entities_group_id",
+            "ix_entities_industry_id", "ix_entities_source_id"} <= names
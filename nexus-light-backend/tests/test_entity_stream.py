@@ -0,0 +1,123 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.entity_stream import EntityEmitter, EntityParser, tool_records, web_entity
+from app.model_router import ModelRouter
+from app.routes import search
+
+
+def test_parser_emits_each_object_as_soon_as_it_closes():
+    parser = EntityParser()
+    answer = '```json\n[{"name": "Ana {Costa}", "note": "say \\"hi\\" }"}, {"name": "Bo", "coords": {"lat": 1}}]\n```'
+    chunks = [answer[:20], answer[20:60], answer[60:]]
+
+    emitted = [parser.feed(chunk) for chunk in chunks]
+
+    assert emitted[0] == []
+    assert emitted[1] == [{"name": "Ana {Costa}", "note": 'say "hi" }'}]
+    assert emitted[2] == [{"name": "Bo", "coords": {"lat": 1}}]
+
+
+def test_emitter_validates_and_sends_each_entity_once():
+    emitter = EntityEmitter()
+
+    first = emitter.events([{"id": 1, "type": "person", "name": "Elena Silva", "company": "TechFlow"},
+                            {"name": "No Type Inc", "industry": "Fintech"}, {"type": "person"}], "db")
+    again = emitter.events([{"name": "elena silva", "company": "TechFlow"}, {"id": "not-a-number", "name": "X"}],
+                           "answer")
+
+    assert [e["entity"] for e in first] == [
+        {"id": 1, "type": "person", "name": "Elena Silva", "company": "TechFlow"},
+        {"type": "business", "name": "No Type Inc", "industry": "Fintech"},
+    ]
+    assert first[0]["origin"] == "db"
+    assert [e["entity"] for e in again] == [{"type": "person", "name": "X"}]
+
+
+def test_only_database_rows_keep_their_id():
+    emitter = EntityEmitter()
+    emitter.events([{"id": 1, "type": "person", "name": "Elena Silva", "company": "TechFlow"}], "db")
+
+    answer = emitter.events([{"id": 1, "name": "Elena Silva", "role": "VP Sales"},
+                             {"id": 2, "name": "Ana Costa", "company": "TechFlow"},
+                             {"id": "ana-costa-2", "name": "Ana Costa", "company": "Nubank"}], "answer")
+
+    # The model's own ids would collide with rows or fail validation
+    assert [e["entity"] for e in answer] == [
+        {"type": "person", "name": "Ana Costa", "company": "TechFlow"},
+        {"type": "person", "name": "Ana Costa", "company": "Nubank"},
+    ]
+    assert emitter.findings() == [e["entity"] for e in answer]
+
+
+def test_profile_results_become_web_entities():
+    person = {"title": "Ana Costa - CTO - TechFlow | LinkedIn", "link": "https://www.linkedin.com/in/anacosta"}
+    company = {"title": "TechFlow - Crunchbase", "link": "https://www.crunchbase.com/organization/techflow"}
+    article = {"title": "TechFlow raises Series B - News", "link": "https://example.com/techflow"}
+
+    assert web_entity(person) == {"type": "person", "name": "Ana Costa", "role": "CTO", "company": "TechFlow",
+                                  "source": "web"}
+    assert web_entity(company) == {"type": "business", "name": "TechFlow", "source": "web"}
+    assert web_entity(article) is None
+    assert tool_records('{"columns":["id","name"],"rows":[[1,"Elena Silva"]]}') == [{"id": 1, "name": "Elena Silva"}]
+
+
+class StreamingChat:
+    """
+    Asks for a DB and a web search, then streams its answer in small chunks.
+    """
+    ANSWER = "```json\n" + json.dumps([
+        {"id": 1, "type": "person", "name": "Elena Silva", "role": "VP Sales", "company": "TechFlow"},
+        {"type": "person", "name": "Rui Alves", "role": "CFO", "company": "TechFlow"},
+    ]) + "\n```\nBoth work at TechFlow's head office."
+
+    def __init__(self):
+        self.streamed = []
+
+    async def send_message(self, message, config=None):
+        calls = [SimpleNamespace(name="search_db_wrapper", args={"query": "TechFlow"}),
+                 SimpleNamespace(name="search_web_tool", args={"query": "TechFlow CTO"})]
+        return SimpleNamespace(function_calls=calls, text=None)
+
+    async def send_message_stream(self, message, config=None):
+        async def chunks():
+            for i in range(0, len(self.ANSWER), 16):
+                self.streamed.append(self.ANSWER[i:i + 16])
+                yield SimpleNamespace(function_calls=None, text=self.ANSWER[i:i + 16])
+        return chunks()
+
+
+def test_search_streams_entities_before_the_answer(mocker, db_sessions):
+    chat = StreamingChat()
+
+    async def web_tool(query, fresh=False):
+        return json.dumps([{"title": "Ana Costa - CTO - TechFlow | LinkedIn", "link": "https://linkedin.com/in/ana",
+                            "snippet": "..."}])
+
+    client = SimpleNamespace(aio=SimpleNamespace(chats=SimpleNamespace(create=lambda model, config: chat)))
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "classify_intent", mocker.AsyncMock(return_value="SEARCH"))
+    mocker.patch.object(search, "search_web_tool", web_tool)
+
+    async def run():
+        events = []
+        async for line in search.ai_search_generator("Who runs TechFlow?"):
+            events.append((json.loads(line), len(chat.streamed)))
+        return events
+
+    events = asyncio.run(run())
+    entities = [(e["origin"], e["entity"]["name"], streamed) for e, streamed in events if e["type"] == "entity"]
+    types = [e["type"] for e, _ in events]
+
+    # Tool cards arrive in the order the tools finish
+    assert {(origin, name) for origin, name, _ in entities[:2]} == {("db", "Elena Silva"), ("web", "Ana Costa")}
+    assert entities[2][:2] == ("answer", "Rui Alves")
+    assert len(entities) == 3
+    # Cards of tool results come before the model answers, answer cards before it finished
+    assert entities[0][2] == 0 and entities[1][2] == 0
+    assert entities[2][2] < len(chat.streamed)
+    assert types.index("entity") < types.index("answer")
+    assert events[-1][0] == {"type": "answer", "content": StreamingChat.ANSWER, "format": "json"}
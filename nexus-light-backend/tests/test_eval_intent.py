@@ -0,0 +1,71 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.intent import load_classifier
+from app.model_router import ModelRouter
+from app.routes import search
+from benchmarks import eval_intent
+
+
+class FakeClient:
+    """
+    Lists one model and labels every query with a search.
+    """
+    def __init__(self):
+        self.models_used = []
+        self.closed = False
+        self.aio = SimpleNamespace(models=SimpleNamespace(list=self.list, generate_content=self.generate_content),
+                                   aclose=self.aclose)
+
+    async def list(self):
+        async def pages():
+            yield SimpleNamespace(name="models/gemini-1.5-pro", supported_actions=["generateContent"])
+        return pages()
+
+    async def generate_content(self, model, contents):
+        self.models_used.append(model)
+        return SimpleNamespace(text="SEARCH" if "Nubank" in contents else "CHAT")
+
+    async def aclose(self):
+        self.closed = True
+
+    def close(self):
+        pass
+
+
+def test_collect_labels_queries_with_the_shared_client(mocker, tmp_path, capsys):
+    client = FakeClient()
+    router = ModelRouter([])
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", router)
+    mocker.patch.object(search.model_catalog, "router", router)
+    mocker.patch.object(search.model_catalog, "path", str(tmp_path / "catalog.json"))
+    queries = tmp_path / "queries.txt"
+    queries.write_text("who is the CTO of Nubank\nhello there\n")
+    labels = tmp_path / "labels.jsonl"
+
+    asyncio.run(eval_intent.collect(str(queries), str(labels)))
+
+    rows = [json.loads(line) for line in labels.read_text().splitlines()]
+    assert [(r["query"], r["label"]) for r in rows] == [("who is the CTO of Nubank", "SEARCH"),
+                                                        ("hello there", "CHAT")]
+    assert client.models_used == ["gemini-1.5-pro"] * 2 and client.closed
+
+    eval_intent.evaluate(str(labels), 0.9, 800.0, None, 0.3, 0.97)
+    out = capsys.readouterr().out
+    report = json.loads(out[out.index("{"):])
+    assert report["queries"] == 2
+
+
+def test_retrained_models_are_only_saved_when_they_pass_the_gate(tmp_path, capsys):
+    labels = tmp_path / "labels.jsonl"
+    rows = [("find Elena Silva", "SEARCH"), ("hi", "CHAT"), ("CFO at Loft", "SEARCH"), ("explain BANT", "CHAT")]
+    labels.write_text("\n".join(json.dumps({"query": q, "label": label}) for q, label in rows))
+    model_path = tmp_path / "intent.npz"
+
+    eval_intent.evaluate(str(labels), 0.5, 800.0, str(model_path), 0.5, min_precision=1.01)
+    assert not model_path.exists()
+
+    eval_intent.evaluate(str(labels), 0.5, 800.0, str(model_path), 0.5, min_precision=0.0)
+    assert load_classifier(str(model_path), min_precision=0.0).trusted
@@ -0,0 +1,117 @@
+import random
+from collections import Counter
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select, text
+
+from app.database import Base, Entity, get_db
+from app.facets import FACET_COLUMNS, create_facet_counts, facet_counts
+from app.importer import import_records
+from app.routes import entities
+
+STATUSES = ["Active", "Target", "Customer", None]
+GROUPS = ["VIP", "Retail", "Enterprise"]
+
+
+def random_leads(count, seed=3):
+    rng = random.Random(seed)
+    return [{"id": i, "type": rng.choice(["person", "business"]), "name": f"Lead {i}",
+             "role": rng.choice(["VP Sales", "CTO", None]), "status": rng.choice(STATUSES),
+             "group": rng.choice(GROUPS), "industry": rng.choice(["Fintech", "SaaS", None]),
+             "source": rng.choice(["CRM", "web"])} for i in range(2, count + 2)]
+
+
+@pytest.fixture
+def leads(session_factory):
+    rows = random_leads(300)
+    import_records(rows, engine=session_factory.kw["bind"])
+    return rows
+
+
+def brute_force(db, filters, role=None):
+    """
+    Facet counts straight from the entities table.
+    """
+    rows = [dict(r) for r in db.execute(select(Entity.__table__)).mappings()]
+    if role:
+        rows = [r for r in rows if r["role"] == role]
+    matches = lambda r, skip: all(r[c] == v for c, v in filters.items() if c != skip)
+    facets = {c: dict(Counter(r[c] for r in rows if r[c] and matches(r, c))) for c in FACET_COLUMNS}
+    return sum(matches(r, None) for r in rows), facets
+
+
+def test_counters_follow_inserts_updates_and_deletes(session_factory, leads):
+    db = session_factory()
+    db.get(Entity, 2).status = "Churned"
+    db.delete(db.get(Entity, 3))
+    db.commit()
+    import_records([{**leads[10], "group": "Retail", "source": "Import"}], engine=session_factory.kw["bind"])
+
+    stored = db.execute(text("SELECT SUM(count), MIN(count) FROM entity_facet_counts")).one()
+    for filters in ({}, {"type": "person"}, {"type": "business", "status": "Active"}, {"group": "VIP", "source": "CRM"}):
+        result = facet_counts(db, filters=filters)
+        total, facets = brute_force(db, filters)
+        assert (result["total"], result["facets"]) == (total, facets)
+    db.close()
+    assert stored[0] == 300 and stored[1] >= 1 # one lead seeded by the fixture, one deleted, no empty counters
+
+
+def test_text_query_counts_only_the_matches(session_factory, leads):
+    db = session_factory()
+
+    result = facet_counts(db, "cto", {"type": "person"})
+
+    total, facets = brute_force(db, {"type": "person"}, role="CTO")
+    assert (result["total"], result["facets"]) == (total, facets)
+    assert list(result["facets"]["group"].values()) == sorted(result["facets"]["group"].values(), reverse=True)
+    assert not result["capped"]
+    assert facet_counts(db, "   ") == {"total": 0, "capped": False, "facets": {c: {} for c in FACET_COLUMNS}}
+    with pytest.raises(ValueError):
+        facet_counts(db, filters={"name": "Lead 2"})
+    db.close()
+
+
+def test_broad_queries_count_a_capped_slice_of_the_matches(session_factory, leads):
+    db = session_factory()
+    everyone = facet_counts(db, "lead", {"type": "person"})
+
+    capped = facet_counts(db, "lead", {"type": "person"}, match_limit=50)
+
+    assert capped["capped"] and not everyone["capped"]
+    assert sum(capped["facets"]["type"].values()) == 50 # the type filter is ignored by its own facet
+    assert capped["total"] <= everyone["total"]
+    db.close()
+
+
+def test_existing_rows_are_counted_on_first_startup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Entity), random_leads(40))
+    create_facet_counts(engine)
+    create_facet_counts(engine) # counted once
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT SUM(count) FROM entity_facet_counts")).scalar() == 40
+    engine.dispose()
+
+
+def test_facets_endpoint(session_factory, leads):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(entities.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+
+    body = client.get("/api/entities/facets", params={"type": "person"}).json()
+
+    people = body["facets"]["type"]["person"]
+    assert body["total"] == people and body["filters"] == {"type": "person"}
+    assert people + body["facets"]["type"]["business"] == 301 # the other type still has its count
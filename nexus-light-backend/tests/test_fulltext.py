@@ -0,0 +1,106 @@
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Entity
+from app import facets, fulltext
+from app.fulltext import create_fulltext_index, search_entities
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    Base.metadata.create_all(bind=engine)
+    create_fulltext_index(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Entity(id=1, type="person", name="Elena Silva", role="VP Sales", company="TechFlow"),
+        Entity(id=2, type="person", name="Marcus Chen", role="Head of Growth", company="Nubank", group="Fintech"),
+        Entity(id=101, type="business", name="TechFlow HQ", industry="SaaS Platform", location="São Paulo"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_ranks_rows_matching_more_terms_first(db):
+    """
+    Elena matches both "sales" and "techflow", TechFlow HQ only one of them.
+    """
+    results = search_entities(db, "VP sales at TechFlow")
+    assert [e.id for e in results] == [1, 101]
+
+
+def test_covers_industry_location_and_group(db):
+    assert [e.id for e in search_entities(db, "fintech")] == [2]
+    assert [e.id for e in search_entities(db, "sao paulo")] == [101]
+
+
+def test_postgres_statements_use_the_unaccent_configuration():
+    statements = fulltext.POSTGRES_DDL + [fulltext.POSTGRES_QUERY, facets.POSTGRES_MATCH_QUERY]
+    assert not any("'simple'" in statement for statement in statements)
+    assert f"to_tsvector('{fulltext.TS_CONFIG}'" in fulltext.POSTGRES_DDL[3]
+    assert "WITH unaccent, simple" in fulltext.POSTGRES_DDL[1]
+
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL", "").startswith("postgresql"),
+                    reason="needs a Postgres DATABASE_URL")
+def test_postgres_folds_accents_like_sqlite():
+    """
+    "sao paulo" finds "São Paulo" on SQLite (remove_diacritics), Postgres indexes and
+    queries through the unaccent configuration for the same result. Runs in a throwaway schema.
+    """
+    schema = f"nexus_test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(os.environ["DATABASE_URL"])
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(os.environ["DATABASE_URL"], connect_args={"options": f"-csearch_path={schema},public"})
+    try:
+        Base.metadata.create_all(bind=engine, tables=[Entity.__table__])
+        create_fulltext_index(engine)
+        session = sessionmaker(bind=engine)()
+        session.add(Entity(id=101, type="business", name="TechFlow HQ", location="São Paulo"))
+        session.commit()
+
+        assert [e.id for e in search_entities(session, "sao paulo")] == [101]
+        assert [e.id for e in search_entities(session, "São Paulo")] == [101]
+        session.close()
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def test_prefix_match_and_limit(db):
+    assert len(search_entities(db, "tech", limit=1)) == 1
+    assert search_entities(db, "???") == []
+
+
+def test_index_follows_updates_and_deletes(db):
+    elena = db.get(Entity, 1)
+    elena.company = "Vtex"
+    db.commit()
+    assert [e.id for e in search_entities(db, "vtex")] == [1]
+    assert [e.id for e in search_entities(db, "techflow")] == [101]
+
+    db.delete(elena)
+    db.commit()
+    assert search_entities(db, "vtex") == []
+
+
+def test_existing_rows_are_indexed_on_first_run(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Entity(id=1, type="person", name="Sarah Jones", role="CRO", company="Vtex"))
+    session.commit()
+
+    create_fulltext_index(engine)
+    create_fulltext_index(engine)  # idempotent
+
+    assert [e.id for e in search_entities(session, "sarah")] == [1]
+    session.close()
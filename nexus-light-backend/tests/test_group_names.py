@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.cache import TTLCache
+from app.group_names import GroupNameCache, local_group_name, selection_key, selection_of
+from app.model_router import AllModelsUnavailable
+from app.routes import search
+
+LEADS = [
+    {"id": i, "name": f"Lead {i}", "role": "Head of Growth", "company": "Nubank", "industry": "Fintech",
+     "group": "Fintech"} for i in range(1, 11)
+]
+
+
+def name_cache(session_factory, **kwargs):
+    return GroupNameCache(TTLCache("group_name", ttl=60, max_entries=100, max_rows=100,
+                                   session_factory=session_factory), **kwargs)
+
+
+def test_key_is_order_independent_and_changes_with_content():
+    reordered = list(reversed(LEADS[:3]))
+    edited = [dict(LEADS[0], role="CFO")] + LEADS[1:3]
+
+    assert selection_key(selection_of(LEADS[:3])) == selection_key(selection_of(reordered))
+    assert selection_key(selection_of(LEADS[:3])).startswith("3:")
+    many = [dict(LEADS[0], id=i) for i in range(5000)]
+    assert len(selection_key(selection_of(many))) == len(selection_key(selection_of(LEADS[:3]))) + 3
+    assert selection_key(selection_of(LEADS[:3])) != selection_key(selection_of(edited))
+
+
+def test_local_name_uses_the_most_shared_words():
+    entities = [
+        {"group": "Fintech", "industry": None, "role": "Head of Growth"},
+        {"group": "Fintech", "industry": "Payments", "role": "VP Growth"},
+        {"group": "VIP", "industry": None, "role": "CRO"},
+    ]
+
+    assert local_group_name(entities) == "Fintech Growth Head"
+    assert local_group_name([{"id": 1}]) == "New Group"
+
+
+def test_concurrent_and_similar_selections_share_one_model_call(session_factory):
+    names = name_cache(session_factory, threshold=0.8)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "Fintech Growth Leaders"
+
+    async def run():
+        same = await asyncio.gather(*(names.suggest(LEADS, generate) for _ in range(5)))
+        similar = await names.suggest(LEADS[:9], generate) # one lead deselected
+        different = await names.suggest(LEADS[:5], generate)
+        return same, similar, different
+
+    same, similar, different = asyncio.run(run())
+    assert [r["name"] for r in same] == ["Fintech Growth Leaders"] * 5
+    assert similar == {"name": "Fintech Growth Leaders", "source": "similar"}
+    assert different["source"] == "model"
+    assert len(calls) == 2
+    assert names.stats()["coalesced"] == 4
+
+
+def test_exhausted_or_slow_models_get_the_local_name(session_factory):
+    names = name_cache(session_factory, timeout=0.05)
+
+    async def exhausted():
+        raise AllModelsUnavailable(retry_after=10)
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "Nubank Growth Team"
+
+    async def run():
+        failed = await names.suggest(LEADS[:2], exhausted)
+        timed_out = await names.suggest(LEADS[:4], slow)
+        await asyncio.sleep(0.3) # the slow answer still lands in the cache
+        cached = await names.suggest(LEADS[:4], slow)
+        return failed, timed_out, cached
+
+    failed, timed_out, cached = asyncio.run(run())
+    assert failed == {"name": "Fintech Head Growth", "source": "local"}
+    assert timed_out["source"] == "local"
+    assert cached == {"name": "Nubank Growth Team", "source": "cache"}
+
+
+def test_without_local_fallback_failures_are_errors(session_factory):
+    names = name_cache(session_factory, local_fallback=False)
+
+    async def exhausted():
+        raise AllModelsUnavailable()
+
+    with pytest.raises(AllModelsUnavailable):
+        asyncio.run(names.suggest(LEADS[:2], exhausted))
+
+
+def test_suggest_name_endpoint(mocker, db_sessions):
+    prompts = []
+
+    async def generate_content(model, contents):
+        prompts.append(contents)
+        return SimpleNamespace(text=" VIP Sales Leaders \n")
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", search.ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "group_names", name_cache(db_sessions))
+
+    app = FastAPI()
+    app.include_router(search.router)
+    api = TestClient(app)
+    first = api.post("/api/search/groups/suggest-name", json={"entity_ids": [1]})
+    second = api.post("/api/search/groups/suggest-name", json={"entity_ids": [1]})
+    missing = api.post("/api/search/groups/suggest-name", json={"entity_ids": [999]})
+
+    assert first.json() == {"name": "VIP Sales Leaders", "source": "model"}
+    assert second.json() == {"name": "VIP Sales Leaders", "source": "cache"}
+    assert missing.status_code == 404
+    assert len(prompts) == 1 and "Elena Silva (VP Sales @ TechFlow)" in prompts[0]
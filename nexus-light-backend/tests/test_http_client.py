@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.http_client import UpstreamClient
+from app.routes import search
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Local SerpApi stand-in. The path picks the behaviour.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        state = self.server.state
+        with state["lock"]:
+            state["hits"] += 1
+            state["ports"].add(self.client_address[1])
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            hits = state["hits"]
+        try:
+            if self.path.startswith("/flaky") and hits <= 2:
+                self._send_json(503, {"error": "busy"}, {"Retry-After": "0"})
+            elif self.path.startswith("/hang"):
+                time.sleep(1)
+                self._send_json(200, {})
+            elif self.path.startswith("/slow"):
+                time.sleep(0.1)
+                self._send_json(200, {"ok": True})
+            elif self.path.startswith("/missing"):
+                self._send_json(404, {"error": "not found"})
+            else:
+                self._send_json(200, {"organic_results": [
+                    {"title": "Elena Silva - VP Sales - TechFlow", "link": "http://example.com/elena", "snippet": "VP Sales"},
+                ]})
+        finally:
+            with state["lock"]:
+                state["active"] -= 1
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    httpd.state = {"lock": threading.Lock(), "hits": 0, "ports": set(), "active": 0, "max_active": 0}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_with_client(coro_factory, **kwargs):
+    async def run():
+        client = UpstreamClient(backoff_base=0.01, **kwargs)
+        await client.start()
+        try:
+            return await coro_factory(client)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+def test_connections_are_reused(server):
+    async def calls(client):
+        for _ in range(5):
+            await client.get_json(f"{base_url(server)}/search", params={"q": "x"})
+
+    run_with_client(calls)
+    assert server.state["hits"] == 5
+    assert len(server.state["ports"]) == 1
+
+
+def test_retries_transient_statuses(server):
+    data = run_with_client(lambda client: client.get_json(f"{base_url(server)}/flaky"), retries=2)
+    assert "organic_results" in data
+    assert server.state["hits"] == 3
+
+
+def test_does_not_retry_client_errors(server):
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_client(lambda client: client.get_json(f"{base_url(server)}/missing"), retries=2)
+    assert server.state["hits"] == 1
+
+
+def test_read_timeout_is_bounded(server):
+    start = time.perf_counter()
+    with pytest.raises(httpx.ReadTimeout):
+        run_with_client(lambda client: client.get_json(f"{base_url(server)}/hang"), read_timeout=0.1, retries=1)
+    assert time.perf_counter() - start < 1
+    assert server.state["hits"] == 2
+
+
+def test_caps_concurrent_upstream_requests(server):
+    async def calls(client):
+        await asyncio.gather(*(client.get_json(f"{base_url(server)}/slow") for _ in range(6)))
+
+    run_with_client(calls, max_concurrency=2)
+    assert server.state["hits"] == 6
+    assert server.state["max_active"] <= 2
+
+
+def test_fetch_web_results_against_stand_in(server, mocker):
+    mocker.patch.object(search, "SERPAPI_API_KEY", "test_key")
+    mocker.patch.object(search, "SERPAPI_URL", f"{base_url(server)}/search")
+
+    async def run():
+        client = UpstreamClient()
+        mocker.patch.object(search, "http_client", client)
+        try:
+            return await search.fetch_web_results("Elena Silva")
+        finally:
+            await client.close()
+
+    result = json.loads(asyncio.run(run()))
+    assert result[0]["title"] == "Elena Silva - VP Sales - TechFlow"
+    assert result[0]["link"] == "http://example.com/elena"
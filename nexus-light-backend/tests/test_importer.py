@@ -0,0 +1,126 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.database import Entity
+from app.fulltext import search_entities
+from app.importer import import_file, import_records, notify_server
+from app.routes import entities
+
+CSV = """id,type,name,role,company,industry,location,status,group,source,x,y
+1,person,Elena Silva,CRO,TechFlow,,,Active,VIP,CRM,30,40
+2,person,Marcus Chen,Head of Growth,Nubank,,,Active,Fintech,CRM,,
+,business,Stone HQ,,,Fintech,São Paulo,Target,,CRM,10,20
+3,person,,CTO,Vtex,,,,,CRM,,
+"""
+
+
+@pytest.fixture
+def engine(session_factory):
+    return session_factory.kw["bind"]
+
+
+def test_csv_import_upserts_validates_and_reports_progress(engine, session_factory):
+    progress = []
+    report = import_file(io.StringIO(CSV), "csv", engine=engine, chunk_size=2, progress=progress.append)
+
+    assert (report.read, report.written, report.invalid) == (4, 3, 1)
+    assert report.errors[0]["record"] == 4
+    assert len(progress) == 2
+
+    db = session_factory()
+    elena = db.get(Entity, 1)
+    assert elena.role == "CRO"  # the existing row was updated
+    assert elena.coords == {"x": 30.0, "y": 40.0}
+    assert db.query(Entity).filter(Entity.name == "Stone HQ").one().location == "São Paulo"
+    # The text index follows bulk upserts
+    assert [e.id for e in search_entities(db, "cro")] == [1]
+    db.close()
+
+
+def test_reimports_keep_fields_they_do_not_have(engine, session_factory):
+    refreshed = datetime(2026, 10, 1, 12, 0)
+    with engine.begin() as conn:
+        conn.execute(update(Entity).where(Entity.id == 1).values(refreshed_at=refreshed))
+
+    import_file(io.StringIO("id,type,name,role,company\n1,person,Elena Silva,CRO,\n"), "csv", engine=engine)
+
+    db = session_factory()
+    elena = db.get(Entity, 1)
+    assert (elena.role, elena.company, elena.refreshed_at) == ("CRO", "TechFlow", refreshed)
+    db.close()
+
+
+def test_ignore_mode_keeps_existing_rows(engine, session_factory):
+    import_records([{"id": 1, "type": "person", "name": "Someone Else"}], engine=engine, on_conflict="ignore")
+    db = session_factory()
+    assert db.get(Entity, 1).name == "Elena Silva"
+    db.close()
+
+
+def test_ndjson_bad_lines_are_reported_not_fatal(engine):
+    body = '{"id": 10, "type": "person", "name": "Ana Costa"}\n{not json}\n\n{"id": 11, "type": "business", "name": "Loft"}\n'
+    report = import_file(io.StringIO(body), "ndjson", engine=engine)
+    assert (report.read, report.written, report.invalid) == (3, 2, 1)
+
+
+@pytest.fixture
+def client(engine, mocker):
+    mocker.patch.object(entities, "engine", engine)
+    app = FastAPI()
+    app.include_router(entities.router)
+    return TestClient(app)
+
+
+def test_import_endpoint_streams_progress_and_summary(client, session_factory, mocker):
+    invalidate = mocker.patch.object(entities.search.answer_cache, "invalidate")
+    response = client.post("/api/entities/import?chunk_size=2", content=CSV, headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["type"] for e in events] == ["progress", "progress", "done"]
+    assert events[-1]["written"] == 3
+    assert events[-1]["rows_per_second"] > 0
+    invalidate.assert_called_once()
+
+    db = session_factory()
+    assert db.query(Entity).count() == 3
+    db.close()
+
+
+def test_import_endpoint_rejects_unknown_formats(client):
+    response = client.post("/api/entities/import", content="<xml/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == 415
+
+
+def test_failed_imports_still_drop_caches(client, mocker):
+    mocker.patch.object(entities, "import_file", side_effect=RuntimeError("disk full"))
+    finished = mocker.patch.object(entities, "on_import_finished")
+
+    response = client.post("/api/entities/import", content=CSV, headers={"Content-Type": "text/csv"})
+
+    assert json.loads(response.text.splitlines()[-1]) == {"type": "error", "content": "disk full"}
+    finished.assert_called_once()
+
+
+def test_cli_imports_refresh_a_running_server(client, mocker, capsys):
+    finished = mocker.patch.object(entities, "on_import_finished")
+    post = mocker.patch("httpx.post", side_effect=lambda url, timeout: client.post(url.removeprefix("http://nexus")))
+
+    notify_server("http://nexus/")
+
+    post.assert_called_once()
+    finished.assert_called_once()
+    assert capsys.readouterr().err == ""
+
+
+def test_import_endpoint_rejects_bad_chunk_sizes(client):
+    for chunk_size in (0, -1):
+        response = client.post(f"/api/entities/import?chunk_size={chunk_size}", content=CSV,
+                               headers={"Content-Type": "text/csv"})
+        assert response.status_code == 400
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.intent import CHAT, CHAT_RULES, GATE_KEEPER_PROMPT, SEARCH, IntentCache, IntentClassifier, load_classifier, parse_label
+from app.model_router import ModelRouter
+from app.routes import search
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return load_classifier(None)
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("hello!", CHAT),
+    ("thanks", CHAT),
+    ("hi there, thanks a lot!", CHAT),
+    ("who is TechFlow's VP of Sales", SEARCH),
+    ("fintech companies in Buenos Aires", SEARCH),
+])
+def test_rules_answer_confidently(classifier, query, expected):
+    intent, confidence = classifier.classify(query)
+    assert intent == expected
+    assert confidence >= 0.8
+
+
+@pytest.mark.parametrize("query", [
+    "VP sales at TechFlow",
+    "write a follow up email to a CRO",
+    "what can you tell me about Marcus Chen",
+])
+def test_seed_model_guesses_are_never_confident(classifier, query):
+    intent, confidence = classifier.classify(query)
+    assert confidence == 0.5
+    assert IntentClassifier(classifier.model, trusted=True).classify(query)[0] == intent
+
+
+@pytest.mark.parametrize("query", ["hey Nubank", "hi Elena Silva", "thanks TechFlow", "ok vtex"])
+def test_greetings_followed_by_a_name_are_left_to_the_model(query):
+    assert CHAT_RULES.match(query.lower()) is None
+
+
+def test_llm_replies_are_read_as_known_labels():
+    assert parse_label("search\n") == SEARCH
+    assert parse_label('"CHAT".') == CHAT
+    assert parse_label("I think this needs a SEARCH") == SEARCH
+    assert parse_label("Sure!") is None and parse_label(None) is None
+
+
+def test_model_round_trips_through_disk(classifier, tmp_path):
+    path = str(tmp_path / "intent.npz")
+    classifier.model.save(path)
+    reloaded = load_classifier(path)
+    query = "growth leaders at Nubank"
+    assert reloaded.model.predict_proba(query) == pytest.approx(classifier.model.predict_proba(query))
+
+
+def test_only_models_that_passed_the_eval_gate_are_trusted(classifier, tmp_path):
+    path = str(tmp_path / "intent.npz")
+    classifier.model.save(path)
+    assert not load_classifier(path, min_precision=0.97).trusted
+
+    classifier.model.precision = 0.95
+    classifier.model.save(path)
+    assert not load_classifier(path, min_precision=0.97).trusted
+
+    classifier.model.precision = 0.99
+    classifier.model.save(path)
+    classifier.model.precision = None
+    assert load_classifier(path, min_precision=0.97).trusted
+
+
+def test_intent_cache_is_lru():
+    cache = IntentCache(max_entries=2)
+    cache.put("a", SEARCH)
+    cache.put("b", CHAT)
+    cache.get("a")
+    cache.put("c", CHAT)
+    assert cache.get("b") is None
+    assert cache.get("a") == SEARCH
+
+
+@pytest.fixture
+def llm(mocker):
+    calls = []
+
+    async def gate_keeper(model, contents):
+        calls.append(contents)
+        return SimpleNamespace(text="search\n")
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=gate_keeper)))
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "intent_cache", IntentCache(100))
+    return client, calls
+
+
+def test_confident_queries_skip_the_llm(llm):
+    client, calls = llm
+    assert asyncio.run(search.classify_intent(client, "hello")) == CHAT
+    assert calls == []
+
+
+def test_seed_model_leaves_unmatched_queries_to_the_llm(llm):
+    client, calls = llm
+    assert asyncio.run(search.classify_intent(client, "what can you tell me about Marcus Chen")) == SEARCH
+    assert calls == [GATE_KEEPER_PROMPT.format(query="what can you tell me about Marcus Chen")]
+
+
+def test_unsure_queries_ask_the_llm_once(llm, mocker):
+    client, calls = llm
+    mocker.patch.object(search, "INTENT_CONFIDENCE_THRESHOLD", 1.0)
+
+    async def run():
+        first = await search.classify_intent(client, "Acme  Corp")
+        second = await search.classify_intent(client, "acme corp")
+        return first, second
+
+    assert asyncio.run(run()) == (SEARCH, SEARCH)
+    assert len(calls) == 1
+
+
+def test_unlabelled_llm_replies_fall_back_to_search(llm, mocker):
+    client, _ = llm
+    mocker.patch.object(search, "INTENT_CONFIDENCE_THRESHOLD", 1.0)
+
+    async def rambling(model, contents):
+        return SimpleNamespace(text="I'm not sure.")
+
+    client.aio.models.generate_content = rambling
+
+    assert asyncio.run(search.classify_intent(client, "acme corp")) == SEARCH
+    assert search.intent_cache.get("acme corp") == SEARCH
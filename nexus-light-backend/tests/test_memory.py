@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import ChatHistory
+from app.memory import HistoryWriter, SessionMemory
+from app.model_router import ModelRouter
+from app.routes import search
+
+
+def stored_rows(session_factory):
+    db = session_factory()
+    try:
+        return [(r.session_id, r.role, r.content) for r in db.query(ChatHistory).order_by(ChatHistory.id)]
+    finally:
+        db.close()
+
+
+def test_writer_flushes_in_batches(session_factory):
+    writer = HistoryWriter(session_factory=session_factory, batch_size=100)
+    for i in range(250):
+        writer.enqueue("s1", "user", f"question {i}")
+
+    asyncio.run(writer.flush())
+
+    assert writer.stats() == {"pending": 0, "written": 250, "batches": 3, "dropped": 0}
+    assert len(stored_rows(session_factory)) == 250
+
+
+def test_background_task_writes_without_blocking_enqueue(session_factory):
+    writer = HistoryWriter(session_factory=session_factory, batch_size=100, interval=0.05)
+
+    async def run():
+        await writer.start()
+        writer.enqueue("s1", "user", "hello")
+        await asyncio.sleep(0.2)
+        written = writer.written
+        writer.enqueue("s1", "model", "hi")
+        await writer.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+    assert stored_rows(session_factory) == [("s1", "user", "hello"), ("s1", "model", "hi")]
+
+
+def test_flush_waits_for_the_batch_being_written(session_factory):
+    writer = HistoryWriter(session_factory=session_factory, batch_size=1, interval=10)
+    write = writer._write
+
+    def slow_write(batch):
+        time.sleep(0.1)
+        write(batch)
+
+    writer._write = slow_write
+
+    async def run():
+        await writer.start()
+        writer.enqueue("s1", "user", "hello") # a full batch, the background task takes it
+        await asyncio.sleep(0.02)
+        assert writer.stats()["pending"] == 0
+        await writer.flush()
+        rows = stored_rows(session_factory)
+        await writer.stop()
+        return rows
+
+    assert asyncio.run(run()) == [("s1", "user", "hello")]
+
+
+def test_window_stays_bounded_as_the_session_grows(session_factory):
+    memory = SessionMemory(HistoryWriter(session_factory=session_factory), window_turns=6, max_tokens=10_000)
+
+    async def run():
+        await memory.load("s1")
+        for i in range(20):
+            memory.record_exchange("s1", f"question {i}", f"answer {i}")
+        return await memory.window("s1")
+
+    window = asyncio.run(run())
+    assert [t["content"] for t in window] == ["question 17", "answer 17", "question 18", "answer 18",
+                                              "question 19", "answer 19"]
+
+    memory.max_tokens = 6
+    window = asyncio.run(memory.window("s1"))
+    assert window == [{"role": "user", "content": "question 19"}, {"role": "model", "content": "answer 19"}]
+
+
+def test_evicted_sessions_are_reloaded_with_unflushed_turns(session_factory):
+    memory = SessionMemory(HistoryWriter(session_factory=session_factory), max_sessions=1)
+
+    async def run():
+        await memory.load("s1")
+        memory.record_exchange("s1", "Who runs sales at TechFlow?", "Elena Silva")
+        memory.remember_tool("s1", "search_db_wrapper", "TechFlow", '{"rows":[[1,"Elena Silva"]]}')
+        await memory.load("s2") # evicts s1 before anything was flushed
+        window = await memory.window("s1")
+        return window, memory.tool_result("s1", "search_db_wrapper", "  techflow ")
+
+    window, tool_result = asyncio.run(run())
+    assert [t["content"] for t in window] == ["Who runs sales at TechFlow?", "Elena Silva"]
+    assert tool_result == '{"rows":[[1,"Elena Silva"]]}'
+    assert memory.stats()["loads"] == 3
+    # Read from the buffer, a new session does not wait for the whole buffer to be written
+    assert memory.writer.stats()["written"] == 0
+
+
+def test_reloads_see_batches_being_written_once(session_factory):
+    writer = HistoryWriter(session_factory=session_factory, batch_size=2, interval=10)
+    memory = SessionMemory(writer, max_sessions=1)
+    write = writer._write
+
+    def slow_write(batch):
+        time.sleep(0.1)
+        write(batch)
+
+    writer._write = slow_write
+
+    async def run():
+        await writer.start()
+        await memory.load("s1")
+        memory.record_exchange("s1", "Who runs sales at TechFlow?", "Elena Silva") # a full batch
+        await memory.load("s2")
+        await asyncio.sleep(0.02) # the batch is being written
+        window = await memory.window("s1")
+        await writer.stop()
+        return window
+
+    assert [t["content"] for t in asyncio.run(run())] == ["Who runs sales at TechFlow?", "Elena Silva"]
+
+
+class SessionChat:
+    """
+    Asks for the same web search on the first message of every chat, then answers.
+    """
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, message, config=None):
+        self.sent += 1
+        if self.sent == 1:
+            calls = [SimpleNamespace(name="search_web_tool", args={"query": "TechFlow CTO"})]
+            return SimpleNamespace(function_calls=calls, text=None)
+        return SimpleNamespace(function_calls=None, text='[{"name": "Ana Costa"}]')
+
+    async def send_message_stream(self, message, config=None):
+        response = await self.send_message(message, config=config)
+
+        async def chunks():
+            yield response
+        return chunks()
+
+
+@pytest.fixture
+def session_search(mocker, db_sessions):
+    created = []
+
+    def create_chat(model, config, history=None):
+        created.append(history or [])
+        return SessionChat()
+
+    async def gate_keeper(model, contents):
+        return SimpleNamespace(text="SEARCH")
+
+    client = SimpleNamespace(aio=SimpleNamespace(
+        models=SimpleNamespace(generate_content=gate_keeper),
+        chats=SimpleNamespace(create=create_chat),
+    ))
+    web_calls = []
+
+    async def web_tool(query, fresh=False):
+        web_calls.append(query)
+        return json.dumps([{"title": "Ana Costa - CTO - TechFlow"}])
+
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "search_web_tool", web_tool)
+    mocker.patch.object(search, "session_memory", SessionMemory(HistoryWriter(session_factory=db_sessions)))
+    return created, web_calls
+
+
+def test_follow_ups_get_history_and_reuse_tool_results(session_search, session_factory):
+    created, web_calls = session_search
+
+    async def ask(query):
+        return [json.loads(line) async for line in search.ai_search_generator(query, session_id="s1")]
+
+    asyncio.run(ask("Who is the CTO of TechFlow?"))
+    events = asyncio.run(ask("Find her LinkedIn profile"))
+
+    assert web_calls == ["TechFlow CTO"]
+    artifact = next(e for e in events if e["type"] == "tool_artifact")
+    assert artifact["reused"] is True and "Ana Costa" in artifact["result"]
+    assert created[0] == []
+    assert [c.role for c in created[1]] == ["user", "model"]
+    assert created[1][0].parts[0].text == "Who is the CTO of TechFlow?"
+
+    asyncio.run(search.session_memory.writer.flush())
+    assert [role for _, role, _ in stored_rows(session_factory)] == ["tool", "user", "model", "user", "model"]
+
+
+def test_cached_searches_load_the_session_window_once(session_search, mocker):
+    mocker.patch.object(search, "answer_cache", mocker.Mock(lookup=mocker.Mock(return_value=None)))
+    window = mocker.spy(search.session_memory, "window")
+
+    async def ask(query):
+        return [json.loads(line) async for line in search.cached_search_generator(query, session_id="s1")]
+
+    asyncio.run(ask("Who is the CTO of TechFlow?"))
+    asyncio.run(ask("Find her LinkedIn profile"))
+
+    assert window.call_count == 2
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from google.genai import errors
+
+from app.metrics import MODEL_RATE_LIMITED, REGISTRY, Counter, Histogram, Trace, current_trace, span
+from app.model_router import ModelRouter
+from app.routes import search
+
+
+def usage(prompt, output):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output)
+
+
+def test_prometheus_text_format():
+    histogram = Histogram("test_latency_seconds", "Test latency.", labels=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="db")
+    histogram.observe(0.5, stage="db")
+    histogram.observe(5, stage="db")
+    counter = Counter("test_requests_total", "Test requests.", labels=("model",))
+    counter.inc(model='gemini "pro"')
+
+    assert histogram.render() == [
+        "# HELP test_latency_seconds Test latency.",
+        "# TYPE test_latency_seconds histogram",
+        'test_latency_seconds_bucket{stage="db",le="0.1"} 1',
+        'test_latency_seconds_bucket{stage="db",le="1"} 2',
+        'test_latency_seconds_bucket{stage="db",le="+Inf"} 3',
+        'test_latency_seconds_sum{stage="db"} 5.55',
+        'test_latency_seconds_count{stage="db"} 3',
+    ]
+    assert counter.render()[-1] == 'test_requests_total{model="gemini \\"pro\\""} 1'
+
+
+def test_spans_are_collected_into_the_current_trace():
+    async def run():
+        trace = Trace()
+        current_trace.set(trace)
+
+        async def tool():
+            with span("tool"):
+                await asyncio.sleep(0.01)
+
+        with span("outer"):
+            await asyncio.gather(asyncio.ensure_future(tool()), asyncio.ensure_future(tool()))
+        return trace.to_dict()
+
+    timings = asyncio.run(run())
+    assert [s["stage"] for s in timings["spans"]].count("tool") == 2
+    assert timings["stages"]["outer"] >= 10
+
+
+def test_rate_limits_are_counted_per_model():
+    router = ModelRouter(["flaky", "steady"])
+    before = MODEL_RATE_LIMITED.value(model="flaky")
+
+    async def call(model):
+        if model == "flaky":
+            raise errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "quota"}})
+        return SimpleNamespace(text="ok", usage_metadata=usage(10, 2))
+
+    assert asyncio.run(router.call(call)).text == "ok"
+    assert MODEL_RATE_LIMITED.value(model="flaky") == before + 1
+
+
+def test_search_stream_ends_with_timings(mocker, db_sessions):
+    class Chat:
+        def __init__(self):
+            self.sent = 0
+
+        async def send_message(self, message, config=None):
+            self.sent += 1
+            if self.sent == 1:
+                calls = [SimpleNamespace(name="search_db_wrapper", args={"query": "TechFlow"})]
+                return SimpleNamespace(function_calls=calls, text=None, usage_metadata=usage(100, 5))
+            return SimpleNamespace(function_calls=None, text="[]", usage_metadata=usage(300, 20))
+
+        async def send_message_stream(self, message, config=None):
+            response = await self.send_message(message, config=config)
+
+            async def chunks():
+                yield response
+            return chunks()
+
+    client = SimpleNamespace(aio=SimpleNamespace(chats=SimpleNamespace(create=lambda model, config: Chat())))
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "classify_intent", mocker.AsyncMock(return_value="SEARCH"))
+
+    async def run():
+        return [json.loads(line) async for line in search.traced_search_generator("Who is Elena?", fresh=True)]
+
+    events = asyncio.run(run())
+    timings = events[-1]
+    assert timings["type"] == "timings"
+    assert {"gate_keeper", "model_first_turn", "tool:search_db_wrapper", "db_search", "model_turn"} <= set(timings["stages"])
+    assert timings["tokens"] == {"prompt": 400, "output": 25}
+    assert 0 < timings["ttfb_ms"] <= timings["total_ms"]
+
+    exported = REGISTRY.render()
+    assert 'nexus_stage_duration_seconds_bucket{stage="db_search",le="+Inf"}' in exported
+    assert 'nexus_model_tokens_total{model="fake-model",kind="prompt"}' in exported
+    assert "nexus_search_stream_duration_seconds_count" in exported
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.gemini import GeminiClient
+from app.model_catalog import DEFAULT_MODELS, ModelCatalog, select_models
+from app.model_router import ModelRouter
+
+
+def model(name, actions=("generateContent",)):
+    return SimpleNamespace(name=f"models/{name}", supported_actions=list(actions))
+
+
+class FakeModels:
+    """
+    `models.list` that waits until the test releases it, or fails.
+    """
+    def __init__(self, models, fail=False):
+        self.models = models
+        self.fail = fail
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def list(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("models.list unavailable")
+
+        async def pages():
+            for m in self.models:
+                yield m
+        return pages()
+
+
+def catalog_for(tmp_path, models, now=10_000.0, **kwargs):
+    gemini = GeminiClient(api_key="test_key")
+    gemini.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    return ModelCatalog(ModelRouter(), gemini, path=str(tmp_path / "catalog.json"), refresh_interval=3600,
+                        clock=lambda: now, **kwargs)
+
+
+def test_select_models_puts_priority_models_first():
+    listed = [model("text-embedding-004", ("embedContent",)), model("gemini-2.0-flash"), model("gemini-1.0-pro")]
+
+    assert select_models(listed) == ["gemini-1.0-pro", "gemini-2.0-flash"]
+
+
+def test_startup_serves_the_cached_catalog_without_waiting(tmp_path):
+    (tmp_path / "catalog.json").write_text(json.dumps({"models": ["cached-model"], "fetched_at": 0}))
+    models = FakeModels([model("gemini-2.0-flash")])
+    catalog = catalog_for(tmp_path, models)
+
+    async def run():
+        await catalog.start() # the stale catalog is refreshed in the background
+        started_with = catalog.router.models
+        await asyncio.sleep(0.01)
+        assert models.calls == 1
+        models.release.set()
+        await asyncio.sleep(0.01)
+        await catalog.stop()
+        return started_with
+
+    assert asyncio.run(run()) == ["cached-model"]
+    assert catalog.router.models == ["gemini-2.0-flash"]
+    assert catalog.stats()["source"] == "api"
+    assert json.loads((tmp_path / "catalog.json").read_text()) == {"models": ["gemini-2.0-flash"], "fetched_at": 10_000.0}
+
+
+def test_fresh_catalog_is_not_refetched_and_failures_keep_the_chain(tmp_path):
+    (tmp_path / "catalog.json").write_text(json.dumps({"models": ["cached-model"], "fetched_at": 9_900.0}))
+    models = FakeModels([], fail=True)
+    models.release.set()
+    catalog = catalog_for(tmp_path, models)
+
+    async def run():
+        await catalog.start()
+        await asyncio.sleep(0.01)
+        assert models.calls == 0 # refreshed 100s ago, next refresh in an hour
+        refreshed = await catalog.refresh()
+        await catalog.stop()
+        return refreshed
+
+    assert asyncio.run(run()) is False
+    assert catalog.router.models == ["cached-model"]
+    assert catalog.stats()["failures"] == 1
+
+
+def test_first_start_uses_the_default_chain(tmp_path):
+    catalog = catalog_for(tmp_path, FakeModels([]))
+    catalog.gemini.api_key = None # no background refresh without a key
+
+    asyncio.run(catalog.start())
+
+    assert catalog.router.models == DEFAULT_MODELS
+    assert catalog.stats()["source"] == "default"
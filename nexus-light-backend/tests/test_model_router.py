@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+from google.genai import errors
+
+from app.model_router import AllModelsUnavailable, ModelRouter
+
+
+def rate_limit_error(retry_delay=None):
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}] if retry_delay else []
+    return errors.ClientError(429, {"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded", "details": details,
+    }})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_backend(behaviour):
+    """
+    `behaviour` maps model -> result or exception. Returns the call log and the callable.
+    """
+    calls = []
+
+    async def fn(model):
+        calls.append(model)
+        outcome = behaviour[model]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, float):
+            await asyncio.sleep(outcome)
+            return model
+        return outcome
+
+    return calls, fn
+
+
+def test_rate_limited_model_is_skipped_until_retry_after(clock):
+    router = ModelRouter(["pro", "flash"], clock=clock)
+    calls, fn = make_backend({"pro": rate_limit_error("17s"), "flash": "ok"})
+
+    assert asyncio.run(router.call(fn)) == "ok"
+    assert asyncio.run(router.call(fn)) == "ok"
+    # The exhausted model is not retried first on the second request
+    assert calls == ["pro", "flash", "flash"]
+
+    state = {m["model"]: m for m in router.snapshot()["models"]}
+    assert state["pro"]["state"] == "open"
+    assert state["pro"]["open_for_seconds"] == 17
+    assert state["pro"]["rate_limited"] == 1
+
+    clock.now += 18
+    assert router.candidates()[-1] == "pro"
+    assert router.snapshot()["models"][0]["state"] == "half_open"
+
+
+def test_half_open_model_recovers_after_a_successful_probe(clock):
+    router = ModelRouter(["pro", "flash"], clock=clock, cooldown=5)
+    _, failing = make_backend({"pro": rate_limit_error(), "flash": "ok"})
+    asyncio.run(router.call(failing))
+
+    clock.now += 6
+    _, healthy = make_backend({"pro": "ok", "flash": "ok"})
+    asyncio.run(router.track("pro", healthy("pro")))
+
+    assert router.snapshot()["models"][0]["state"] == "closed"
+
+
+def test_outages_open_the_breaker_after_the_threshold(clock):
+    router = ModelRouter(["pro"], clock=clock, failure_threshold=2)
+    outage = errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE"}})
+    _, fn = make_backend({"pro": outage})
+
+    with pytest.raises(AllModelsUnavailable):
+        asyncio.run(router.call(fn))
+    assert router.candidates() == ["pro"]
+    with pytest.raises(AllModelsUnavailable):
+        asyncio.run(router.call(fn))
+    assert router.candidates() == []
+
+
+def test_failing_models_are_ordered_after_healthy_ones(clock):
+    router = ModelRouter(["pro", "flash"], clock=clock)
+    outage = errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE"}})
+    _, fn = make_backend({"pro": outage, "flash": "ok"})
+
+    asyncio.run(router.call(fn))
+    assert router.candidates() == ["flash", "pro"]
+
+
+def test_request_errors_are_raised_without_falling_back(clock):
+    router = ModelRouter(["pro", "flash"], clock=clock)
+    bad_request = errors.ClientError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}})
+    calls, fn = make_backend({"pro": bad_request, "flash": "ok"})
+
+    with pytest.raises(errors.ClientError):
+        asyncio.run(router.call(fn))
+    assert calls == ["pro"]
+
+
+def test_all_models_exhausted_reports_retry_after(clock):
+    router = ModelRouter(["pro", "flash"], clock=clock)
+    _, fn = make_backend({"pro": rate_limit_error("30s"), "flash": rate_limit_error("5s")})
+
+    with pytest.raises(AllModelsUnavailable):
+        asyncio.run(router.call(fn))
+    with pytest.raises(AllModelsUnavailable) as excinfo:
+        asyncio.run(router.call(fn))
+    assert excinfo.value.retry_after == 5
+
+
+def test_hedged_request_returns_the_faster_model():
+    router = ModelRouter(["pro", "flash"], hedge_after=0.05)
+    calls, fn = make_backend({"pro": 1.0, "flash": 0.01})
+
+    start = time.perf_counter()
+    assert asyncio.run(router.call(fn)) == "flash"
+    assert time.perf_counter() - start < 0.5
+    assert calls == ["pro", "flash"]
+    # The cancelled attempt is neither a success nor a failure
+    pro = router.snapshot()["models"][0]
+    assert pro["successes"] == 0 and pro["failures"] == 0
+
+
+def test_tracks_latency_and_keeps_stats_across_chain_updates():
+    router = ModelRouter(["pro"])
+    _, fn = make_backend({"pro": 0.01, "flash": 0.01})
+    asyncio.run(router.call(fn))
+
+    router.set_models(["pro", "flash"])
+    pro = router.snapshot()["models"][0]
+    assert pro["successes"] == 1
+    assert pro["ewma_latency_ms"] >= 10
@@ -0,0 +1,52 @@
+import json
+
+from app.result_budget import ResultBudget, ResultBudgeter, count_tokens
+
+
+def leads(count):
+    return [{"id": i, "name": f"Lead {i}", "role": "VP Sales", "company": "TechFlow", "location": None}
+            for i in range(count)]
+
+
+def test_count_tokens_is_stable_and_grows_with_text():
+    assert count_tokens("") == 0
+    assert count_tokens('{"a":1}') == 7
+    assert count_tokens("Head of Growth at Nubank") < count_tokens("Head of Growth at Nubank, São Paulo")
+
+
+def test_broad_results_fit_the_budget_in_columnar_form():
+    budgeted = ResultBudget(max_tokens=200).apply(leads(1000))
+    payload = json.loads(budgeted.text)
+
+    assert budgeted.tokens <= 200
+    assert payload["columns"] == ["id", "name", "role", "company"] # empty location dropped
+    assert payload["rows"][0] == [0, "Lead 0", "VP Sales", "TechFlow"] # best ranked kept first
+    assert payload["omitted"] == 1000 - len(payload["rows"]) == budgeted.omitted
+    assert payload["note"] == f"{budgeted.omitted} more results omitted"
+    assert budgeted.raw_tokens > 50 * budgeted.tokens
+
+
+def test_small_results_are_kept_whole_and_long_fields_clipped():
+    records = [{"title": "TechFlow", "snippet": "x" * 1000}, {"title": "TechFlow", "snippet": "x" * 1000}]
+    payload = json.loads(ResultBudget(max_tokens=1000, max_field_chars=50).apply(records).text)
+
+    assert len(payload["rows"]) == 1 # exact duplicates collapse
+    assert len(payload["rows"][0][1]) == 50
+    assert "omitted" not in payload
+
+
+def test_budgeter_uses_per_tool_budgets_and_passes_messages_through():
+    budgeter = ResultBudgeter(budgets={"search_db_wrapper": ResultBudget(max_tokens=100)},
+                              default=ResultBudget(max_tokens=10_000))
+
+    small = budgeter.apply("search_db_wrapper", json.dumps(leads(100)))
+    large = budgeter.apply("search_web_tool", json.dumps(leads(100)))
+    message = budgeter.apply("search_db_wrapper", "No records found in local database.")
+
+    assert small.omitted > 0 and large.omitted == 0
+    assert message.text == "No records found in local database." and message.saved_tokens == 0
+
+    budgeter.record_request(small.raw_tokens + large.raw_tokens, small.tokens + large.tokens)
+    stats = budgeter.stats()
+    assert stats["calls"] == 3 and stats["requests"] == 1
+    assert stats["saved_tokens_per_request"] == stats["saved_tokens"] > 0
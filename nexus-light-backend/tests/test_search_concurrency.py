@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.model_router import ModelRouter
+from app.routes import search
+
+# Simulated latency of a single Gemini round trip
+MODEL_LATENCY = 0.2
+
+
+class FakeChat:
+    """
+    Scripted async chat: asks for one DB lookup, then answers.
+    """
+    def __init__(self):
+        self.turns = 0
+
+    async def send_message(self, message):
+        await asyncio.sleep(MODEL_LATENCY)
+        self.turns += 1
+        if self.turns == 1:
+            call = SimpleNamespace(name="search_db_wrapper", args={"query": "TechFlow"})
+            return SimpleNamespace(function_calls=[call], text=None)
+        return SimpleNamespace(function_calls=None, text='[{"id": 1, "name": "Elena Silva"}]')
+
+    async def send_message_stream(self, message):
+        response = await self.send_message(message)
+
+        async def chunks():
+            yield response
+        return chunks()
+
+
+class FakeModels:
+    async def generate_content(self, model, contents):
+        await asyncio.sleep(MODEL_LATENCY)
+        return SimpleNamespace(text="SEARCH")
+
+
+class FakeClient:
+    def __init__(self, api_key=None):
+        self.aio = SimpleNamespace(
+            models=FakeModels(),
+            chats=SimpleNamespace(create=lambda model, config: FakeChat()),
+        )
+
+
+@pytest.fixture
+def fake_genai(mocker):
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", FakeClient())
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+
+
+async def run_search(query):
+    return [json.loads(line) async for line in search.ai_search_generator(query)]
+
+
+def test_search_stream_uses_async_tools(fake_genai, db_sessions):
+    """
+    The tool loop runs the DB tool and streams the final answer.
+    """
+    events = asyncio.run(run_search("VP sales at TechFlow"))
+
+    artifacts = [e for e in events if e["type"] == "tool_artifact"]
+    assert artifacts[0]["tool_name"] == "search_db_wrapper"
+    assert artifacts[0]["status"] == "success"
+    assert "Elena Silva" in artifacts[0]["result"]
+    assert events[-1]["type"] == "answer"
+
+
+def test_concurrent_searches_do_not_block_each_other(fake_genai, db_sessions):
+    """
+    N simultaneous searches should take about as long as a single one.
+    """
+    start = time.perf_counter()
+    asyncio.run(run_search("TechFlow"))
+    single = time.perf_counter() - start
+
+    async def run_many(n):
+        return await asyncio.gather(*(run_search("TechFlow") for _ in range(n)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many(10))
+    concurrent = time.perf_counter() - start
+
+    assert all(r[-1]["type"] == "answer" for r in results)
+    assert concurrent < single * 2
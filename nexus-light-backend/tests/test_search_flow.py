@@ -1,4 +1,4 @@
-import requests
+import httpx
 import json
 
 BASE_URL = "http://localhost:8000/api" # Inside the container, we talk to port 8000
@@ -9,18 +9,16 @@ def test_chat_flow():
     Sends a simple query and expects a plain text response.
     """
     query = "hello"
-    response = requests.get(f"{BASE_URL}/search/?q={query}", stream=True)
-    
-    assert response.status_code == 200
-    
     is_text_answer = False
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            if chunk.get("type") == "answer" and chunk.get("format") == "text":
-                is_text_answer = True
-                print(f"Chat flow test passed. Response: {chunk['content']}")
-                break
+    with httpx.stream("GET", f"{BASE_URL}/search/", params={"q": query}, timeout=None) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line:
+                chunk = json.loads(line)
+                if chunk.get("type") == "answer" and chunk.get("format") == "text":
+                    is_text_answer = True
+                    print(f"Chat flow test passed. Response: {chunk['content']}")
+                    break
     
     assert is_text_answer, "Did not receive a text answer for the chat flow."
 
@@ -30,24 +28,22 @@ def test_search_flow():
     Sends a search query and expects a JSON response.
     """
     query = "find me the CTO of TechCorp"
-    response = requests.get(f"{BASE_URL}/search/?q={query}", stream=True)
-    
-    assert response.status_code == 200
-    
     is_json_answer = False
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            if chunk.get("type") == "answer" and chunk.get("format") == "json":
-                try:
-                    # Clean up the content if it's wrapped in markdown
-                    content = chunk['content'].replace("```json", "").replace("```", "").strip()
-                    json.loads(content)
-                    is_json_answer = True
-                    print(f"Search flow test passed. Response is valid JSON.")
-                    break
-                except json.JSONDecodeError:
-                    print("Search flow test failed. 'content' is not valid JSON.")
+    with httpx.stream("GET", f"{BASE_URL}/search/", params={"q": query}, timeout=None) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line:
+                chunk = json.loads(line)
+                if chunk.get("type") == "answer" and chunk.get("format") == "json":
+                    try:
+                        # Clean up the content if it's wrapped in markdown
+                        content = chunk['content'].replace("```json", "").replace("```", "").strip()
+                        json.loads(content)
+                        is_json_answer = True
+                        print(f"Search flow test passed. Response is valid JSON.")
+                        break
+                    except json.JSONDecodeError:
+                        print("Search flow test failed. 'content' is not valid JSON.")
     
     assert is_json_answer, "Did not receive a JSON answer for the search flow."
 
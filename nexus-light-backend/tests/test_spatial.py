@@ -0,0 +1,133 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+
+from app.database import Base, Entity, get_db
+from app.importer import import_records
+from app import spatial
+from app.routes import entities
+from app.spatial import cluster_entities, create_spatial_index, entities_in_bbox, nearest_entities
+
+
+def random_points(count, seed=7):
+    rng = random.Random(seed)
+    return [{"id": i, "type": "person" if i % 2 else "business", "name": f"Lead {i}",
+             "coords": {"x": round(rng.uniform(0, 100), 3), "y": round(rng.uniform(0, 100), 3)}}
+            for i in range(2, count + 2)]
+
+
+@pytest.fixture
+def points(session_factory):
+    rows = random_points(500)
+    import_records(rows, engine=session_factory.kw["bind"])
+    return {r["id"]: r for r in rows}
+
+
+def grid_total(db, cell):
+    return db.execute(text("SELECT SUM(count) FROM entity_grid WHERE cell = :cell"), {"cell": cell}).scalar()
+
+
+def test_triggers_keep_the_index_in_sync(session_factory, points):
+    db = session_factory()
+    assert db.execute(text("SELECT COUNT(*) FROM entities_rtree")).scalar() == 500
+    assert grid_total(db, 4.0) == 500
+
+    db.get(Entity, 2).coords = {"x": 99.5, "y": 99.5}
+    db.delete(db.get(Entity, 3))
+    db.get(Entity, 1).coords = {"x": 1, "y": 1}
+    db.commit()
+    assert db.execute(text("SELECT min_x FROM entities_rtree WHERE id = 2")).scalar() == 99.5
+    assert db.execute(text("SELECT COUNT(*) FROM entities_rtree")).scalar() == 500
+    assert grid_total(db, 16.0) == 500
+    db.close()
+
+
+def test_existing_rows_are_indexed_on_first_startup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Entity), random_points(50))
+    create_spatial_index(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM entities_rtree")).scalar() == 50
+        assert conn.execute(text("SELECT SUM(count) FROM entity_grid WHERE cell = 1.0")).scalar() == 50
+    engine.dispose()
+
+
+def test_bbox_and_nearest_match_brute_force(session_factory, points):
+    db = session_factory()
+    inside = {e.id for e in entities_in_bbox(db, (10, 20, 40, 35))}
+    assert inside == {i for i, p in points.items() if 10 <= p["coords"]["x"] <= 40 and 20 <= p["coords"]["y"] <= 35}
+
+    for x, y, k in [(50, 50, 5), (0, 0, 12), (150, -20, 3)]:
+        got = [e.id for _, e in nearest_entities(db, x, y, k, {"type": "person"})]
+        expected = sorted((i for i, p in points.items() if p["type"] == "person"),
+                          key=lambda i: math.hypot(points[i]["coords"]["x"] - x, points[i]["coords"]["y"] - y))
+        assert got == expected[:k]
+    db.close()
+
+
+def test_clusters_count_every_point_once(session_factory, points):
+    db = session_factory()
+    result = cluster_entities(db, (0, 0, 100, 100), cells=10)
+    assert result["cell_size"] == 8.0 # two merged 4-unit cells
+    expected = Counter((math.floor(p["coords"]["x"] / 8), math.floor(p["coords"]["y"] / 8)) for p in points.values())
+    got = {(round(c["bounds"]["min_x"] / 8), round(c["bounds"]["min_y"] / 8)): c["count"] for c in result["clusters"]}
+    assert got == dict(expected)
+
+    # Filtered queries aggregate on the fly
+    filtered = cluster_entities(db, (0, 0, 100, 100), cells=10, filters={"type": "person"})
+    assert sum(c["count"] for c in filtered["clusters"]) == 250
+    db.close()
+
+
+def test_other_dialects_scan_the_table(session_factory, points, mocker):
+    db = session_factory()
+    indexed = ({e.id for e in entities_in_bbox(db, (10, 20, 40, 35))},
+               [e.id for _, e in nearest_entities(db, 50, 50, 5, {"type": "person"})],
+               cluster_entities(db, (0, 0, 100, 100), cells=10, filters={"type": "person"}))
+    mocker.patch.object(spatial, "_dialect", return_value="mysql")
+
+    assert {e.id for e in entities_in_bbox(db, (10, 20, 40, 35))} == indexed[0]
+    assert [e.id for _, e in nearest_entities(db, 50, 50, 5, {"type": "person"})] == indexed[1]
+    scanned = cluster_entities(db, (0, 0, 100, 100), cells=10, filters={"type": "person"})
+    key = lambda c: (c["bounds"]["min_x"], c["bounds"]["min_y"], c["count"])
+    assert sorted(map(key, scanned["clusters"])) == sorted(map(key, indexed[2]["clusters"]))
+    db.close()
+
+
+def test_map_endpoints(session_factory, points):
+    db = session_factory()
+    db.add(Entity(id=1000, type="business", name="TechFlow HQ", coords={"x": 50, "y": 50}))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(entities.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+
+    near = client.get("/api/entities/nearest", params={"entity_id": 1000, "type": "person", "k": 3}).json()
+    assert near["origin"] == {"x": 50, "y": 50}
+    assert len(near["items"]) == 3 and all(item["type"] == "person" for item in near["items"])
+    assert near["items"][0]["distance"] <= near["items"][-1]["distance"]
+
+    page = client.get("/api/entities/bbox", params={"min_x": 0, "min_y": 0, "max_x": 100, "max_y": 100,
+                                                    "limit": 10, "fields": "name"}).json()
+    assert page["truncated"] and len(page["items"]) == 10 and set(page["items"][0]) == {"id", "name"}
+
+    assert client.get("/api/entities/nearest", params={"entity_id": 1}).status_code == 404 # no coords
+    assert client.get("/api/entities/nearest").status_code == 400
+    assert client.get("/api/entities/clusters", params={"min_x": 5, "min_y": 0, "max_x": 1, "max_y": 1}).status_code == 400
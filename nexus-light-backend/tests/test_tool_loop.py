@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.model_router import ModelRouter
+from app.routes import search
+
+TOOL_LATENCY = 0.2
+
+
+class ParallelCallsChat:
+    """
+    Asks for three tools in one turn, then answers. Records every message it receives.
+    """
+    def __init__(self, always_call=False):
+        self.messages = []
+        self.configs = []
+        self.always_call = always_call
+
+    async def send_message(self, message, config=None):
+        self.messages.append(message)
+        self.configs.append(config)
+        forced_answer = config is not None
+        if (len(self.messages) == 1 or self.always_call) and not forced_answer:
+            calls = [
+                SimpleNamespace(name="search_db_wrapper", args={"query": "TechFlow"}),
+                SimpleNamespace(name="search_web_tool", args={"query": "TechFlow VP Sales"}),
+                SimpleNamespace(name="search_web_tool", args={"query": "TechFlow CTO"}),
+            ]
+            return SimpleNamespace(function_calls=calls, text=None)
+        return SimpleNamespace(function_calls=None, text="[]")
+
+    async def send_message_stream(self, message, config=None):
+        response = await self.send_message(message, config=config)
+
+        async def chunks():
+            yield response
+        return chunks()
+
+
+@pytest.fixture
+def chat(mocker):
+    chat = ParallelCallsChat()
+
+    async def gate_keeper(model, contents):
+        return SimpleNamespace(text="SEARCH")
+
+    client = SimpleNamespace(aio=SimpleNamespace(
+        models=SimpleNamespace(generate_content=gate_keeper),
+        chats=SimpleNamespace(create=lambda model, config: chat),
+    ))
+
+    async def slow_web_tool(query, fresh=False):
+        await asyncio.sleep(TOOL_LATENCY)
+        return f"- Title: {query}"
+
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "search_web_tool", slow_web_tool)
+    return chat
+
+
+def run_search(query="Who runs sales at TechFlow?"):
+    async def run():
+        return [json.loads(line) async for line in search.ai_search_generator(query)]
+    return asyncio.run(run())
+
+
+def test_parallel_calls_run_concurrently_and_reply_in_one_turn(chat, db_sessions):
+    start = time.perf_counter()
+    events = run_search()
+    elapsed = time.perf_counter() - start
+
+    artifacts = [e for e in events if e["type"] == "tool_artifact"]
+    assert len(artifacts) == 3
+    assert elapsed < TOOL_LATENCY * 2
+
+    # One user message plus a single reply carrying all three function responses
+    assert len(chat.messages) == 2
+    parts = chat.messages[1]
+    assert [p.function_response.name for p in parts] == ["search_db_wrapper", "search_web_tool", "search_web_tool"]
+    assert "Elena Silva" in parts[0].function_response.response["result"]
+    assert events[-1]["type"] == "answer"
+
+
+def test_round_budget_forces_an_answer_without_tools(chat, db_sessions, mocker):
+    chat.always_call = True
+    mocker.patch.object(search, "SEARCH_MAX_TOOL_ROUNDS", 2)
+
+    events = run_search()
+
+    assert len(chat.messages) == 3
+    final_config = chat.configs[-1]
+    assert final_config.tool_config.function_calling_config.mode == "NONE"
+    assert events[-1]["type"] == "answer"
+
+
+def test_time_budget_cancels_slow_tools(chat, db_sessions, mocker):
+    mocker.patch.object(search, "SEARCH_TIME_BUDGET_SECONDS", TOOL_LATENCY / 2)
+
+    start = time.perf_counter()
+    events = run_search()
+
+    assert time.perf_counter() - start < TOOL_LATENCY
+    results = chat.messages[1]
+    assert results[1].function_response.response["result"] == "Error: Tool timed out"
+    assert events[-1]["type"] == "answer"
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import random
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, update
+
+from app.database import Entity
+from app.importer import import_records
+from app.model_router import ModelRouter
+from app.routes import search
+from app.vector_index import EntityVectorIndex
+
+LEADS = [
+    {"id": 2, "type": "person", "name": "Marcus Chen", "role": "Head of Growth", "company": "Nubank",
+     "group": "Fintech"},
+    {"id": 3, "type": "person", "name": "Sarah Jones", "role": "CRO", "company": "Vtex", "group": "Retail"},
+    {"id": 102, "type": "business", "name": "Nubank Office", "industry": "Fintech", "location": "São Paulo"},
+    {"id": 103, "type": "business", "name": "Mercado Libre", "industry": "E-commerce", "location": "Buenos Aires"},
+]
+
+
+@pytest.fixture
+def leads(session_factory):
+    import_records(LEADS, engine=session_factory.kw["bind"])
+
+
+@pytest.fixture
+def index(tmp_path, session_factory, leads):
+    index = EntityVectorIndex(path=str(tmp_path / "vectors"), dim=128, session_factory=session_factory)
+    index.load()
+    index.sync()
+    return index
+
+
+def ids(hits):
+    return [entity_id for entity_id, _ in hits]
+
+
+def test_descriptions_find_entities_without_their_words(index):
+    hits = index.search("growth leaders at fintechs", limit=3)
+
+    # Elena Silva (VP Sales at TechFlow) shares no word with the query
+    assert ids(hits)[:2] == [2, 102]
+    assert hits[0][1] > hits[1][1] > hits[-1][1]
+    assert index.search("the of") == []
+
+
+def test_sync_embeds_only_changed_rows_and_the_vectors_survive_a_restart(index, session_factory, mocker, tmp_path):
+    engine = session_factory.kw["bind"]
+    with engine.begin() as conn:
+        # Bulk writes bypass the ORM, only a sync sees them
+        conn.execute(update(Entity).where(Entity.id == 3).values(role="Head of Growth", group="Fintech"))
+        conn.execute(Entity.__table__.delete().where(Entity.id == 103))
+    embed = mocker.spy(index.embedder, "embed_many")
+
+    index.sync()
+
+    assert embed.call_count == 1 and len(embed.spy_return) == 1
+    assert 103 not in ids(index.search("e-commerce buenos aires"))
+    assert set(ids(index.search("head of growth fintech"))[:2]) == {2, 3}
+
+    restarted = EntityVectorIndex(path=str(tmp_path / "vectors"), dim=128, session_factory=session_factory)
+    restarted.load()
+    assert len(restarted) == len(index) == 4
+    assert restarted.search("head of growth fintech") == index.search("head of growth fintech")
+
+
+def test_orm_writes_update_the_index(index, session_factory):
+    index.watch_entities()
+    db = session_factory()
+    db.add(Entity(id=200, type="person", name="Rui Alves", role="CFO", company="Loft", location="Rio de Janeiro"))
+    db.get(Entity, 2).role = "Account Executive"
+    db.delete(db.get(Entity, 3))
+    db.commit()
+    db.close()
+
+    assert ids(index.search("CFO Rio de Janeiro"))[0] == 200
+    assert ids(index.search("account executive nubank"))[0] == 2
+    assert 3 not in ids(index.search("CRO Vtex retail"))
+
+
+def test_orm_writes_wait_for_the_commit_and_skip_unchanged_text(index, session_factory, mocker):
+    index.watch_entities()
+    db = session_factory()
+    db.get(Entity, 2).role = "Account Executive"
+    db.flush()
+    assert 2 not in ids(index.search("account executive")) # not committed yet
+    db.rollback()
+
+    embed = mocker.spy(index.embedder, "embed_many")
+    db.get(Entity, 2).status = "Contacted"
+    db.commit()
+    db.close()
+
+    assert embed.call_count == 0
+    assert ids(index.search("head of growth nubank"))[0] == 2
+
+
+def test_scoring_does_not_hold_the_lock(index):
+    class Probe:
+        """
+        Vectors that record whether another thread could take the lock while they are read.
+        """
+        def __init__(self, vectors):
+            self.vectors = vectors
+            self.free = []
+
+        def try_lock(self):
+            if index._lock.acquire(timeout=0):
+                index._lock.release()
+                self.free.append(True)
+            else:
+                self.free.append(False)
+
+        def __getitem__(self, key):
+            thread = threading.Thread(target=self.try_lock)
+            thread.start()
+            thread.join()
+            # A sync reusing Marcus's slot meanwhile does not change the ids read before
+            index._ids[index._slots[2]] = 999
+            return self.vectors[key]
+
+    probe = index._vectors = Probe(index._vectors)
+
+    assert ids(index.search("head of growth fintech", nprobe=0))[0] == 2
+    assert probe.free == [True]
+
+
+def test_ivf_lists_keep_most_of_the_exact_neighbours(tmp_path, session_factory):
+    rng = random.Random(5)
+    words = [f"{a}{b}" for a in ("nu", "ve", "lo", "ca", "te", "mi") for b in ("bank", "flow", "tex", "ra", "dos")]
+    rows = [{"id": i, "type": "person", "name": f"Lead {i}", "role": rng.choice(["CTO", "CFO", "VP Sales", "CRO"]),
+             "company": rng.choice(words), "location": rng.choice(words), "group": rng.choice(words)}
+            for i in range(10, 3010)]
+    with session_factory.kw["bind"].begin() as conn:
+        conn.execute(insert(Entity), rows)
+    index = EntityVectorIndex(path=str(tmp_path / "ivf"), dim=128, session_factory=session_factory,
+                              ivf_min_rows=1000, nprobe=8)
+    index.load()
+    index.sync()
+
+    assert index.stats()["mode"] == "ivf" and index.stats()["lists"] == int(np.sqrt(3001))
+    recall = []
+    for query in ["CTO nubank", "VP Sales veflow cados", "CRO lotex", "CFO mira tebank"]:
+        exact = index.search(query, limit=10, nprobe=0)
+        approximate = index.search(query, limit=10)
+        recall.append(len(set(ids(exact)) & set(ids(approximate))) / len(exact))
+    assert np.mean(recall) >= 0.8
+
+    # New entities go to the list of their nearest centroid
+    index.upsert([(5000, "CTO nubank nubank nubank")])
+    assert 5000 in ids(index.search("CTO nubank", limit=10))
+
+
+class DescribingChat:
+    """
+    Describes the leads it wants instead of naming them, then answers.
+    """
+    def __init__(self):
+        self.messages = []
+        self.tools = None
+
+    async def send_message(self, message, config=None):
+        self.messages.append(message)
+        calls = [SimpleNamespace(name="semantic_search_db", args={"query": "growth leaders at fintechs"})]
+        return SimpleNamespace(function_calls=calls, text=None)
+
+    async def send_message_stream(self, message, config=None):
+        self.messages.append(message)
+
+        async def chunks():
+            yield SimpleNamespace(function_calls=None, text="[]")
+        return chunks()
+
+
+def test_agent_searches_the_index_as_a_tool(index, db_sessions, mocker):
+    chat = DescribingChat()
+
+    def create(model, config):
+        chat.tools = [tool.__name__ for tool in config.tools]
+        return chat
+
+    client = SimpleNamespace(aio=SimpleNamespace(chats=SimpleNamespace(create=create)))
+    mocker.patch.object(search, "GEMINI_API_KEY", "test_key")
+    mocker.patch.object(search.gemini, "client", client)
+    mocker.patch.object(search, "model_router", ModelRouter(["fake-model"]))
+    mocker.patch.object(search, "classify_intent", mocker.AsyncMock(return_value="SEARCH"))
+    mocker.patch.object(search, "vector_index", index)
+
+    async def run():
+        return [json.loads(line) async for line in search.ai_search_generator("Growth leaders at fintechs?")]
+
+    events = asyncio.run(run())
+
+    assert "semantic_search_db" in chat.tools
+    artifact = next(e for e in events if e["type"] == "tool_artifact")
+    assert artifact["tool_name"] == "semantic_search_db" and artifact["status"] == "success"
+    assert "Marcus Chen" in chat.messages[1][0].function_response.response["result"]
+    entities = [e for e in events if e["type"] == "entity"]
+    assert entities[0] == {"type": "entity", "origin": "db", "entity": {
+        "id": 2, "type": "person", "name": "Marcus Chen", "role": "Head of Growth", "company": "Nubank",
+        "group": "Fintech"}}
+
+
+def test_semantic_search_scores_off_the_event_loop(index, db_sessions, mocker):
+    mocker.patch.object(search, "vector_index", index)
+    threads = []
+    score = index.search
+    mocker.patch.object(index, "search", lambda *args: threads.append(threading.get_ident()) or score(*args))
+
+    async def run():
+        return threading.get_ident(), await search.semantic_search("growth leaders at fintechs")
+
+    loop_thread, rows = asyncio.run(run())
+
+    assert [row["id"] for row in rows][:2] == [2, 102]
+    assert threads and threads[0] != loop_thread
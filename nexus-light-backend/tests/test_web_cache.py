@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.cache import TTLCache
+from app.routes import search
+
+
+@pytest.fixture
+def upstream(mocker, session_factory):
+    """
+    Replaces SerpApi with a counting stand-in and gives search_web_tool a fresh cache.
+    """
+    calls = []
+
+    async def fake_fetch(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return f"- Title: result for {query}"
+
+    mocker.patch.object(search, "SERPAPI_API_KEY", "test_key")
+    mocker.patch.object(search, "fetch_web_results", fake_fetch)
+    mocker.patch.object(search, "web_cache", TTLCache("web", ttl=60, max_entries=10, max_rows=100,
+                                                      session_factory=session_factory))
+    return calls
+
+
+def test_concurrent_identical_queries_make_one_upstream_call(upstream):
+    async def run():
+        return await asyncio.gather(*(search.search_web_tool("VP Sales TechFlow") for _ in range(20)))
+
+    results = asyncio.run(run())
+
+    assert len(upstream) == 1
+    assert len(set(results)) == 1
+    assert search.web_cache.stats()["coalesced"] == 19
+
+
+def test_normalized_query_hits_cache_and_fresh_bypasses_it(upstream):
+    async def run():
+        await search.search_web_tool("VP Sales  TechFlow")
+        await search.search_web_tool("  vp sales techflow ")
+        await search.search_web_tool("vp sales techflow", fresh=True)
+
+    asyncio.run(run())
+
+    assert len(upstream) == 2
+    stats = search.web_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_errors_are_not_cached(mocker, upstream):
+    async def failing_fetch(query):
+        upstream.append(query)
+        return "Error performing web search: timeout"
+
+    mocker.patch.object(search, "fetch_web_results", failing_fetch)
+
+    async def run():
+        await search.search_web_tool("nubank")
+        await search.search_web_tool("nubank")
+
+    asyncio.run(run())
+    assert len(upstream) == 2
+
+
+def test_lru_eviction_and_persistent_fallback(session_factory):
+    cache = TTLCache("web", ttl=60, max_entries=2, max_rows=100, session_factory=session_factory)
+
+    async def run():
+        for key in ["a", "b", "c"]:
+            await cache.set(key, key.upper())
+        # "a" was evicted from memory but is still in the table
+        return await cache.get("a")
+
+    assert asyncio.run(run()) == "A"
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["persistent_hits"] == 1
+
+
+def test_expired_entries_are_misses_and_table_is_pruned(session_factory):
+    cache = TTLCache("web", ttl=-1, max_entries=10, max_rows=2, session_factory=session_factory, prune_every=1)
+
+    async def run():
+        for key in ["a", "b", "c"]:
+            await cache.set(key, key.upper())
+        return await cache.get("c")
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()["expirations"] >= 3